@@ -13,8 +13,7 @@ def create_external_agent(session: Session, name: str, base_url: str,
                          protocol: str = "rest") -> ExternalAgent:
     """Create a new external agent."""
     # Validate base_url
-    if not base_url.startswith(("http://", "https://")):
-        raise ValueError(f"base_url must start with http:// or https://. Got: {base_url[:200]}")
+    validate_base_url(base_url)
     
     agent = ExternalAgent(
         name=name,
@@ -30,6 +29,12 @@ def create_external_agent(session: Session, name: str, base_url: str,
     return agent
 
 
+def validate_base_url(base_url: str) -> None:
+    """Raise ValueError unless base_url is an http(s) URL."""
+    if not base_url.startswith(("http://", "https://")):
+        raise ValueError(f"base_url must start with http:// or https://. Got: {base_url[:200]}")
+
+
 def get_external_agent_by_id(session: Session, agent_id: int) -> Optional[ExternalAgent]:
     """Get external agent by ID."""
     return session.get(ExternalAgent, agent_id)
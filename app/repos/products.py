@@ -12,6 +12,20 @@ def create_product(session: Session, tenant_id: int, name: str, description: str
                   price_cpm: float, delivery_type: str, formats_json: str = "{}", 
                   targeting_json: str = "{}") -> Product:
     """Create a new product."""
+    product = add_product(session, tenant_id, name, description, price_cpm,
+                          delivery_type, formats_json, targeting_json)
+    session.commit()
+    auto_backup(session, "product_deleted")
+    auto_backup(session, "product_updated")
+    auto_backup(session, "product_created")
+    session.refresh(product)
+    return product
+
+
+def add_product(session: Session, tenant_id: int, name: str, description: str,
+                price_cpm: float, delivery_type: str, formats_json: str = "{}",
+                targeting_json: str = "{}") -> Product:
+    """Add a new product within the caller's transaction (flushed, not committed)."""
     product = Product(
         tenant_id=tenant_id,
         name=name,
@@ -22,11 +36,7 @@ def create_product(session: Session, tenant_id: int, name: str, description: str
         targeting_json=targeting_json
     )
     session.add(product)
-    session.commit()
-    auto_backup(session, "product_deleted")
-    auto_backup(session, "product_updated")
-    auto_backup(session, "product_created")
-    session.refresh(product)
+    session.flush()
     return product
 
 
@@ -14,6 +14,18 @@ logger = logging.getLogger(__name__)
 
 def create_tenant(session: Session, name: str, slug: str) -> Tenant:
     """Create a new tenant."""
+    validate_tenant(name, slug)
+    
+    tenant = Tenant(name=name.strip(), slug=slug.strip())
+    session.add(tenant)
+    session.commit()
+    auto_backup(session, "tenant_created")
+    session.refresh(tenant)
+    return tenant
+
+
+def validate_tenant(name: str, slug: str) -> None:
+    """Raise ValueError if a tenant name or slug is invalid."""
     # Validate inputs
     if not name or not name.strip():
         raise ValueError("Tenant name cannot be empty")
@@ -23,13 +35,6 @@ def create_tenant(session: Session, name: str, slug: str) -> Tenant:
     # Ensure slug is lowercase and contains only valid characters
     if not re.match(r'^[a-z0-9-]+$', slug):
         raise ValueError("Slug must contain only lowercase letters, numbers, and hyphens")
-    
-    tenant = Tenant(name=name.strip(), slug=slug.strip())
-    session.add(tenant)
-    session.commit()
-    auto_backup(session, "tenant_created")
-    session.refresh(tenant)
-    return tenant
 
 
 def get_tenant_by_id(session: Session, tenant_id: int) -> Optional[Tenant]:
@@ -2,22 +2,26 @@
 Admin routes for backup and restore operations.
 """
 
-from fastapi import APIRouter, HTTPException, Request, UploadFile, File
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request, UploadFile, File
+from fastapi.responses import FileResponse, HTMLResponse
 from fastapi.templating import Jinja2Templates
 from typing import List, Optional
 import json
 import tempfile
 import os
+from pathlib import Path
 from app.utils.data_persistence import (
     create_backup, restore_backup, list_backups,
     export_all_data, import_all_data
 )
-from app.utils.data_persistence.backup import test_persistent_disk
+from app.utils.data_persistence.backup import (
+    test_persistent_disk, submit_backup_job, run_backup_job, get_backup_job
+)
 from app.utils.csv_backup import (
     export_to_csv_zip, import_from_csv_zip, list_csv_backups
 )
 from app.utils.data_persistence import BACKUP_DIR
+from app.utils.data_persistence.core import is_jsonl_backup
 from app.db import get_session
 from app.services.embeddings_backfill import backfill_once
 
@@ -25,25 +29,33 @@ templates = Jinja2Templates(directory="app/templates")
 
 router = APIRouter(prefix="/admin/backup", tags=["admin"])
 
+# Content types for downloaded full backups, by final suffix
+_BACKUP_MEDIA_TYPES = {".gz": "application/gzip", ".zst": "application/zstd", ".jsonl": "application/x-ndjson"}
+
 
 @router.post("/create")
-async def create_backup_endpoint():
-    """Create a backup of all application data."""
-    try:
-        result = create_backup()
-        return {"message": result, "status": "success"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Backup failed: {str(e)}")
+async def create_backup_endpoint(background_tasks: BackgroundTasks):
+    """Start a backup of all application data in the background."""
+    job_id = submit_backup_job("create")
+    background_tasks.add_task(run_backup_job, job_id, create_backup)
+    return {"message": "Backup started", "status": "accepted", "job_id": job_id}
 
 
 @router.post("/restore")
-async def restore_backup_endpoint(backup_file: Optional[str] = None):
-    """Restore data from backup."""
-    try:
-        result = restore_backup(backup_file)
-        return {"message": result, "status": "success"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Restore failed: {str(e)}")
+async def restore_backup_endpoint(background_tasks: BackgroundTasks, backup_file: Optional[str] = None):
+    """Start restoring data from backup in the background."""
+    job_id = submit_backup_job("restore")
+    background_tasks.add_task(run_backup_job, job_id, restore_backup, backup_file)
+    return {"message": "Restore started", "status": "accepted", "job_id": job_id}
+
+
+@router.get("/status/{job_id}")
+async def backup_job_status_endpoint(job_id: str):
+    """Get the state of a background backup or restore job."""
+    job = get_backup_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown backup job: {job_id}")
+    return job
 
 
 @router.get("/list")
@@ -58,32 +70,23 @@ async def list_backups_endpoint():
 
 @router.get("/export")
 async def export_data_endpoint():
-    """Export current data as JSON."""
+    """Export current data and download the backup file that was written."""
     try:
         session = next(get_session())
         try:
-            data = export_all_data(session)
-            
-            # Calculate summary for user feedback
-            total_tenants = len(data.get('tenants', []))
-            total_products = sum(len(t.get('products', [])) for t in data.get('tenants', []))
-            total_agents = len(data.get('external_agents', []))
-            
-            return {
-                "message": f"Data exported successfully: {total_tenants} tenants, {total_products} products, {total_agents} agents",
-                "data": data,
-                "status": "success",
-                "summary": {
-                    "tenants": total_tenants,
-                    "products": total_products,
-                    "agents": total_agents,
-                    "exported_at": data.get('exported_at')
-                }
-            }
+            export_summary = export_all_data(session)
         finally:
             session.close()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+    
+    # Serve the streamed backup as written rather than loading it back into memory
+    backup_file = Path(export_summary["backup_file"])
+    return FileResponse(
+        path=backup_file,
+        filename=backup_file.name,
+        media_type=_BACKUP_MEDIA_TYPES.get(backup_file.suffix, "application/octet-stream")
+    )
 
 
 @router.post("/import")
@@ -91,8 +94,10 @@ async def import_data_endpoint(file: UploadFile = File(...)):
     """Import data from uploaded backup file."""
     try:
         # Validate file type
+        if is_jsonl_backup(file.filename):
+            return await _import_jsonl_upload(file)
         if not file.filename.endswith('.json'):
-            raise HTTPException(status_code=400, detail="Only JSON files are supported")
+            raise HTTPException(status_code=400, detail="Only JSON and JSON Lines backup files are supported")
         
         # Read and parse the uploaded file
         content = await file.read()
@@ -118,26 +123,46 @@ async def import_data_endpoint(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
 
 
+async def _import_jsonl_upload(file: UploadFile) -> dict:
+    """Restore an uploaded JSON Lines backup (e.g. one downloaded from /export)."""
+    # Save uploaded file temporarily, keeping its suffix so it is decompressed correctly
+    temp_file = BACKUP_DIR / f"temp_import_{Path(file.filename).name}"
+    with open(temp_file, "wb") as f:
+        f.write(await file.read())
+    
+    try:
+        session = next(get_session())
+        try:
+            result = import_all_data(session, backup_file=str(temp_file))
+            return {
+                "message": "Data imported successfully",
+                "status": "success",
+                "details": result
+            }
+        finally:
+            session.close()
+    finally:
+        # Clean up temp file
+        if temp_file.exists():
+            temp_file.unlink()
+
+
 @router.get("/status")
 async def backup_status_endpoint():
     """Get backup system status."""
     try:
         from app.utils.data_persistence import BACKUP_DIR
-        import os
+        from app.utils.data_persistence.core import scan_backups
         
-        # Include both compressed (.json.gz) and uncompressed (.json) backup files
-        json_files = list(BACKUP_DIR.glob("full_backup_*.json"))
-        gz_files = list(BACKUP_DIR.glob("full_backup_*.json.gz"))
-        backup_files = json_files + gz_files
-        latest_backup = None
-        if backup_files:
-            latest_backup = max(backup_files, key=os.path.getctime)
+        # Include JSON Lines backups as well as legacy .json/.json.gz files (newest first)
+        backups = scan_backups()
+        latest_backup, latest_backup_time = backups[0] if backups else (None, None)
         
         return {
             "backup_directory": str(BACKUP_DIR),
-            "total_backups": len(backup_files),
+            "total_backups": len(backups),
             "latest_backup": latest_backup.name if latest_backup else None,
-            "latest_backup_time": latest_backup.stat().st_mtime if latest_backup else None,
+            "latest_backup_time": latest_backup_time,
             "status": "healthy"
         }
     except Exception as e:
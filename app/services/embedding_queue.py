@@ -5,7 +5,6 @@ Handles product embedding jobs with concurrency control and retry logic.
 
 import asyncio
 import logging
-import hashlib
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
@@ -177,29 +176,23 @@ class EmbeddingQueue:
     async def _store_embeddings(self, session, product_ids: List[int], 
                                product_texts: Dict[int, str], embeddings: List[List[float]]) -> None:
         """Store embeddings in database."""
-        from app.utils.embeddings import upsert_product_embeddings
+        from app.utils.embeddings import upsert_product_embeddings_bulk
         
         config = get_embeddings_config()
-        now = datetime.utcnow().isoformat()
         
-        for i, product_id in enumerate(product_ids):
-            if i < len(embeddings):
-                embedding = embeddings[i]
-                embedding_text = product_texts[product_id]
-                
-                # Create embedding hash including metadata
-                hash_input = f"{embedding_text}:{config['provider']}:{config['model']}:{len(embedding)}"
-                embedding_hash = hashlib.sha256(hash_input.encode()).hexdigest()
-                
-                # Store embedding with metadata
-                await upsert_product_embeddings(
-                    session, product_id, embedding, 
-                    provider=config['provider'],
-                    model=config['model'],
-                    dim=len(embedding),
-                    updated_at=now,
-                    embedding_hash=embedding_hash
-                )
+        # Texts and embeddings are in the same order
+        items = [
+            (product_id, embedding_text, embedding)
+            for (product_id, embedding_text), embedding in zip(product_texts.items(), embeddings)
+        ]
+        
+        # Store all embeddings in one transaction
+        await upsert_product_embeddings_bulk(
+            session, items,
+            provider=config['provider'],
+            model=config['model'],
+            updated_at=datetime.utcnow().isoformat()
+        )
     
     def _mark_completed(self, product_id: int) -> None:
         """Mark a product as completed."""
@@ -5,7 +5,7 @@ Application startup and shutdown logic.
 import logging
 from pathlib import Path
 from app.db import ensure_database, create_all_tables, get_session
-from app.utils.migrations import run_migrations
+from app.utils.migrations import run_migrations, migrate_data_version
 from app.utils.rag_migrations import run_rag_startup_checks
 
 logger = logging.getLogger(__name__)
@@ -33,6 +33,7 @@ async def startup_event():
         
         # 4. Run migrations
         run_migrations()
+        migrate_data_version()
         
         # 5. Initialize database connection
         ensure_database()
@@ -2,53 +2,26 @@
 Simple auto-backup system without circular imports.
 """
 
-import json
 import logging
-import os
-from datetime import datetime
 from pathlib import Path
 from typing import Optional
 from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
 
-# Data directory for persistence files
-DATA_DIR = Path("./data")
-BACKUP_DIR = DATA_DIR / "backups"
-MAX_BACKUPS = 20
-
-
-def ensure_data_directories():
-    """Ensure all data directories exist."""
-    DATA_DIR.mkdir(exist_ok=True)
-    BACKUP_DIR.mkdir(exist_ok=True)
-
 
 def auto_backup(session: Session, reason: str = "data_change") -> Optional[str]:
     """
-    Create automatic backup and cleanup old backups.
+    Create automatic backup (export_all_data also prunes old backups).
     Returns backup filename if successful, None if failed.
     """
     try:
-        ensure_data_directories()
-        
         # Import here to avoid circular imports
         from app.utils.data_persistence import export_all_data
         
-        # Create backup
-        backup_data = export_all_data(session)
-        
-        # Generate backup filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_filename = f"full_backup_{timestamp}.json"
-        backup_path = BACKUP_DIR / backup_filename
-        
-        # Write backup data
-        with open(backup_path, 'w') as f:
-            json.dump(backup_data, f, indent=2)
-        
-        # Cleanup old backups
-        cleanup_old_backups()
+        # Create backup (export_all_data streams it straight to disk)
+        export_summary = export_all_data(session)
+        backup_filename = Path(export_summary["backup_file"]).name
         
         logger.info(f"Auto-backup created: {backup_filename} (reason: {reason})")
         return backup_filename
@@ -59,27 +32,12 @@ def auto_backup(session: Session, reason: str = "data_change") -> Optional[str]:
 
 
 def cleanup_old_backups() -> None:
-    """Keep only the last MAX_BACKUPS files, delete older ones."""
+    """Keep only the last BACKUP_KEEP files, delete older ones."""
     try:
-        backup_files = list(BACKUP_DIR.glob("full_backup_*.json"))
-        
-        if len(backup_files) <= MAX_BACKUPS:
-            return  # No cleanup needed
-        
-        # Sort by creation time (oldest first)
-        sorted_files = sorted(backup_files, key=os.path.getctime)
-        
-        # Delete oldest files
-        files_to_delete = sorted_files[:-MAX_BACKUPS]
-        
-        for file_path in files_to_delete:
-            try:
-                file_path.unlink()
-                logger.info(f"Deleted old backup: {file_path.name}")
-            except Exception as e:
-                logger.warning(f"Failed to delete {file_path.name}: {e}")
+        # Import here to avoid circular imports (the data_persistence package imports app.repos)
+        from app.utils.data_persistence.core import BACKUP_KEEP, prune_backups
         
-        logger.info(f"Cleanup completed: deleted {len(files_to_delete)} old backups")
+        prune_backups(BACKUP_KEEP)
         
     except Exception as e:
         logger.error(f"Backup cleanup failed: {e}")
@@ -88,17 +46,16 @@ def cleanup_old_backups() -> None:
 def get_backup_stats() -> dict:
     """Get backup system statistics."""
     try:
-        backup_files = list(BACKUP_DIR.glob("full_backup_*.json"))
-        latest_backup = None
+        from app.utils.data_persistence.core import BACKUP_KEEP, find_backup_files
         
-        if backup_files:
-            latest_backup = max(backup_files, key=os.path.getctime)
+        backup_files = find_backup_files()
+        latest_backup = backup_files[0] if backup_files else None
         
         return {
             "total_backups": len(backup_files),
-            "max_backups": MAX_BACKUPS,
+            "max_backups": BACKUP_KEEP,
             "latest_backup": latest_backup.name if latest_backup else None,
-            "cleanup_needed": len(backup_files) > MAX_BACKUPS
+            "cleanup_needed": len(backup_files) > BACKUP_KEEP
         }
     except Exception as e:
         logger.error(f"Failed to get backup stats: {e}")
@@ -11,6 +11,7 @@ import os
 import logging
 from datetime import datetime
 from typing import Dict, List, Any, Optional
+from sqlalchemy import insert
 from sqlmodel import Session, select
 from pathlib import Path
 
@@ -19,6 +20,9 @@ from app.utils.data_persistence import BACKUP_DIR
 
 logger = logging.getLogger(__name__)
 
+# Products are restored with one executemany INSERT per batch of this many rows
+PRODUCT_INSERT_BATCH_SIZE = 1000
+
 
 def export_to_csv_zip(session: Session) -> str:
     """
@@ -330,41 +334,36 @@ def _import_products_from_csv_text(session: Session, csv_text: str) -> int:
     from io import StringIO
     reader = csv.DictReader(StringIO(csv_text))
     
-    # Batch process products for better performance
+    # Insert products with one executemany statement per batch instead of ORM objects
     products_batch = []
-    batch_size = 100
     
     for row in reader:
         try:
-            product = Product(
-                id=int(row['id']) if row['id'] else None,
-                tenant_id=int(row['tenant_id']) if row['tenant_id'] else None,
-                name=row['name'],
-                description=row['description'] if row['description'] else None,
-                price_cpm=float(row['price_cpm']) if row['price_cpm'] else 0.0,
-                delivery_type=row['delivery_type'],
-                formats_json=row['formats_json'] if row['formats_json'] else None,
-                targeting_json=row['targeting_json'] if row['targeting_json'] else None,
-                created_at=datetime.fromisoformat(row['created_at']) if row['created_at'] else None
-            )
-            
-            products_batch.append(product)
+            products_batch.append({
+                "id": int(row['id']) if row['id'] else None,
+                "tenant_id": int(row['tenant_id']) if row['tenant_id'] else None,
+                "name": row['name'],
+                "description": row['description'] if row['description'] else None,
+                "price_cpm": float(row['price_cpm']) if row['price_cpm'] else 0.0,
+                "delivery_type": row['delivery_type'],
+                "formats_json": row['formats_json'] if row['formats_json'] else None,
+                "targeting_json": row['targeting_json'] if row['targeting_json'] else None,
+                "created_at": datetime.fromisoformat(row['created_at']) if row['created_at'] else None
+            })
             
-            # Commit in batches for better performance
-            if len(products_batch) >= batch_size:
-                session.add_all(products_batch)
-                session.commit()
+            if len(products_batch) >= PRODUCT_INSERT_BATCH_SIZE:
+                session.execute(insert(Product), products_batch)
                 imported += len(products_batch)
                 products_batch = []
                 
         except Exception as e:
             logger.error(f"Error importing product {row.get('name', 'unknown')}: {str(e)}")
     
-    # Commit remaining products
+    # Insert remaining products and commit once
     if products_batch:
-        session.add_all(products_batch)
-        session.commit()
+        session.execute(insert(Product), products_batch)
         imported += len(products_batch)
+    session.commit()
     
     return imported
 
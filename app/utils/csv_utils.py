@@ -7,9 +7,10 @@ import io
 import json
 import logging
 from typing import List, Dict, Tuple, Any
-from sqlmodel import Session
-from app.repos.tenants import get_tenant_by_slug
-from app.repos.products import create_product
+from sqlmodel import Session, select
+from app.models import Tenant
+from app.repos.products import add_product
+from app.utils.auto_backup_simple import auto_backup
 
 logger = logging.getLogger(__name__)
 
@@ -99,6 +100,9 @@ def import_products_from_csv(session: Session, valid_rows: List[Dict[str, str]],
     imported_count = 0
     errors = []
     
+    # Resolve tenant slugs (admin imports) from one query instead of one per row
+    tenant_ids = {} if tenant_id is not None else dict(session.exec(select(Tenant.slug, Tenant.id)).all())
+    
     for row_num, row in enumerate(valid_rows, start=1):
         try:
             # Determine tenant_id
@@ -107,28 +111,33 @@ def import_products_from_csv(session: Session, valid_rows: List[Dict[str, str]],
                 target_tenant_id = tenant_id
             else:
                 # Use tenant_slug from CSV (for admin imports)
-                tenant = get_tenant_by_slug(session, row['tenant_slug'])
-                if not tenant:
+                target_tenant_id = tenant_ids.get(row['tenant_slug'])
+                if target_tenant_id is None:
                     errors.append(f"Row {row_num + 1}: Tenant with slug '{row['tenant_slug']}' not found")
                     continue
-                target_tenant_id = tenant.id
             
-            # Create product
-            create_product(
-                session=session,
-                tenant_id=target_tenant_id,
-                name=row['product_name'],
-                description=row.get('description', ''),
-                price_cpm=float(row['price_cpm']),
-                delivery_type=row['delivery_type'],
-                formats_json=row['formats_json'],
-                targeting_json=row['targeting_json']
-            )
+            # Add product; everything is committed (and backed up) once at the end.
+            # Each row gets a savepoint so a failed flush only rolls back that row.
+            with session.begin_nested():
+                add_product(
+                    session=session,
+                    tenant_id=target_tenant_id,
+                    name=row['product_name'],
+                    description=row.get('description', ''),
+                    price_cpm=float(row['price_cpm']),
+                    delivery_type=row['delivery_type'],
+                    formats_json=row['formats_json'],
+                    targeting_json=row['targeting_json']
+                )
             imported_count += 1
             
         except Exception as e:
             errors.append(f"Row {row_num + 1}: {str(e)}")
     
+    if imported_count:
+        session.commit()
+        auto_backup(session, "products_imported")
+    
     logger.info(f"CSV import completed: {imported_count} imported, {len(errors)} errors")
     return imported_count, errors
 
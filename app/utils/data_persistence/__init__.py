@@ -4,7 +4,7 @@ Ensures settings, prompts, external agents, and other configuration survive rede
 """
 
 from .export import export_all_data, export_tenants, export_external_agents, export_app_settings, export_tenant_settings
-from .import_utils import import_all_data, import_tenants_and_products, import_tenants, import_external_agents, import_app_settings, import_tenant_settings
+from .import_utils import import_all_data, load_backup_data, import_tenants_and_products, import_tenants, import_external_agents, import_app_settings, import_tenant_settings
 from .backup import create_backup, restore_backup, list_backups, auto_backup_on_startup, auto_restore_on_startup
 from .core import ensure_data_directories, BACKUP_DIR
 
@@ -18,6 +18,7 @@ __all__ = [
     
     # Import functions
     'import_all_data',
+    'load_backup_data',
     'import_tenants_and_products',
     'import_tenants',
     'import_external_agents', 
@@ -3,17 +3,26 @@ Backup and restore functions for data persistence.
 """
 
 import logging
-import os
-from typing import List, Optional
-from sqlmodel import Session
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from sqlmodel import Session, select
+from sqlalchemy import func
 from datetime import datetime
 
-from .export import export_all_data
-from .import_utils import import_all_data
-from .core import ensure_data_directories, BACKUP_DIR
+from app.models import Tenant, Product, ExternalAgent
+
+from .export import export_all_data, compute_fingerprint
+from .import_utils import import_all_data, read_backup_header, zstandard
+from .core import ensure_data_directories, find_backup_files, BACKUP_DIR
 
 logger = logging.getLogger(__name__)
 
+# Errors meaning the newest backup's header can't be read, so a fresh backup is due:
+# I/O and bad gzip data, malformed JSON, a missing zstandard module and corrupt zstd data
+_HEADER_READ_ERRORS = (OSError, ValueError, RuntimeError) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
 
 def create_backup() -> str:
     """Create a backup of all data."""
@@ -21,8 +30,8 @@ def create_backup() -> str:
     
     session = next(get_session())
     try:
-        backup_data = export_all_data(session)
-        return "Backup created successfully"
+        export_summary = export_all_data(session)
+        return f"Backup created successfully: {Path(export_summary['backup_file']).name}"
     finally:
         session.close()
 
@@ -39,41 +48,105 @@ def restore_backup(backup_file: Optional[str] = None) -> str:
         session.close()
 
 
+# In-memory state of background backup/restore jobs, keyed by job id, oldest first
+_jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+# Finished jobs kept for status polling; older ones are dropped as new jobs arrive
+MAX_FINISHED_JOBS = 20
+
+
+def submit_backup_job(kind: str) -> str:
+    """Register a pending backup or restore job and return its id."""
+    job_id = uuid.uuid4().hex
+    _jobs[job_id] = {"job_id": job_id, "kind": kind, "status": "pending", "result": None, "error": None}
+    _prune_finished_jobs()
+    return job_id
+
+
+def _prune_finished_jobs() -> None:
+    """Forget the oldest finished jobs beyond MAX_FINISHED_JOBS; pending and running jobs are kept."""
+    finished = [job_id for job_id, job in _jobs.items() if job["status"] in ("done", "error")]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job_id]
+
+
+def run_backup_job(job_id: str, func: Callable[..., str], *args: Any) -> None:
+    """Run a backup or restore function, recording its outcome on the job."""
+    job = _jobs[job_id]
+    job["status"] = "running"
+    try:
+        job["result"] = func(*args)
+        job["status"] = "done"
+    except Exception as e:
+        logger.error(f"Backup job {job_id} ({job['kind']}) failed: {e}")
+        job["error"] = str(e)
+        job["status"] = "error"
+
+
+def get_backup_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Return the state of a background backup or restore job, if known."""
+    return _jobs.get(job_id)
+
+
 def list_backups() -> List[str]:
     """List all available backup files."""
     ensure_data_directories()
-    # Include both compressed (.json.gz) and uncompressed (.json) backup files
-    json_files = list(BACKUP_DIR.glob("full_backup_*.json"))
-    gz_files = list(BACKUP_DIR.glob("full_backup_*.json.gz"))
-    backup_files = json_files + gz_files
-    return [f.name for f in sorted(backup_files, key=os.path.getctime, reverse=True)]
+    # Include JSON Lines backups as well as legacy .json/.json.gz files
+    return [path.name for path in find_backup_files()]
+
+
+def _database_has_data(session: Session) -> bool:
+    """Whether any tenant, product or external agent exists (one LIMIT 1 probe per table)."""
+    return any(
+        session.exec(select(model.id).limit(1)).first() is not None
+        for model in (Tenant, Product, ExternalAgent)
+    )
+
+
+def _log_record_counts(session: Session, prefix: str) -> None:
+    """Log per-table row counts at DEBUG level, counted in the database."""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    counts = {
+        model.__name__: session.exec(select(func.count()).select_from(model)).one()
+        for model in (Tenant, Product, ExternalAgent)
+    }
+    logger.debug(f"{prefix}: Database state check: {counts} (total {sum(counts.values())})")
+
+
+def _latest_backup_is_current(session: Session) -> bool:
+    """Whether the newest backup's header fingerprint matches the database."""
+    backup_files = find_backup_files()
+    if not backup_files:
+        return False
+    try:
+        header = read_backup_header(str(backup_files[0]))
+    except _HEADER_READ_ERRORS as e:
+        logger.warning(f"Could not read header of {backup_files[0].name}: {e}")
+        return False
+    fingerprint = compute_fingerprint(session)
+    # Without the data_version triggers in-place edits are invisible, so always back up
+    if fingerprint["data_version"] is None:
+        return False
+    return bool(header) and header.get("fingerprint") == fingerprint
 
 
 def auto_backup_on_startup(session: Session) -> None:
     """Automatically create a backup on startup."""
     try:
         # Check if database has data before creating backup
-        from app.models import Tenant, Product, ExternalAgent
-        from sqlmodel import select
+        _log_record_counts(session, "BACKUP_DEBUG")
         
-        tenant_count = len(session.exec(select(Tenant)).all())
-        product_count = len(session.exec(select(Product)).all())
-        agent_count = len(session.exec(select(ExternalAgent)).all())
-        
-        total_records = tenant_count + product_count + agent_count
+        if not _database_has_data(session):
+            logger.info("Database is empty, skipping auto-backup")
+            return
         
-        # Debug: Log detailed database state
-        logger.info(f"BACKUP_DEBUG: Database state check:")
-        logger.info(f"BACKUP_DEBUG:   - Tenants: {tenant_count}")
-        logger.info(f"BACKUP_DEBUG:   - Products: {product_count}")
-        logger.info(f"BACKUP_DEBUG:   - External Agents: {agent_count}")
-        logger.info(f"BACKUP_DEBUG:   - Total Records: {total_records}")
+        if _latest_backup_is_current(session):
+            logger.info("Data unchanged since latest backup, skipping auto-backup")
+            return
         
-        if total_records > 0:
-            export_all_data(session)
-            logger.info("Auto-backup created on startup")
-        else:
-            logger.info("Database is empty, skipping auto-backup")
+        export_all_data(session)
+        logger.info("Auto-backup created on startup")
     except Exception as e:
         logger.warning(f"Auto-backup failed: {e}")
 
@@ -82,44 +155,20 @@ def auto_restore_on_startup(session: Session) -> None:
     """Automatically restore from latest backup on startup if database is empty."""
     try:
         # Check if database is empty
-        from app.models import Tenant, Product, ExternalAgent
-        from sqlmodel import select
+        _log_record_counts(session, "RESTORE_DEBUG")
         
-        tenant_count = len(session.exec(select(Tenant)).all())
-        product_count = len(session.exec(select(Product)).all())
-        agent_count = len(session.exec(select(ExternalAgent)).all())
-        
-        total_records = tenant_count + product_count + agent_count
-        
-        # Debug: Log detailed database state
-        logger.info(f"RESTORE_DEBUG: Database state check:")
-        logger.info(f"RESTORE_DEBUG:   - Tenants: {tenant_count}")
-        logger.info(f"RESTORE_DEBUG:   - Products: {product_count}")
-        logger.info(f"RESTORE_DEBUG:   - External Agents: {agent_count}")
-        logger.info(f"RESTORE_DEBUG:   - Total Records: {total_records}")
-        
-        if total_records > 0:
-            logger.info(f"Database not empty ({total_records} records), skipping auto-restore")
+        if _database_has_data(session):
+            logger.info("Database not empty, skipping auto-restore")
             return
         
-        # Database is empty, check for backup files (include both .json and .json.gz)
-        json_files = list(BACKUP_DIR.glob("full_backup_*.json"))
-        gz_files = list(BACKUP_DIR.glob("full_backup_*.json.gz"))
-        backup_files = json_files + gz_files
-        
-        # Debug: Log backup files found
-        logger.info(f"RESTORE_DEBUG: Backup files found: {len(backup_files)}")
-        for backup_file in backup_files:
-            logger.info(f"RESTORE_DEBUG:   - {backup_file.name}")
+        # Database is empty, check for backup files (JSON Lines or legacy JSON)
+        backup_files = find_backup_files()
         
-        # Debug: Also check what files exist in the backup directory
-        all_files = list(BACKUP_DIR.glob("*"))
-        logger.info(f"RESTORE_DEBUG: All files in backup directory: {len(all_files)}")
-        for file in all_files:
-            logger.info(f"RESTORE_DEBUG:   - {file.name}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"RESTORE_DEBUG: Backup files found: {[f.name for f in backup_files]}")
         
         if backup_files:
-            latest_backup = max(backup_files, key=os.path.getctime)
+            latest_backup = backup_files[0]
             logger.info(f"Database is empty, auto-restoring from: {latest_backup.name}")
             import_all_data(session, backup_file=latest_backup.name)
             logger.info(f"Auto-restore completed successfully from: {latest_backup.name}")
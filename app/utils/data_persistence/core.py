@@ -3,7 +3,10 @@ Core utilities for data persistence.
 """
 
 import logging
+import os
+from operator import itemgetter
 from pathlib import Path
+from typing import Any, Dict, List, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -14,8 +17,72 @@ SETTINGS_FILE = DATA_DIR / "app_settings.json"
 EXTERNAL_AGENTS_FILE = DATA_DIR / "external_agents.json"
 TENANT_SETTINGS_FILE = DATA_DIR / "tenant_settings.json"
 
+# Full backups are JSON Lines; plain JSON files are still read for older backups
+BACKUP_PREFIX = "full_backup_"
+BACKUP_SUFFIXES = (".jsonl.gz", ".jsonl.zst", ".jsonl", ".json.gz", ".json.zst", ".json")
+
+
+def _clamp_backup_keep() -> int:
+    """Read BACKUP_KEEP, keeping at least one backup (0 or less would prune them all)."""
+    return max(1, int(os.getenv("BACKUP_KEEP", "20")))
+
+
+# Number of most recent full backups kept after each export
+BACKUP_KEEP = _clamp_backup_keep()
+
 
 def ensure_data_directories():
     """Ensure all data directories exist."""
     DATA_DIR.mkdir(exist_ok=True)
     BACKUP_DIR.mkdir(exist_ok=True)
+
+
+# Last backup directory scan, keyed on (directory, directory mtime)
+_scan_cache: Dict[str, Any] = {"key": None, "entries": []}
+
+
+def scan_backups() -> List[Tuple[Path, float]]:
+    """
+    Return (path, mtime) for every full backup file, newest first.
+    
+    Creating or deleting a backup bumps the directory's own mtime, so the
+    listing is cached against it and repeat calls cost a single stat.
+    """
+    try:
+        key = (str(BACKUP_DIR), os.stat(BACKUP_DIR).st_mtime_ns)
+    except FileNotFoundError:
+        return []
+    
+    if _scan_cache["key"] != key:
+        # DirEntry.stat() reuses data from the directory read where the OS allows
+        with os.scandir(BACKUP_DIR) as entries:
+            backups = [
+                (Path(entry.path), entry.stat().st_mtime)
+                for entry in entries
+                if entry.name.startswith(BACKUP_PREFIX) and entry.name.endswith(BACKUP_SUFFIXES)
+            ]
+        # Same-second backups fall back to name order, which embeds the timestamp
+        backups.sort(key=itemgetter(1, 0), reverse=True)
+        _scan_cache.update(key=key, entries=backups)
+    
+    return list(_scan_cache["entries"])
+
+
+def find_backup_files() -> List[Path]:
+    """Return all full backup files in the backup directory, newest first."""
+    return [path for path, _ in scan_backups()]
+
+
+def prune_backups(keep: int) -> None:
+    """Delete all but the ``keep`` most recent full backups."""
+    for path, _ in scan_backups()[keep:]:
+        try:
+            os.unlink(path)
+            logger.info(f"Deleted old backup: {path.name}")
+        except OSError as e:
+            logger.warning(f"Failed to delete {path.name}: {e}")
+
+
+def is_jsonl_backup(backup_file: str) -> bool:
+    """Whether a backup file uses the JSON Lines record format."""
+    return str(backup_file).endswith((".jsonl", ".jsonl.gz", ".jsonl.zst"))
@@ -1,260 +1,430 @@
 """
 Export functions for data persistence.
+
+Full backups are written as JSON Lines: one record per line, each tagged with a
+``type`` field (``header``, ``tenant``, ``product``, ``agent``, ``app_settings``,
+``tenant_settings``, ``embedding``). Records are streamed straight from the
+database to disk so memory stays flat regardless of how much data there is.
 """
 
-import gzip
+import hashlib
 import json
 import logging
 import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Any
+from itertools import groupby
+from operator import attrgetter
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Any, Iterable, Iterator, Optional, Tuple
 from sqlmodel import Session, select, text
+from sqlalchemy import func
+from sqlalchemy.sql.selectable import TextualSelect
 
 from app.models import Tenant, Product, ExternalAgent
-from app.repos.tenants import get_tenant_by_slug
-from app.repos.external_agents import list_external_agents
-from app.repos.products import list_products
-from .core import ensure_data_directories, BACKUP_DIR, SETTINGS_FILE, TENANT_SETTINGS_FILE
+from .core import ensure_data_directories, prune_backups, BACKUP_DIR, BACKUP_KEEP, SETTINGS_FILE, TENANT_SETTINGS_FILE
+
+try:
+    from isal.igzip import IGzipFile as GzipFile  # ISA-L's drop-in GzipFile deflates several times faster
+except ImportError:  # Fall back to the stdlib zlib wrapper
+    from gzip import GzipFile
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # zstd backups are opt-in; gzip is always available
+    zstandard = None
 
 logger = logging.getLogger(__name__)
 
+# Version written to the header record of JSON Lines backups
+BACKUP_FORMAT_VERSION = "2.0"
 
-def export_all_data(session: Session, use_compression: bool = True) -> Dict[str, Any]:
-    """Export all application data to a comprehensive backup."""
-    logger.info("Starting JSON backup export...")
-    ensure_data_directories()
-    
-    # Export data with progress logging
-    logger.info("Exporting tenants and products...")
-    tenants_data = export_tenants(session)
-    
-    logger.info("Exporting external agents...")
-    external_agents_data = export_external_agents(session)
-    
-    logger.info("Exporting application settings...")
-    app_settings_data = export_app_settings()
-    
-    logger.info("Exporting tenant settings...")
-    tenant_settings_data = export_tenant_settings()
+# Rows fetched per round-trip while streaming tables out of the database
+EXPORT_YIELD_PER = 500
+
+# Serialized bytes handed to the writer thread per write
+EXPORT_WRITE_CHUNK_BYTES = 256 * 1024
+
+# Product embeddings columns (not a SQLModel table, so they are read with raw SQL)
+_EMBEDDING_KEYS = (
+    "id", "product_id", "embedding_text", "embedding_hash", "embedding",
+    "created_at", "provider", "model", "dim", "updated_at", "is_stale"
+)
+_EMBEDDING_SELECT = text(f"SELECT {', '.join(_EMBEDDING_KEYS)} FROM product_embeddings")
+_EMBEDDING_TABLE_EXISTS = text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_embeddings'")
+_EMBEDDING_STAMP = text("SELECT COUNT(*), MAX(id), MAX(updated_at), TOTAL(is_stale) FROM product_embeddings")
+
+# Change counter maintained by triggers (see app.utils.migrations.create_data_version_triggers)
+_DATA_VERSION_TABLE_EXISTS = text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'data_version'")
+_DATA_VERSION_SELECT = text("SELECT version FROM data_version")
+
+
+def _table_select(model: Any, order_by: str) -> Tuple[Tuple[str, ...], TextualSelect]:
+    """
+    Specialize an exporter for a model's table once, at import time.
     
-    logger.info("Exporting product embeddings...")
-    try:
-        embeddings_data = export_product_embeddings(session)
-        logger.info(f"Embeddings export completed: {len(embeddings_data)} embeddings")
-    except Exception as e:
-        logger.error(f"Embeddings export failed: {e}")
-        embeddings_data = []
+    Returns the column names (the backup record keys, in schema order) and a
+    Core textual SELECT of exactly those columns that keeps their type
+    processing, so the export never drifts from the schema.
+    """
+    table = model.__table__
+    keys = tuple(column.name for column in table.columns)
+    statement = text(f"SELECT {', '.join(keys)} FROM {table.name} ORDER BY {order_by}")
+    return keys, statement.columns(*table.columns).execution_options(yield_per=EXPORT_YIELD_PER)
+
+
+# Rows are read as plain Core tuples, bypassing ORM instances and the identity map
+_TENANT_KEYS, _TENANT_SELECT = _table_select(Tenant, "id")
+_PRODUCT_KEYS, _PRODUCT_SELECT = _table_select(Product, "tenant_id, id")
+_AGENT_KEYS, _AGENT_SELECT = _table_select(ExternalAgent, "id")
+
+# Application settings captured in backups, as (settings key, environment variable)
+_APP_SETTING_KEYS = (
+    ("gemini_api_key", "GEMINI_API_KEY"),
+    ("embeddings_provider", "EMBEDDINGS_PROVIDER"),
+    ("embeddings_model", "EMBEDDINGS_MODEL"),
+    ("emb_concurrency", "EMB_CONCURRENCY"),
+    ("emb_batch_size", "EMB_BATCH_SIZE"),
+    ("rag_top_k", "RAG_TOP_K"),
+    ("orchestrator_timeout", "ORCH_TIMEOUT_MS_DEFAULT"),
+    ("orchestrator_concurrency", "ORCH_CONCURRENCY"),
+    ("circuit_breaker_fails", "CB_FAILS"),
+    ("circuit_breaker_ttl", "CB_TTL_S"),
+    ("mcp_session_ttl", "MCP_SESSION_TTL_S")
+)
+
+# Backup JSON is highly repetitive; level 1 already shrinks it several-fold at near-copy speed
+BACKUP_COMPRESSLEVEL = 1
+
+# Set BACKUP_COMPRESS=0 to write plain, human-readable .jsonl backups instead
+BACKUP_COMPRESS = os.getenv("BACKUP_COMPRESS", "1") != "0"
+
+# BACKUP_COMPRESS=zstd writes .jsonl.zst backups, which restore 3-5x faster than gzip
+# at a similar ratio (falls back to gzip if zstandard is not installed)
+BACKUP_ZSTD = os.getenv("BACKUP_COMPRESS") == "zstd" and zstandard is not None
+BACKUP_ZSTD_LEVEL = 3
+
+# Standalone settings files are compact unless BACKUP_PRETTY is set (JSON Lines records are always compact)
+BACKUP_PRETTY = bool(os.getenv("BACKUP_PRETTY"))
+
+
+def export_all_data(session: Session) -> Dict[str, Any]:
+    """
+    Stream all application data to a compressed JSON Lines backup file.
+
+    Returns a summary of the export (header fields, backup file path and
+    per-type record counts) rather than the data itself.
+    """
+    ensure_data_directories()
+
+    # One clock read names the file and stamps every record of this backup
+    now = datetime.now()
+    exported_at = now.isoformat()
+    timestamp = now.strftime("%Y%m%d_%H%M%S")
+    compression = (".zst" if BACKUP_ZSTD else ".gz") if BACKUP_COMPRESS else ""
+    backup_file = BACKUP_DIR / f"full_backup_{timestamp}.jsonl{compression}"
+    logger.debug("Writing backup file: %s", backup_file)
+
+    header = {
+        "type": "header",
+        "version": BACKUP_FORMAT_VERSION,
+        "exported_at": exported_at,
+        "fingerprint": compute_fingerprint(session)
+    }
+    with _atomic_backup_writer(backup_file) as f:
+        counts = write_records(f, iter_backup_records(session, header))
     
-    # Compile backup data
-    backup_data = {
-        "exported_at": datetime.now().isoformat(),
-        "version": "1.0",
-        "tenants": tenants_data,
-        "external_agents": external_agents_data,
-        "app_settings": app_settings_data,
-        "tenant_settings": tenant_settings_data,
-        "product_embeddings": embeddings_data
+    prune_backups(BACKUP_KEEP)
+
+    summary = {
+        "exported_at": exported_at,
+        "version": BACKUP_FORMAT_VERSION,
+        "backup_file": str(backup_file),
+        "counts": {
+            "tenants": counts.get("tenant", 0),
+            "products": counts.get("product", 0),
+            "external_agents": counts.get("agent", 0),
+            "product_embeddings": counts.get("embedding", 0)
+        }
     }
+
+    counts = summary["counts"]
+    logger.info(
+        "JSONL backup completed: %d tenants, %d products, %d external agents, %d embeddings -> %s",
+        counts["tenants"], counts["products"], counts["external_agents"], counts["product_embeddings"],
+        backup_file, extra=counts
+    )
+
+    return summary
+
+
+def compute_fingerprint(session: Session) -> Dict[str, Any]:
+    """
+    Summarize the current data without scanning it.
     
-    # Save to backup file with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    if use_compression:
-        backup_file = os.path.join(BACKUP_DIR, f"full_backup_{timestamp}.json.gz")
-        logger.info(f"Writing compressed backup file: {backup_file}")
-        write_compressed_backup(backup_data, backup_file)
-    else:
-        backup_file = os.path.join(BACKUP_DIR, f"full_backup_{timestamp}.json")
-        logger.info(f"Writing backup file: {backup_file}")
-        write_backup(backup_data, backup_file)
+    Records max id and row count per table, the data_version counter that
+    triggers bump on every tenant, product and agent write (None if the
+    triggers aren't installed), the embeddings table's (count, max id, last
+    update, stale count) and a hash of the app settings. Some routes edit
+    rows in place without triggering an auto-backup (e.g. tenant prompts),
+    which only the data_version counter reveals.
+    """
+    fingerprint: Dict[str, Any] = {"counts": {}}
+    tables = (("tenant", "tenants", Tenant), ("product", "products", Product), ("agent", "external_agents", ExternalAgent))
+    for prefix, count_key, model in tables:
+        max_id, count = session.exec(select(func.max(model.id), func.count()).select_from(model)).one()
+        fingerprint[f"{prefix}_max_id"] = max_id
+        fingerprint["counts"][count_key] = count
     
-    logger.info(f"Writing backup file: {backup_file}")
-    # Calculate summary statistics
-    total_tenants = len(tenants_data)
-    total_products = sum(len(t['products']) for t in tenants_data)
-    total_agents = len(external_agents_data)
+    fingerprint["data_version"] = None
+    if session.execute(_DATA_VERSION_TABLE_EXISTS).first() is not None:
+        fingerprint["data_version"] = session.execute(_DATA_VERSION_SELECT).scalar()
+    if session.execute(_EMBEDDING_TABLE_EXISTS).first() is not None:
+        fingerprint["embeddings"] = list(session.execute(_EMBEDDING_STAMP).one())
+    fingerprint["app_settings_sha256"] = hashlib.sha256(_dumps(_collect_app_settings())).hexdigest()
+    return fingerprint
+
+
+def iter_backup_records(session: Session, header: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Yield every backup record in restore order, starting with the header."""
+    yield header
+
+    for record_type, statement, keys in (
+        ("tenant", _TENANT_SELECT, _TENANT_KEYS),
+        ("product", _PRODUCT_SELECT, _PRODUCT_KEYS),
+        ("agent", _AGENT_SELECT, _AGENT_KEYS),
+    ):
+        for row in session.execute(statement):
+            yield {"type": record_type, **_row_to_dict(keys, row)}
+
+    # The backup is the source of truth; the standalone settings files are not rewritten here
+    yield {"type": "app_settings", "data": _collect_app_settings()}
+    yield {"type": "tenant_settings", "data": _collect_tenant_settings(header["exported_at"])}
+
+    for embedding in iter_product_embeddings(session):
+        yield {"type": "embedding", **embedding}
+
+
+@contextmanager
+def _atomic_backup_writer(backup_file: Path) -> Iterator[BinaryIO]:
+    """
+    Open a backup for binary writing, compressed according to its .gz or .zst suffix.
     
-    logger.info(f"JSON backup completed successfully!")
-    logger.info(f"  - {total_tenants} tenants exported")
-    logger.info(f"  - {total_products} products exported")
-    logger.info(f"  - {total_agents} external agents exported")
-    logger.info(f"  - Backup file: {backup_file}")
+    Data goes to a temporary file that is fsynced and renamed over
+    ``backup_file`` only once fully written, so a crash never leaves a
+    truncated backup behind.
+    """
+    tmp_file = backup_file.with_name(backup_file.name + ".tmp")
+    try:
+        with open(tmp_file, "wb") as raw:
+            if backup_file.suffix == ".gz":
+                with GzipFile(filename=backup_file.name, mode="wb",
+                              compresslevel=BACKUP_COMPRESSLEVEL, fileobj=raw) as f:
+                    yield f
+            elif backup_file.suffix == ".zst":
+                with zstandard.ZstdCompressor(level=BACKUP_ZSTD_LEVEL).stream_writer(raw, closefd=False) as f:
+                    yield f
+            else:
+                yield raw
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_file, backup_file)
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
+
+
+def write_records(f: BinaryIO, records: Iterator[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Write records to an open binary file, one UTF-8 JSON object per line, and count them by type.
     
-    return backup_data
+    Serialized lines are handed to a writer thread in chunks, so gzip
+    compression and disk I/O (which release the GIL) overlap with reading
+    and encoding the next rows. At most one chunk is in flight at a time.
+    """
+    counts: Dict[str, int] = {}
+    chunk: List[bytes] = []
+    chunk_size = 0
+    pending: Optional[Future] = None
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="backup-writer") as writer:
+        for record in records:
+            line = _dumps(record)
+            chunk.append(line)
+            chunk.append(b"\n")
+            chunk_size += len(line) + 1
+            counts[record["type"]] = counts.get(record["type"], 0) + 1
+            
+            if chunk_size >= EXPORT_WRITE_CHUNK_BYTES:
+                if pending is not None:
+                    pending.result()
+                pending = writer.submit(f.write, b"".join(chunk))
+                chunk = []
+                chunk_size = 0
+        
+        if pending is not None:
+            pending.result()
+    f.write(b"".join(chunk))
+    return counts
 
 
 def export_tenants(session: Session) -> List[Dict[str, Any]]:
     """Export all tenants and their products using bulk operations."""
-    logger.info("Starting tenant and product export...")
-    
-    # Get all tenants in one query
-    tenants = session.exec(select(Tenant)).all()
-    logger.info(f"Found {len(tenants)} tenants")
-    
-    # Get all products in one query (much faster than per-tenant queries)
-    all_products = session.exec(select(Product)).all()
-    logger.info(f"Found {len(all_products)} total products")
-    
-    # Create product lookup by tenant_id for O(1) access
-    products_by_tenant = {}
-    for product in all_products:
-        if product.tenant_id not in products_by_tenant:
-            products_by_tenant[product.tenant_id] = []
-        products_by_tenant[product.tenant_id].append(product)
-    
-    # Build tenant data with their products
-    tenants_data = []
-    for tenant in tenants:
-        tenant_products = products_by_tenant.get(tenant.id, [])
-        
-        tenant_data = {
-            "id": tenant.id,
-            "name": tenant.name,
-            "slug": tenant.slug,
-            "custom_prompt": tenant.custom_prompt,
-            "web_grounding_prompt": tenant.web_grounding_prompt,
-            "enable_web_context": tenant.enable_web_context,
-            "created_at": tenant.created_at.isoformat() if tenant.created_at else None,
-            "products": []
-        }
-        
-        # Convert products to dict format in bulk
-        for product in tenant_products:
-            product_data = {
-                "id": product.id,
-                "tenant_id": product.tenant_id,
-                "name": product.name,
-                "description": product.description,
-                "price_cpm": product.price_cpm,
-                "delivery_type": product.delivery_type,
-                "formats_json": product.formats_json,
-                "targeting_json": product.targeting_json,
-                "created_at": product.created_at.isoformat() if product.created_at else None
-            }
-            tenant_data["products"].append(product_data)
-        
-        tenants_data.append(tenant_data)
-    
+    tenants_data = list(iter_tenants(session))
+
     total_products = sum(len(t['products']) for t in tenants_data)
-    logger.info(f"Completed tenant export: {len(tenants)} tenants, {total_products} products")
+    logger.info(
+        "Completed tenant export: %d tenants, %d products", len(tenants_data), total_products,
+        extra={"tenants": len(tenants_data), "products": total_products}
+    )
     return tenants_data
 
 
+def iter_tenants(session: Session) -> Iterator[Dict[str, Any]]:
+    """
+    Yield each tenant with its products nested, one tenant at a time.
+    
+    Tenants (by id) and products (by tenant_id) are streamed in matching
+    order and merged, so only one tenant's products are held at once.
+    """
+    tenants = session.execute(_TENANT_SELECT)
+    product_groups = groupby(session.execute(_PRODUCT_SELECT), key=attrgetter("tenant_id"))
+
+    group = next(product_groups, None)
+    for tenant in tenants:
+        # Products sorting before this tenant reference a tenant that no longer exists
+        while group is not None and group[0] < tenant.id:
+            _log_orphaned_products(*group)
+            group = next(product_groups, None)
+
+        tenant_data = _row_to_dict(_TENANT_KEYS, tenant)
+        if group is not None and group[0] == tenant.id:
+            tenant_data["products"] = [_row_to_dict(_PRODUCT_KEYS, product) for product in group[1]]
+            group = next(product_groups, None)
+        else:
+            tenant_data["products"] = []
+        yield tenant_data
+
+    while group is not None:
+        _log_orphaned_products(*group)
+        group = next(product_groups, None)
+
+
+def _log_orphaned_products(tenant_id: int, products: Iterable[Any]) -> None:
+    """Warn about products skipped because their tenant is missing."""
+    logger.warning(f"Skipping {sum(1 for _ in products)} orphaned products for missing tenant_id: {tenant_id}")
+
+
 def export_external_agents(session: Session) -> List[Dict[str, Any]]:
     """Export all external agents using bulk operations."""
-    logger.info("Starting external agent export...")
-    
-    # Get all external agents in one query
-    agents = session.exec(select(ExternalAgent)).all()
-    logger.info(f"Found {len(agents)} external agents")
-    
-    # Convert to dict format in bulk
-    agents_data = []
-    for agent in agents:
-        agent_data = {
-            "id": agent.id,
-            "name": agent.name,
-            "base_url": agent.base_url,
-            "enabled": agent.enabled,
-            "agent_type": agent.agent_type,
-            "protocol": agent.protocol,
-            "created_at": agent.created_at.isoformat() if agent.created_at else None
-        }
-        agents_data.append(agent_data)
-    
-    logger.info(f"Completed external agent export: {len(agents_data)} agents")
+    agents_data = list(iter_external_agents(session))
+
+    logger.info(
+        "Completed external agent export: %d agents", len(agents_data),
+        extra={"external_agents": len(agents_data)}
+    )
     return agents_data
 
 
+def iter_external_agents(session: Session) -> Iterator[Dict[str, Any]]:
+    """Yield each external agent, streamed from the database in batches."""
+    for agent in session.execute(_AGENT_SELECT):
+        yield _row_to_dict(_AGENT_KEYS, agent)
+
+
+def _row_to_dict(keys: Tuple[str, ...], row: Tuple[Any, ...]) -> Dict[str, Any]:
+    """Convert a column-projected row to its backup representation."""
+    return dict(zip(keys, row))
+
+
 def export_app_settings() -> Dict[str, Any]:
-    """Export application-wide settings."""
-    settings = {
-        "gemini_api_key": os.getenv("GEMINI_API_KEY"),
-        "embeddings_provider": os.getenv("EMBEDDINGS_PROVIDER"),
-        "embeddings_model": os.getenv("EMBEDDINGS_MODEL"),
-        "emb_concurrency": os.getenv("EMB_CONCURRENCY"),
-        "emb_batch_size": os.getenv("EMB_BATCH_SIZE"),
-        "rag_top_k": os.getenv("RAG_TOP_K"),
-        "orchestrator_timeout": os.getenv("ORCH_TIMEOUT_MS_DEFAULT"),
-        "orchestrator_concurrency": os.getenv("ORCH_CONCURRENCY"),
-        "circuit_breaker_fails": os.getenv("CB_FAILS"),
-        "circuit_breaker_ttl": os.getenv("CB_TTL_S"),
-        "mcp_session_ttl": os.getenv("MCP_SESSION_TTL_S")
-    }
-    
-    # Save to settings file
-    with open(SETTINGS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(settings, f, indent=2, ensure_ascii=False)
-    
+    """Export application-wide settings and write them to the standalone settings file."""
+    settings = _collect_app_settings()
+    _dump_json(SETTINGS_FILE, settings)
     logger.info("Exported application settings")
     return settings
 
 
-def export_tenant_settings() -> Dict[str, Any]:
-    """Export tenant-specific settings and prompts."""
+def export_tenant_settings(exported_at: Optional[str] = None) -> Dict[str, Any]:
+    """Export tenant-specific settings and write them to the standalone settings file."""
+    settings = _collect_tenant_settings(exported_at or datetime.now().isoformat())
+    if not (settings["tenant_prompts"] or settings["tenant_configurations"]):
+        logger.info("No tenant settings to export; skipping file write")
+        return settings
+    _dump_json(TENANT_SETTINGS_FILE, settings)
+    logger.info("Exported tenant settings")
+    return settings
+
+
+def _collect_app_settings() -> Dict[str, Any]:
+    """Collect application-wide settings from the environment."""
+    env = os.environ
+    return {key: env.get(var) for key, var in _APP_SETTING_KEYS}
+
+
+def _collect_tenant_settings(exported_at: str) -> Dict[str, Any]:
+    """Collect tenant-specific settings and prompts."""
     # This would include tenant-specific configurations
     # For now, we'll create a placeholder structure
-    settings = {
+    return {
         "tenant_prompts": {},
         "tenant_configurations": {},
-        "exported_at": datetime.now().isoformat()
+        "exported_at": exported_at
     }
-    
-    # Save to settings file
-    with open(TENANT_SETTINGS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(settings, f, indent=2, ensure_ascii=False)
-    
-    logger.info("Exported tenant settings")
-    return settings
+
+
+def _dump_json(path: Path, obj: Dict[str, Any]) -> None:
+    """Atomically persist a dict as a standalone JSON file in one write."""
+    tmp_file = path.with_name(path.name + ".tmp")
+    with open(tmp_file, "wb") as f:
+        f.write(_dumps(obj, pretty=BACKUP_PRETTY))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+
+
+def _dumps(obj: Dict[str, Any], pretty: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes (compact unless ``pretty``), encoding datetimes as ISO 8601."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False, default=_json_default).encode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_json_default).encode("utf-8")
+
+
+def _json_default(value: Any) -> str:
+    """Encode datetimes for the stdlib fallback the same way orjson does."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
 
 
 def export_product_embeddings(session: Session) -> List[Dict[str, Any]]:
     """Export all product embeddings."""
-    logger.info("Starting product embeddings export...")
-    
+    embeddings_data = list(iter_product_embeddings(session))
+    logger.info(
+        "Completed product embeddings export: %d embeddings", len(embeddings_data),
+        extra={"product_embeddings": len(embeddings_data)}
+    )
+    return embeddings_data
+
+
+def iter_product_embeddings(session: Session) -> Iterator[Dict[str, Any]]:
+    """Yield product embeddings one at a time (nothing if the table is missing)."""
+
     try:
-        # Query all embeddings using raw SQL since it's not a SQLModel
-        embeddings_query = """
-        SELECT id, product_id, embedding_text, embedding_hash, embedding, 
-               created_at, provider, model, dim, updated_at, is_stale
-        FROM product_embeddings
-        """
-        
-        result = session.execute(text(embeddings_query))
-        embeddings = result.fetchall()
-        
-        logger.info(f"Found {len(embeddings)} product embeddings")
-        
-        # Convert to list of dictionaries
-        embeddings_data = []
-        for embedding in embeddings:
-            embedding_dict = {
-                "id": embedding[0],
-                "product_id": embedding[1],
-                "embedding_text": embedding[2],
-                "embedding_hash": embedding[3],
-                "embedding": embedding[4].hex() if embedding[4] else None,  # Convert BLOB to hex string
-                "created_at": embedding[5].isoformat() if embedding[5] and hasattr(embedding[5], 'isoformat') else str(embedding[5]) if embedding[5] else None,
-                "provider": embedding[6],
-                "model": embedding[7],
-                "dim": embedding[8],
-                "updated_at": embedding[9],
-                "is_stale": embedding[10]
-            }
-            embeddings_data.append(embedding_dict)
-        
-        logger.info(f"Completed product embeddings export: {len(embeddings_data)} embeddings")
-        return embeddings_data
-        
+        result = session.execute(_EMBEDDING_SELECT)
     except Exception as e:
         logger.error(f"Failed to export product embeddings: {e}")
-        return []
-
-def write_compressed_backup(backup_data: Dict[str, Any], backup_file: str) -> None:
-    """Write backup data to a compressed gzip file."""
-    with gzip.open(backup_file, "wt", encoding="utf-8") as f:
-        json.dump(backup_data, f, separators=(",", ":"), ensure_ascii=False)
+        return
 
-def write_backup(backup_data: Dict[str, Any], backup_file: str) -> None:
-    """Write backup data to a regular JSON file."""
-    with open(backup_file, "w", encoding="utf-8") as f:
-        json.dump(backup_data, f, separators=(",", ":"), ensure_ascii=False)
+    for row in result:
+        embedding = dict(zip(_EMBEDDING_KEYS, row))
+        # BLOB to hex string; created_at is a datetime or already a string, both serialized natively
+        embedding["embedding"] = embedding["embedding"].hex() if embedding["embedding"] else None
+        yield embedding
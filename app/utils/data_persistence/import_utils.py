@@ -2,38 +2,179 @@
 Import functions for data persistence.
 """
 
-import gzip
+import io
 import json
 import logging
+import mmap
 import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import chain, groupby, islice
+from operator import itemgetter
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Any, Optional
-from sqlmodel import Session, select
+from typing import BinaryIO, Callable, Dict, List, Any, Iterable, Iterator, Optional, Set, Tuple
+from sqlalchemy import Engine, bindparam, delete, event, insert, tuple_
+from sqlmodel import Session, select, text
+
+try:
+    from isal import igzip as gzip  # ISA-L's drop-in gzip module gunzips 2-3x faster
+except ImportError:  # Fall back to the stdlib zlib wrapper
+    import gzip
+
+try:
+    import zstandard
+except ImportError:  # Only needed for .zst backups
+    zstandard = None
+
+try:
+    import ijson
+except ImportError:  # Legacy backups are loaded whole without it
+    ijson = None
+
+# Streaming legacy backups only pays off with a compiled ijson backend (yajl2_c);
+# the pure-Python one is slower than loading the whole file with orjson/json
+STREAM_LEGACY_BACKUPS = ijson is not None and ijson.backend != "python"
+
+# Legacy backup files smaller than this (on disk) are decoded in one orjson/json
+# call, which beats ijson's one-pass-per-section streaming when they fit in memory
+LEGACY_STREAM_MIN_BYTES = int(os.getenv("LEGACY_STREAM_MIN_BYTES", str(32 * 1024 * 1024)))
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib decoder
+    orjson = None
 
 from app.models import Tenant, Product, ExternalAgent
-from app.repos.tenants import create_tenant
-from app.repos.external_agents import create_external_agent
-from app.repos.products import create_product
-from .core import ensure_data_directories, BACKUP_DIR
+from app.repos.tenants import validate_tenant
+from app.repos.external_agents import validate_base_url
+from .core import ensure_data_directories, find_backup_files, is_jsonl_backup, BACKUP_DIR
+from .export import _EMBEDDING_KEYS, _EMBEDDING_TABLE_EXISTS
 
 logger = logging.getLogger(__name__)
 
+# Backups are decoded from UTF-8 bytes with orjson when it is available
+_loads = orjson.loads if orjson is not None else json.loads
+
+# Rows are written with one executemany INSERT per batch of this many rows
+IMPORT_BATCH_SIZE = 1000
+
+# SQLite settings used while a restore loads; journal_mode is left alone because
+# rolling back a failed restore (or recovering from a crash) relies on the journal
+IMPORT_SQLITE_PRAGMAS = {"synchronous": "OFF", "temp_store": "MEMORY"}
+
+# Product fields copied verbatim from a backup, fetched with one compiled getter per row
+_PRODUCT_FIELDS = ("name", "description", "price_cpm", "delivery_type", "formats_json", "targeting_json")
+_get_product_fields = itemgetter(*_PRODUCT_FIELDS)
+
+# Products and agents are restored as plain Core executemany INSERTs (no RETURNING,
+# no ORM bulk-insert bookkeeping); import rows always carry every column
+_PRODUCT_INSERT = Product.__table__.insert()
+_AGENT_INSERT = ExternalAgent.__table__.insert()
+
+# Existence check built once and reused for every product batch; the expanding
+# parameter takes each batch's (tenant_id, name) pairs
+_EXISTING_PRODUCT_KEYS = select(Product.tenant_id, Product.name).where(
+    tuple_(Product.tenant_id, Product.name).in_(bindparam("keys", expanding=True))
+)
+
+# Tenant fields restored from a backup onto new or existing tenants
+_TENANT_FIELDS = ("custom_prompt", "web_grounding_prompt", "enable_web_context")
+
+# Product embeddings are not a SQLModel table, so they are inserted with raw SQL
+_EMBEDDING_INSERT = text(
+    f"INSERT INTO product_embeddings ({', '.join(_EMBEDDING_KEYS)}) "
+    f"VALUES ({', '.join(':' + key for key in _EMBEDDING_KEYS)})"
+)
+
+# JSON Lines record types that collect into a list when loaded as one dict
+_RECORD_LISTS = {
+    "tenant": "tenants",
+    "product": "products",
+    "agent": "external_agents",
+    "embedding": "product_embeddings"
+}
+
 
 def import_all_data(session: Session, backup_data: Optional[Dict[str, Any]] = None, backup_file: Optional[str] = None) -> Dict[str, Any]:
-    """Import all application data from backup."""
+    """
+    Import all application data from backup, returning per-section record counts.
+    
+    The whole restore runs in a single transaction that is committed once at
+    the end, or rolled back if any step fails. Autoflush is off meanwhile so
+    lookups don't push pending tenant updates out early, and the commit
+    doesn't expire the objects the import just loaded.
+    """
+    expire_on_commit = session.expire_on_commit
+    session.expire_on_commit = False
+    try:
+        _relax_sqlite_durability(session)
+        with session.no_autoflush:
+            result = _import_backup(session, backup_data, backup_file)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.expire_on_commit = expire_on_commit
+    return result
+
+
+def _relax_sqlite_durability(session: Session) -> None:
+    """
+    Apply IMPORT_SQLITE_PRAGMAS to the session's SQLite connection until it is released.
+    
+    A restore is all-or-nothing and can simply be re-run, so it doesn't need
+    fsyncs while loading. SQLite refuses to change these settings inside a
+    transaction, so the previous values are put back by a pool checkin hook
+    once the connection is returned after commit or rollback. Does nothing on
+    other databases or if the connection is already mid-transaction.
+    """
+    engine = session.get_bind()
+    if not isinstance(engine, Engine) or engine.dialect.name != "sqlite":
+        return
+    if not event.contains(engine, "checkin", _restore_sqlite_pragmas):
+        event.listen(engine, "checkin", _restore_sqlite_pragmas)
+    
+    connection = session.connection().connection
+    if "import_pragmas" in connection.info:
+        return
+    cursor = connection.cursor()
+    try:
+        previous = {name: cursor.execute(f"PRAGMA {name}").fetchone()[0] for name in IMPORT_SQLITE_PRAGMAS}
+        for name, value in IMPORT_SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        connection.info["import_pragmas"] = previous
+    except sqlite3.OperationalError as e:
+        logger.debug("Keeping SQLite durability settings for import: %s", e)
+    finally:
+        cursor.close()
+
+
+def _restore_sqlite_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+    """Pool checkin hook putting back the settings replaced by _relax_sqlite_durability."""
+    previous = connection_record.info.pop("import_pragmas", None)
+    if previous:
+        cursor = dbapi_connection.cursor()
+        for name, value in previous.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def _import_backup(session: Session, backup_data: Optional[Dict[str, Any]], backup_file: Optional[str]) -> Dict[str, Any]:
+    """Import from provided data or a backup file without committing."""
     ensure_data_directories()
     
     if backup_data is None:
         if backup_file is None:
-            # Find the most recent backup (include both .json and .json.gz files)
-            json_files = list(BACKUP_DIR.glob("full_backup_*.json"))
-            gz_files = list(BACKUP_DIR.glob("full_backup_*.json.gz"))
-            backup_files = json_files + gz_files
+            # Find the most recent backup (JSON Lines or legacy JSON)
+            backup_files = find_backup_files()
             if not backup_files:
                 logger.warning("No backup files found")
                 return {}
             
-            backup_file = str(max(backup_files, key=os.path.getctime))
+            backup_file = str(backup_files[0])
         else:
             # Construct full path to backup file
             if not os.path.isabs(backup_file):
@@ -44,230 +185,456 @@ def import_all_data(session: Session, backup_data: Optional[Dict[str, Any]] = No
             logger.error(f"Backup file not found: {backup_file}")
             raise FileNotFoundError(f"Backup file not found: {backup_file}")
         
-        # Handle both compressed (.gz) and uncompressed files
-        backup_path = Path(backup_file)
-        if backup_path.suffix == '.gz':
-            logger.info(f"Loading compressed backup file: {backup_file}")
-            with gzip.open(backup_file, 'rt', encoding='utf-8') as f:
-                backup_data = json.load(f)
-        else:
-            logger.info(f"Loading uncompressed backup file: {backup_file}")
-            with open(backup_file, 'r', encoding='utf-8') as f:
-                backup_data = json.load(f)
+        logger.info("Importing data from: %s", backup_file)
         
-        logger.info(f"Importing data from: {backup_file}")
+        if is_jsonl_backup(backup_file):
+            # Stream records straight from disk, decompressing and parsing the
+            # next chunk in the background while the current one is written
+            with _open_backup(backup_file) as f, _read_ahead(_read_records(f)) as records:
+                result = import_backup_records(session, records)
+            logger.info("Data import completed successfully")
+            return result
+        
+        if STREAM_LEGACY_BACKUPS and os.path.getsize(backup_file) >= LEGACY_STREAM_MIN_BYTES:
+            # Parse legacy single-object backups one section at a time
+            result = _import_sections(
+                session,
+                lambda key: _iter_legacy_items(backup_file, f"{key}.item"),
+                lambda key: _read_legacy_value(backup_file, key)
+            )
+            logger.info("Data import completed successfully")
+            return result
+        
+        backup_data = _load_legacy_backup(backup_file)
     else:
         logger.info("Importing data from provided backup data")
     
+    result = _import_sections(
+        session,
+        lambda key: backup_data.get(key, []),
+        lambda key: backup_data.get(key, {})
+    )
+    
+    logger.info("Data import completed successfully")
+    return result
+
+
+def _import_sections(
+    session: Session,
+    items: Callable[[str], Iterable[Dict[str, Any]]],
+    value: Callable[[str], Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Import a single-object backup given accessors for its list and dict sections, returning counts."""
+    counts: Dict[str, int] = {}
+    
+    def counted(key: str) -> Iterator[Dict[str, Any]]:
+        return _counted(items(key), counts, key)
+    
     # Import in order of dependencies
     # Check if we have the new format (separate arrays) or legacy format (nested products)
-    tenants_data = backup_data.get("tenants", [])
-    products_data = backup_data.get("products", [])
+    products_iter = counted("products")
+    first_product = next(products_iter, None)
     
-    if products_data:
+    if first_product is not None:
         # New format: separate arrays
-        import_tenants_and_products(session, tenants_data, products_data)
+        import_tenants_and_products(session, counted("tenants"), chain([first_product], products_iter))
     else:
         # Legacy format: nested products
-        import_tenants(session, tenants_data)
+        import_tenants(session, counted("tenants"))
     
-    import_external_agents(session, backup_data.get("external_agents", []))
-    import_app_settings(backup_data.get("app_settings", {}))
-    import_tenant_settings(backup_data.get("tenant_settings", {}))
-    import_product_embeddings(session, backup_data.get("product_embeddings", []))
+    import_external_agents(session, counted("external_agents"))
+    import_app_settings(value("app_settings"))
+    import_tenant_settings(value("tenant_settings"))
+    import_product_embeddings(session, counted("product_embeddings"))
+    return {"counts": counts}
+
+
+def import_backup_records(session: Session, records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Restore a full backup from a stream of JSON Lines records.
     
-    logger.info("Data import completed successfully")
+    This is a wipe-and-replace restore, like the separate-arrays JSON format:
+    existing tenants, products, agents and embeddings are deleted first, so the
+    database ends up holding exactly what the backup holds. Only legacy backups
+    with nested products merge into existing data.
+    
+    Records are consumed in the order they were written (header, tenants,
+    products, agents, settings, embeddings); each run of same-typed records is
+    handed to its importer without being collected first.
+    """
+    _clear_existing_data(session)
+    
+    result: Dict[str, Any] = {"counts": {}}
+    tenant_map: Dict[int, int] = {}
+    for record_type, group in groupby(records, key=itemgetter("type")):
+        if record_type == "header":
+            header = next(group)
+            result["version"] = header.get("version")
+            result["exported_at"] = header.get("exported_at")
+            continue
+        
+        group = _counted(group, result["counts"], _RECORD_LISTS.get(record_type, record_type))
+        if record_type == "tenant":
+            tenant_map.update(_import_tenant_records(session, group))
+        elif record_type == "product":
+            _import_product_records(session, group, tenant_map)
+        elif record_type == "agent":
+            import_external_agents(session, group)
+        elif record_type == "app_settings":
+            for record in group:
+                import_app_settings(record.get("data", {}))
+        elif record_type == "tenant_settings":
+            for record in group:
+                import_tenant_settings(record.get("data", {}))
+        elif record_type == "embedding":
+            import_product_embeddings(session, group)
+        else:
+            logger.warning("Skipping unknown backup record type: %s", record_type)
+            for _ in group:
+                pass
+    
+    return result
+
+
+def load_backup_data(backup_file: str) -> Dict[str, Any]:
+    """
+    Load a backup file into a single dict.
+    
+    JSON Lines backups are folded into separate tenants/products arrays. Only
+    use this where the whole payload is genuinely needed (e.g. downloads).
+    """
+    if not is_jsonl_backup(backup_file):
+        return _load_legacy_backup(backup_file)
+    
+    backup_data: Dict[str, Any] = {key: [] for key in _RECORD_LISTS.values()}
+    with _open_backup(backup_file) as f:
+        for record in _read_records(f):
+            record_type = record.pop("type")
+            if record_type == "header":
+                backup_data.update(record)
+            elif record_type in _RECORD_LISTS:
+                backup_data[_RECORD_LISTS[record_type]].append(record)
+            else:
+                backup_data[record_type] = record.get("data", {})
     return backup_data
 
 
-def import_tenants_and_products(session: Session, tenants_data: List[Dict[str, Any]], products_data: List[Dict[str, Any]]) -> None:
-    """Import tenants and products from separate arrays."""
+def read_backup_header(backup_file: str) -> Optional[Dict[str, Any]]:
+    """Read just the header record of a JSON Lines backup (None for legacy JSON backups)."""
+    if not is_jsonl_backup(backup_file):
+        return None
+    with _open_backup(backup_file) as f:
+        record = _loads(f.readline() or b"{}")
+    return record if record.get("type") == "header" else None
+
+
+def _open_backup(backup_file: str) -> BinaryIO:
+    """Open a backup file for binary reading, transparently handling gzip and zstd."""
+    suffix = Path(backup_file).suffix
+    if suffix == '.gz':
+        return gzip.open(backup_file, 'rb')
+    if suffix == '.zst':
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {backup_file}")
+        # The zstd stream reader can't iterate lines by itself; buffer it
+        return io.BufferedReader(zstandard.open(backup_file, 'rb'))
+    return open(backup_file, 'rb')
+
+
+def _read_records(f: BinaryIO) -> Iterator[Dict[str, Any]]:
+    """Yield one record per non-blank line of a JSON Lines backup."""
+    for line in f:
+        if line.strip():
+            yield _loads(line)
+
+
+@contextmanager
+def _read_ahead(records: Iterator[Dict[str, Any]], chunk_size: int = IMPORT_BATCH_SIZE) -> Iterator[Iterator[Dict[str, Any]]]:
+    """
+    Yield an iterator over ``records`` that reads the next chunk on a background thread.
+    
+    The first chunk is requested on entry, so reading overlaps with whatever the
+    caller does first (e.g. clearing tables). At most one chunk is in flight,
+    and exiting waits for it so the underlying file can be closed safely.
+    """
+    def read_chunk() -> List[Dict[str, Any]]:
+        return list(islice(records, chunk_size))
     
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="backup-reader") as executor:
+        pending = executor.submit(read_chunk)
+        
+        def chunked() -> Iterator[Dict[str, Any]]:
+            nonlocal pending
+            while chunk := pending.result():
+                pending = executor.submit(read_chunk)
+                yield from chunk
+        
+        yield chunked()
+
+
+def _load_legacy_backup(backup_file: str) -> Dict[str, Any]:
+    """Load a legacy single-object JSON backup in one go."""
+    if orjson is not None and Path(backup_file).suffix == '.json' and os.path.getsize(backup_file):
+        # orjson parses the mapped file pages directly, without first copying the
+        # whole document onto the heap as read() would
+        with open(backup_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return orjson.loads(view)
+    with _open_backup(backup_file) as f:
+        return _loads(f.read())
+
+
+def _iter_legacy_items(backup_file: str, prefix: str) -> Iterator[Any]:
+    """Incrementally yield the values at ``prefix`` of a legacy JSON backup using ijson."""
+    with _open_backup(backup_file) as f:
+        yield from ijson.items(f, prefix, use_float=True)
+
+
+def _read_legacy_value(backup_file: str, key: str) -> Dict[str, Any]:
+    """Read a single top-level object (e.g. settings) from a legacy JSON backup."""
+    for value in _iter_legacy_items(backup_file, key):
+        return value
+    return {}
+
+
+def _counted(records: Iterable[Dict[str, Any]], counts: Dict[str, int], key: str) -> Iterator[Dict[str, Any]]:
+    """Pass records through while tallying them under ``key``."""
+    for record in records:
+        counts[key] = counts.get(key, 0) + 1
+        yield record
+
+
+def import_tenants_and_products(session: Session, tenants_data: Iterable[Dict[str, Any]], products_data: Iterable[Dict[str, Any]]) -> None:
+    """Import tenants and products from separate arrays (the caller commits)."""
+    _clear_existing_data(session)
+    tenant_map = _import_tenant_records(session, tenants_data)
+    _import_product_records(session, products_data, tenant_map)
+
+
+def _clear_existing_data(session: Session) -> None:
+    """Delete embeddings, products, external agents and tenants ahead of a full restore."""
     # Clear existing data before importing (like CSV import does)
     logger.info("Clearing existing data before import...")
     
-    # Clear products first (they depend on tenants)
-    products = session.exec(select(Product)).all()
-    for product in products:
-        session.delete(product)
+    # Embeddings go too, even if the backup has none: leftover embeddings would
+    # point at whichever restored product now has their product id
+    if session.execute(_EMBEDDING_TABLE_EXISTS).first() is not None:
+        session.execute(text("DELETE FROM product_embeddings"))
     
-    # Clear external agents
-    agents = session.exec(select(ExternalAgent)).all()
-    for agent in agents:
-        session.delete(agent)
+    # One bulk DELETE per table; products first since they depend on tenants
+    for model in (Product, ExternalAgent, Tenant):
+        session.execute(delete(model))
     
-    # Clear tenants last
-    tenants = session.exec(select(Tenant)).all()
-    for tenant in tenants:
-        session.delete(tenant)
-    
-    session.commit()
     logger.info("Cleared existing data")
+
+
+def _import_tenant_records(session: Session, tenants_data: Iterable[Dict[str, Any]]) -> Dict[int, int]:
+    """Create or update tenants, returning a map of backup tenant id to database tenant id."""
+    tenants = list(tenants_data)  # Tenants are few; products are what get streamed
+    tenants_by_slug = _existing_tenants_by_slug(session)
+    created, updated = _upsert_tenants(session, tenants, tenants_by_slug)
+    logger.info("Imported tenants: %d created, %d updated", created, updated)
+    return {tenant_data["id"]: tenants_by_slug[tenant_data["slug"]].id for tenant_data in tenants}
+
+
+def _existing_tenants_by_slug(session: Session) -> Dict[str, Tenant]:
+    """Load every tenant keyed by slug in one query."""
+    return {tenant.slug: tenant for tenant in session.exec(select(Tenant))}
+
+
+def _upsert_tenants(session: Session, tenants_data: Iterable[Dict[str, Any]], tenants_by_slug: Dict[str, Tenant]) -> Tuple[int, int]:
+    """
+    Update tenants already in ``tenants_by_slug`` and bulk-insert the rest, adding them to it.
+    
+    Returns how many tenants were created and updated, for the caller's summary log.
+    
+    New tenants are written with one executemany INSERT ... RETURNING per
+    batch, so they come back as loaded objects (ids included) in the same
+    round trip, without a flush or lookup per tenant.
+    """
+    new_rows: Dict[str, Dict[str, Any]] = {}
+    tenants_updated = 0
     
-    # First, import all tenants
-    tenant_map = {}  # Map backup tenant_id to actual tenant
     for tenant_data in tenants_data:
-        # Check if tenant exists using SQLModel
-        existing_tenant = session.exec(select(Tenant).where(Tenant.slug == tenant_data["slug"])).first()
+        slug = tenant_data["slug"]
+        tenant = tenants_by_slug.get(slug)
+        if tenant is not None:
+            # Update tenant fields that exist in the backup and actually differ
+            changes = [
+                (field, tenant_data[field]) for field in _TENANT_FIELDS
+                if field in tenant_data and getattr(tenant, field) != tenant_data[field]
+            ]
+            for field, value in changes:
+                setattr(tenant, field, value)
+            tenants_updated += bool(changes)
+            continue
         
-        if existing_tenant:
-            logger.info(f"Tenant already exists: {existing_tenant.name}")
-            tenant = existing_tenant
-            # Update tenant fields if they exist in backup
-            if "custom_prompt" in tenant_data:
-                tenant.custom_prompt = tenant_data["custom_prompt"]
-            if "enable_web_context" in tenant_data:
-                tenant.enable_web_context = tenant_data["enable_web_context"]
-            session.add(tenant)
-            session.commit()
+        row = new_rows.get(slug)
+        if row is None:
+            validate_tenant(tenant_data["name"], slug)
+            row = new_rows[slug] = {
+                "name": tenant_data["name"].strip(),
+                "slug": slug,
+                "custom_prompt": None,
+                "web_grounding_prompt": None,
+                "enable_web_context": False,
+                "created_at": _parse_created_at(tenant_data.get("created_at"))
+            }
+        row.update((field, tenant_data[field]) for field in _TENANT_FIELDS if field in tenant_data)
+    
+    returning = session.get_bind().dialect.insert_executemany_returning
+    for batch in _batched(new_rows.values(), IMPORT_BATCH_SIZE):
+        if returning:
+            tenants = session.scalars(insert(Tenant).returning(Tenant), batch)
         else:
-            # Create tenant
-            tenant = create_tenant(
-                session=session,
-                name=tenant_data["name"],
-                slug=tenant_data["slug"]
-            )
-            logger.info(f"Created tenant: {tenant.name}")
-            
-            # Update additional fields after creation
-            if "custom_prompt" in tenant_data:
-                tenant.custom_prompt = tenant_data["custom_prompt"]
-            if "enable_web_context" in tenant_data:
-                tenant.enable_web_context = tenant_data["enable_web_context"]
-            session.add(tenant)
-            session.commit()
-        
-        tenant_map[tenant_data["id"]] = tenant
+            # SQLite before 3.35 has no RETURNING; read the new rows back by slug instead
+            session.execute(insert(Tenant), batch)
+            tenants = session.scalars(select(Tenant).where(Tenant.slug.in_([row["slug"] for row in batch])))
+        tenants_by_slug.update((tenant.slug, tenant) for tenant in tenants)
     
-    # Then, import all products
-    products_imported = 0
-    for product_data in products_data:
-        tenant_id = product_data.get("tenant_id")
-        if tenant_id not in tenant_map:
-            logger.warning(f"Product {product_data['name']} references unknown tenant_id: {tenant_id}")
-            continue
-        
-        tenant = tenant_map[tenant_id]
-        
-        # Check if product exists using SQLModel
-        existing_product = session.exec(select(Product).where(
-            Product.tenant_id == tenant.id,
-            Product.name == product_data["name"]
-        )).first()
-        
-        if existing_product:
-            continue  # Product already exists
-        
-        # Create product
-        create_product(
-            session=session,
-            tenant_id=tenant.id,
-            name=product_data["name"],
-            description=product_data["description"],
-            price_cpm=product_data["price_cpm"],
-            delivery_type=product_data["delivery_type"],
-            formats_json=product_data["formats_json"],
-            targeting_json=product_data["targeting_json"]
-        )
-        products_imported += 1
+    return len(new_rows), tenants_updated
+
+
+def _import_product_records(session: Session, products_data: Iterable[Dict[str, Any]], tenant_map: Dict[int, int]) -> int:
+    """
+    Bulk-insert products for already-imported tenants, returning how many were created.
+    
+    Only used by full restores, which empty the product table first, so each
+    product keeps its backed-up id and restored embeddings (which reference
+    product ids) still point at the right product.
+    """
+    def rows() -> Iterator[Dict[str, Any]]:
+        get_tenant_id = tenant_map.get
+        for product_data in products_data:
+            # One map lookup per product both validates the FK and resolves the new id
+            tenant_id = get_tenant_id(product_data.get("tenant_id"))
+            if tenant_id is None:
+                logger.warning("Product %s references unknown tenant_id: %s", product_data["name"], product_data.get("tenant_id"))
+                continue
+            row = _product_row(tenant_id, product_data)
+            row["id"] = product_data.get("id")  # None lets SQLite assign one
+            yield row
     
-    logger.info(f"Imported {products_imported} products across {len(tenant_map)} tenants")
+    products_imported = _insert_products(session, rows())
+    logger.info("Imported %d products across %d tenants", products_imported, len(tenant_map))
+    return products_imported
 
 
-def import_tenants(session: Session, tenants_data: List[Dict[str, Any]]) -> None:
-    """Import tenants and their products (legacy format with nested products)."""
-    for tenant_data in tenants_data:
-        # Check if tenant exists using SQLModel
-        existing_tenant = session.exec(select(Tenant).where(Tenant.slug == tenant_data["slug"])).first()
-        
-        if existing_tenant:
-            logger.info(f"Tenant already exists: {existing_tenant.name}")
-            tenant = existing_tenant
-            # Update tenant fields if they exist in backup
-            if "custom_prompt" in tenant_data:
-                tenant.custom_prompt = tenant_data["custom_prompt"]
-            if "web_grounding_prompt" in tenant_data:
-                tenant.web_grounding_prompt = tenant_data["web_grounding_prompt"]
-            if "enable_web_context" in tenant_data:
-                tenant.enable_web_context = tenant_data["enable_web_context"]
-            session.add(tenant)
-            session.commit()
-        else:
-            # Create tenant
-            tenant = create_tenant(
-                session=session,
-                name=tenant_data["name"],
-                slug=tenant_data["slug"]
-            )
-            logger.info(f"Created tenant: {tenant.name}")
-            
-            # Update additional fields after creation
-            if "custom_prompt" in tenant_data:
-                tenant.custom_prompt = tenant_data["custom_prompt"]
-            if "web_grounding_prompt" in tenant_data:
-                tenant.web_grounding_prompt = tenant_data["web_grounding_prompt"]
-            if "enable_web_context" in tenant_data:
-                tenant.enable_web_context = tenant_data["enable_web_context"]
-            session.add(tenant)
-            session.commit()
-        
-        # Import products
-        for product_data in tenant_data.get("products", []):
-            # Check if product exists
-            existing_product = session.query(Product).filter(
-                Product.tenant_id == tenant.id,
-                Product.name == product_data["name"]
-            ).first()
-            
-            if existing_product:
-                continue  # Product already exists
-            
-            # Create product
-            create_product(
-                session=session,
-                tenant_id=tenant.id,
-                name=product_data["name"],
-                description=product_data["description"],
-                price_cpm=product_data["price_cpm"],
-                delivery_type=product_data["delivery_type"],
-                formats_json=product_data["formats_json"],
-                targeting_json=product_data["targeting_json"]
-            )
-        
-        logger.info(f"Imported {len(tenant_data.get('products', []))} products for tenant: {tenant.name}")
+def _insert_products(session: Session, rows: Iterable[Dict[str, Any]]) -> int:
+    """
+    Insert product rows whose (tenant_id, name) does not exist yet.
+    
+    Each batch costs one existence SELECT over just its own keys plus one
+    executemany INSERT. Rows inserted by earlier batches are visible to later
+    lookups within the transaction, so duplicates across batches are skipped
+    too.
+    """
+    products_imported = 0
+    for batch in _batched(rows, IMPORT_BATCH_SIZE):
+        keys = [(row["tenant_id"], row["name"]) for row in batch]
+        existing = _existing_product_keys(session, list(set(keys)))
+        new_rows = []
+        for key, row in zip(keys, batch):
+            if key not in existing:
+                existing.add(key)  # Skip repeats within the batch as well
+                new_rows.append(row)
+        if new_rows:
+            session.execute(_PRODUCT_INSERT, new_rows)
+            products_imported += len(new_rows)
+    return products_imported
 
 
-def import_external_agents(session: Session, agents_data: List[Dict[str, Any]]) -> None:
-    """Import external agents."""
-    for agent_data in agents_data:
-        # Check if agent exists by name using SQLModel
-        existing_agent = session.exec(select(ExternalAgent).where(
-            ExternalAgent.name == agent_data["name"]
-        )).first()
-        
-        if existing_agent:
-            logger.info(f"External agent already exists: {existing_agent.name}")
-            continue
-        
-        # Create agent
-        create_external_agent(
-            session=session,
-            name=agent_data["name"],
-            endpoint_url=agent_data["base_url"],  # Map base_url to endpoint_url
-            api_key=agent_data.get("api_key"),
-            is_active=agent_data.get("enabled", True)  # Map enabled to is_active
+def _existing_product_keys(session: Session, candidates: List[Tuple[int, str]]) -> Set[Tuple[int, str]]:
+    """Return which of the given (tenant_id, name) pairs already exist, in one IN-clause query."""
+    if not candidates:
+        return set()
+    return set(session.execute(_EXISTING_PRODUCT_KEYS, {"keys": candidates}).tuples())
+
+
+def _product_row(tenant_id: int, product_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Build an insert row for a product from its backup representation."""
+    row = dict(zip(_PRODUCT_FIELDS, _get_product_fields(product_data)))
+    row["tenant_id"] = tenant_id
+    row["created_at"] = _parse_created_at(product_data.get("created_at"))
+    return row
+
+
+def _parse_created_at(created_at: Optional[str]) -> datetime:
+    """Restore a backed-up creation time, defaulting to now."""
+    return datetime.fromisoformat(created_at) if created_at else datetime.now(timezone.utc)
+
+
+def _batched(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Yield lists of up to ``size`` items."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def import_tenants(session: Session, tenants_data: Iterable[Dict[str, Any]]) -> None:
+    """Import tenants and their products (legacy format with nested products; the caller commits)."""
+    # Load existing tenants once for the whole import, not per tenant
+    tenants_by_slug = _existing_tenants_by_slug(session)
+    tenants_created = tenants_updated = products_imported = 0
+    
+    for tenants in _batched(tenants_data, IMPORT_BATCH_SIZE):
+        created, updated = _upsert_tenants(session, tenants, tenants_by_slug)
+        tenants_created += created
+        tenants_updated += updated
+        rows = (
+            _product_row(tenants_by_slug[tenant_data["slug"]].id, product_data)
+            for tenant_data in tenants
+            for product_data in tenant_data.get("products", [])
         )
-        logger.info(f"Created external agent: {agent_data['name']}")
+        products_imported += _insert_products(session, rows)
+    
+    # One summary for the whole phase rather than one per batch
+    logger.info(
+        "Imported tenants: %d created, %d updated; %d products",
+        tenants_created, tenants_updated, products_imported
+    )
+
+
+def import_external_agents(session: Session, agents_data: Iterable[Dict[str, Any]]) -> None:
+    """Import external agents (the caller commits)."""
+    # Load existing agent names once instead of querying per agent
+    existing = set(session.exec(select(ExternalAgent.name)))
+    agents_skipped = 0
+    
+    def new_rows() -> Iterator[Dict[str, Any]]:
+        nonlocal agents_skipped
+        for agent_data in agents_data:
+            if agent_data["name"] in existing:
+                agents_skipped += 1  # Reported once in the summary below, not per agent
+                continue
+            validate_base_url(agent_data["base_url"])
+            existing.add(agent_data["name"])
+            yield {
+                "name": agent_data["name"],
+                "base_url": agent_data["base_url"],
+                "enabled": agent_data.get("enabled", True),
+                "agent_type": agent_data.get("agent_type", "sales"),
+                "protocol": agent_data.get("protocol", "rest"),
+                "created_at": _parse_created_at(agent_data.get("created_at"))
+            }
+    
+    agents_imported = 0
+    for batch in _batched(new_rows(), IMPORT_BATCH_SIZE):
+        session.execute(_AGENT_INSERT, batch)
+        agents_imported += len(batch)
+    logger.info("Imported %d external agents (%d already existed)", agents_imported, agents_skipped)
 
 
 def import_app_settings(settings: Dict[str, Any]) -> None:
     """Import application-wide settings."""
     # Note: Environment variables are typically set at deployment time
     # This function logs what settings should be configured
+    if not logger.isEnabledFor(logging.INFO):
+        return
     logger.info("Application settings that should be configured:")
     for key, value in settings.items():
         if value:
-            logger.info(f"  {key}: {value[:10]}..." if len(str(value)) > 10 else f"  {key}: {value}")
+            value = str(value)
+            logger.info("  %s: %s", key, value[:10] + "..." if len(value) > 10 else value)
 
 
 def import_tenant_settings(settings: Dict[str, Any]) -> None:
@@ -275,57 +642,67 @@ def import_tenant_settings(settings: Dict[str, Any]) -> None:
     logger.info("Tenant settings imported")
 
 
-def import_product_embeddings(session: Session, embeddings_data: List[Dict[str, Any]]) -> None:
-    """Import product embeddings."""
-    if not embeddings_data:
+def import_product_embeddings(session: Session, embeddings_data: Iterable[Dict[str, Any]]) -> None:
+    """Import product embeddings (the caller commits)."""
+    embeddings_iter = iter(embeddings_data)
+    first_embedding = next(embeddings_iter, None)
+    if first_embedding is None:
         logger.info("No product embeddings to import")
         return
     
-    logger.info(f"Starting import of {len(embeddings_data)} product embeddings...")
-    
     try:
         # Clear existing embeddings to avoid conflicts
-        session.execute("DELETE FROM product_embeddings")
-        logger.info("Cleared existing product embeddings")
+        session.execute(text("DELETE FROM product_embeddings"))
         
         embeddings_imported = 0
-        for embedding_data in embeddings_data:
-            try:
-                # Convert hex string back to BLOB
-                embedding_blob = bytes.fromhex(embedding_data["embedding"]) if embedding_data["embedding"] else None
-                
-                # Insert embedding using raw SQL since it's not a SQLModel
-                insert_query = """
-                INSERT INTO product_embeddings 
-                (id, product_id, embedding_text, embedding_hash, embedding, created_at, 
-                 provider, model, dim, updated_at, is_stale)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """
-                
-                session.execute(insert_query, (
-                    embedding_data["id"],
-                    embedding_data["product_id"],
-                    embedding_data["embedding_text"],
-                    embedding_data["embedding_hash"],
-                    embedding_blob,
-                    embedding_data["created_at"],
-                    embedding_data["provider"],
-                    embedding_data["model"],
-                    embedding_data["dim"],
-                    embedding_data["updated_at"],
-                    embedding_data["is_stale"]
-                ))
-                
-                embeddings_imported += 1
-                
-            except Exception as e:
-                logger.warning(f"Failed to import embedding for product_id {embedding_data.get('product_id', 'unknown')}: {e}")
-                continue
+        for embeddings in _batched(chain([first_embedding], embeddings_iter), IMPORT_BATCH_SIZE):
+            rows = _embedding_rows(embeddings)
+            if rows:
+                session.execute(_EMBEDDING_INSERT, rows)
+                embeddings_imported += len(rows)
         
-        session.commit()
-        logger.info(f"Successfully imported {embeddings_imported} product embeddings")
+        logger.info("Successfully imported %d product embeddings", embeddings_imported)
         
     except Exception as e:
         logger.error(f"Failed to import product embeddings: {e}")
-        session.rollback()
         raise
+
+
+def _embedding_rows(embeddings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Build insert rows for a batch of embeddings, decoding all their hex blobs in one call.
+    
+    Each row gets a memoryview slice of the shared payload rather than its own
+    bytes copy. A batch with any malformed row is decoded row by row instead,
+    so only the bad embeddings are skipped.
+    """
+    try:
+        rows = [{key: embedding_data[key] for key in _EMBEDDING_KEYS} for embedding_data in embeddings]
+        hex_blobs = [row["embedding"] or "" for row in rows]
+        hex_payload = "".join(hex_blobs)
+        payload = memoryview(bytes.fromhex(hex_payload))
+    except (KeyError, TypeError, ValueError):
+        return [row for row in map(_embedding_row, embeddings) if row is not None]
+    
+    if len(payload) * 2 != len(hex_payload) or any(len(hex_blob) % 2 for hex_blob in hex_blobs):
+        # Whitespace or odd-length blobs would shift the slice offsets
+        return [row for row in map(_embedding_row, embeddings) if row is not None]
+    
+    offset = 0
+    for row, hex_blob in zip(rows, hex_blobs):
+        size = len(hex_blob) // 2
+        row["embedding"] = payload[offset:offset + size] if hex_blob else None
+        offset += size
+    return rows
+
+
+def _embedding_row(embedding_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Build an insert row for an embedding, or None (with a warning) if it is malformed."""
+    try:
+        row = {key: embedding_data[key] for key in _EMBEDDING_KEYS}
+        # Convert hex string back to BLOB
+        row["embedding"] = bytes.fromhex(row["embedding"]) if row["embedding"] else None
+        return row
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning("Failed to import embedding for product_id %s: %s", embedding_data.get("product_id", "unknown"), e)
+        return None
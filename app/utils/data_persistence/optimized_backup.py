@@ -3,27 +3,102 @@ Fully optimized backup and restore system for AdCP Demo.
 Provides comprehensive backup of all data and settings with async operations for speed.
 """
 
+import array
 import asyncio
-import gzip
-import json
+import atexit
+import base64
 import logging
 import os
-import struct
 from datetime import datetime
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Tuple
+from typing import BinaryIO, Callable, Dict, List, Any, Iterable, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor
 import sqlite3
+from collections import OrderedDict
 
 from sqlmodel import Session, select, text
 from sqlalchemy import text as alchemy_text
 
+try:
+    from isal import igzip as gzip  # ISA-L's drop-in gzip module deflates several times faster
+except ImportError:  # Fall back to the stdlib zlib wrapper
+    import gzip
+
 from app.models import Tenant, Product, ExternalAgent
 from .core import ensure_data_directories, BACKUP_DIR, SETTINGS_FILE, TENANT_SETTINGS_FILE
+# JSON goes through the shared codecs, which use orjson when it is installed
+from .export import _dump_json, _dumps, zstandard, BACKUP_COMPRESSLEVEL, BACKUP_ZSTD, BACKUP_ZSTD_LEVEL
+from .import_utils import _loads, _open_backup, _relax_sqlite_durability
 
 logger = logging.getLogger(__name__)
 
 
+# Worker threads for backup and restore I/O, shared for the life of the process
+# so repeated (e.g. scheduled) backups don't start threads each time
+_BACKUP_POOL = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 4), thread_name_prefix="backup")
+atexit.register(_BACKUP_POOL.shutdown, wait=False)
+
+# Rows per encoder call when writing large backup sections
+_SECTION_CHUNK_ROWS = 1000
+
+# Validation results for recently validated backup files, keyed on
+# (path, mtime, size) so a rewritten file is validated afresh
+VALIDATION_CACHE_SIZE = 4
+_validation_cache: "OrderedDict[Tuple[str, int, int], Dict[str, Any]]" = OrderedDict()
+
+# Environment variables recorded in the app settings section of a backup
+_BACKUP_ENV_VARS = (
+    "GEMINI_API_KEY", "EMBEDDINGS_PROVIDER", "EMBEDDINGS_MODEL",
+    "EMB_CONCURRENCY", "EMB_BATCH_SIZE", "RAG_TOP_K",
+    "ORCH_TIMEOUT_MS_DEFAULT", "ORCH_CONCURRENCY",
+    "CB_FAILS", "CB_TTL_S", "MCP_SESSION_TTL_S",
+    "ENABLE_WEB_CONTEXT", "WEB_CONTEXT_TIMEOUT_MS",
+    "WEB_CONTEXT_MAX_SNIPPETS", "GEMINI_MODEL",
+    "DEBUG", "SERVICE_BASE_URL", "SKIP_REFERENCE_VALIDATION"
+)
+
+# Host details for backup metadata don't change while the process runs
+_SYSTEM_INFO = {
+    "hostname": os.uname().nodename if hasattr(os, 'uname') else 'unknown',
+    "platform": os.name,
+    "python_version": os.sys.version.split()[0],
+    "backup_tool_version": "2.0"
+}
+
+
+# Filters sqlite_master (aliased m in joins) down to the application's own tables
+_USER_TABLES = "WHERE m.type='table' AND m.name NOT LIKE 'sqlite_%'"
+_FOREIGN_KEY_FIELDS = ("id", "seq", "table", "from", "to", "on_update", "on_delete", "match")
+
+
+def _insert_sql(table: str, columns: Tuple[str, ...]) -> str:
+    """Build a positional INSERT OR REPLACE for the DB-API cursor."""
+    return f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+
+# Restore statements are fixed strings, so sqlite3's per-connection statement
+# cache prepares each one once however many rows or restores go through it
+_TENANT_INSERT_SQL = _insert_sql(
+    "tenant",
+    ("id", "name", "slug", "custom_prompt", "web_grounding_prompt", "enable_web_context", "created_at")
+)
+_PRODUCT_INSERT_SQL = _insert_sql(
+    "product",
+    ("id", "tenant_id", "name", "description", "price_cpm", "delivery_type",
+     "formats_json", "targeting_json", "created_at")
+)
+_AGENT_INSERT_SQL = _insert_sql(
+    "externalagent",
+    ("id", "name", "base_url", "enabled", "agent_type", "protocol", "created_at")
+)
+_EMBEDDING_INSERT_SQL = _insert_sql(
+    "product_embeddings",
+    ("id", "product_id", "embedding_text", "embedding_hash", "embedding",
+     "provider", "model", "dim", "updated_at", "is_stale", "created_at")
+)
+
+
 class OptimizedBackupManager:
     """High-performance backup and restore manager."""
     
@@ -43,16 +118,13 @@ class OptimizedBackupManager:
         """
         logger.info("🚀 Starting comprehensive optimized backup...")
         
-        # Export data sequentially to avoid SQLAlchemy session conflicts
         # Each export operation is optimized with bulk operations
-        tenants_data = self._export_tenants_bulk()
-        products_data = self._export_products_bulk()
-        external_agents_data = self._export_external_agents_bulk()
-        embeddings_data = self._export_embeddings_bulk()
-        app_settings_data = self._export_app_settings_comprehensive()
-        tenant_settings_data = self._export_tenant_settings_comprehensive()
-        schema_data = self._export_database_schema()
-        fts_data = self._export_fts_tables()
+        # and runs off the event loop where the session allows it
+        tenants_data, products_data, external_agents_data, embeddings_data = await self._export_tables()
+        app_settings_data = await self._offload(self._export_app_settings_comprehensive)
+        tenant_settings_data = await self._offload(self._export_tenant_settings_comprehensive)
+        schema_data = await self._offload(self._export_database_schema)
+        fts_data = await self._offload(self._export_fts_tables)
         
         # Compile comprehensive backup
         backup_data = {
@@ -91,7 +163,9 @@ class OptimizedBackupManager:
         # Save backup file
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         if use_compression:
-            backup_file = BACKUP_DIR / f"comprehensive_backup_{timestamp}.json.gz"
+            # BACKUP_COMPRESS=zstd selects zstandard, as for the JSON Lines backups
+            compression = ".zst" if BACKUP_ZSTD else ".gz"
+            backup_file = BACKUP_DIR / f"comprehensive_backup_{timestamp}.json{compression}"
             await self._write_compressed_backup_async(backup_data, backup_file)
         else:
             backup_file = BACKUP_DIR / f"comprehensive_backup_{timestamp}.json"
@@ -135,25 +209,34 @@ class OptimizedBackupManager:
                 raise ValueError(f"Backup validation failed: {validation_result['errors']}")
             logger.info("✅ Backup validation passed")
         
-        # Clear existing data (with confirmation in production)
-        await self._clear_existing_data()
-        
-        # Restore data sequentially with bulk operations for speed
-        # Order matters for foreign key relationships
-        self._restore_tenants_bulk(backup_data.get("tenants", []))
-        self._restore_products_bulk(backup_data.get("products", []))
-        self._restore_external_agents_bulk(backup_data.get("external_agents", []))
-        self._restore_embeddings_bulk(backup_data.get("product_embeddings", []))
-        self._restore_app_settings(backup_data.get("app_settings", {}))
-        self._restore_tenant_settings(backup_data.get("tenant_settings", {}))
-        
-        # Restore database schema and indexes
-        if "database_schema" in backup_data:
-            await self._restore_database_schema(backup_data["database_schema"])
-        
-        # Restore FTS tables
-        if "fts_tables" in backup_data:
-            await self._restore_fts_tables(backup_data["fts_tables"])
+        # Clear and reload everything in one transaction, committed once at the
+        # end, with SQLite's per-commit fsyncs relaxed for the bulk load
+        _relax_sqlite_durability(self.session)
+        try:
+            # Clear existing data (with confirmation in production)
+            await self._clear_existing_data()
+            
+            # Restore data sequentially with bulk operations for speed
+            # Order matters for foreign key relationships
+            await self._offload(self._restore_tenants_bulk, backup_data.get("tenants", []))
+            await self._offload(self._restore_products_bulk, backup_data.get("products", []))
+            await self._offload(self._restore_external_agents_bulk, backup_data.get("external_agents", []))
+            await self._offload(self._restore_embeddings_bulk, backup_data.get("product_embeddings", []))
+            self._restore_app_settings(backup_data.get("app_settings", {}))
+            self._restore_tenant_settings(backup_data.get("tenant_settings", {}))
+            
+            # Restore database schema and indexes
+            if "database_schema" in backup_data:
+                await self._restore_database_schema(backup_data["database_schema"])
+            
+            # Restore FTS tables
+            if "fts_tables" in backup_data:
+                await self._restore_fts_tables(backup_data["fts_tables"])
+            
+            await self._offload(self.session.commit)
+        except Exception:
+            self.session.rollback()
+            raise
         
         # Final validation
         validation_result = await self._validate_restored_data(backup_data)
@@ -167,126 +250,188 @@ class OptimizedBackupManager:
         
         return validation_result
     
+    def _session_is_thread_bound(self) -> bool:
+        """Whether the session's database only exists on its current thread's connection (in-memory SQLite)."""
+        engine = self.session.get_bind()
+        return engine.dialect.name == "sqlite" and engine.url.database in (None, "", ":memory:")
+    
+    async def _offload(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run a blocking call in a worker thread so the event loop keeps serving requests.
+        
+        Calls are awaited one at a time, so the session is never used by two
+        threads at once. In-memory SQLite runs inline: a worker thread would get
+        its own, empty, database.
+        """
+        if self._session_is_thread_bound():
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(_BACKUP_POOL, fn, *args)
+    
     # ========== EXPORT METHODS ==========
     
-    def _export_tenants_bulk(self) -> List[Dict[str, Any]]:
+    async def _export_tables(self) -> Tuple[List[Dict[str, Any]], ...]:
+        """
+        Export tenants, products, external agents and embeddings.
+        
+        For a file-backed SQLite database the four table scans run concurrently,
+        each in a worker thread on its own pooled connection, so the session
+        itself is never shared between threads. Anything else (an in-memory
+        database is private to one connection) exports sequentially through
+        the session.
+        """
+        exports = (
+            self._export_tenants_bulk,
+            self._export_products_bulk,
+            self._export_external_agents_bulk,
+            self._export_embeddings_bulk
+        )
+        engine = self.session.get_bind()
+        if engine.dialect.name != "sqlite" or self._session_is_thread_bound():
+            return tuple([await self._offload(export) for export in exports])
+        
+        def run(export):
+            connection = engine.raw_connection()
+            try:
+                return export(connection)
+            finally:
+                connection.close()
+        
+        loop = asyncio.get_running_loop()
+        return tuple(await asyncio.gather(*(loop.run_in_executor(_BACKUP_POOL, run, export) for export in exports)))
+    
+    def _raw_query(self, sql: str, connection: Any = None) -> sqlite3.Cursor:
+        """
+        Run a query on a DB-API connection and return the cursor.
+        
+        Bulk exports iterate plain tuples from the driver, skipping SQLAlchemy's
+        per-row Row construction; timestamps come back as the ISO text SQLite
+        stores, so they are exported without any per-row conversion. Without an explicit ``connection`` the query
+        runs on the session's own connection, inside its transaction.
+        """
+        if connection is None:
+            connection = self.session.connection().connection
+        cursor = connection.cursor()
+        cursor.execute(sql)
+        return cursor
+    
+    def _raw_executemany(self, sql: str, rows: Iterable[Tuple[Any, ...]]) -> None:
+        """Run one driver-level executemany within the session's transaction."""
+        self.session.connection().connection.cursor().executemany(sql, rows)
+    
+    def _export_tenants_bulk(self, connection: Any = None) -> List[Dict[str, Any]]:
         """Export all tenants using bulk SQL operations."""
         logger.info("📊 Exporting tenants...")
         
-        result = self.session.execute(text("""
+        cursor = self._raw_query("""
             SELECT id, name, slug, custom_prompt, web_grounding_prompt, 
                    enable_web_context, created_at
             FROM tenant
             ORDER BY id
-        """))
-        
-        tenants = []
-        for row in result:
-            tenant_dict = {
-                "id": row.id,
-                "name": row.name,
-                "slug": row.slug,
-                "custom_prompt": row.custom_prompt,
-                "web_grounding_prompt": row.web_grounding_prompt,
-                "enable_web_context": bool(row.enable_web_context),
-                "created_at": row.created_at.isoformat() if hasattr(row.created_at, 'isoformat') and row.created_at else str(row.created_at) if row.created_at else None
+        """, connection)
+        
+        tenants = [
+            {
+                "id": id_,
+                "name": name,
+                "slug": slug,
+                "custom_prompt": custom_prompt,
+                "web_grounding_prompt": web_grounding_prompt,
+                "enable_web_context": bool(enable_web_context),
+                "created_at": created_at or None
             }
-            tenants.append(tenant_dict)
+            for id_, name, slug, custom_prompt, web_grounding_prompt, enable_web_context, created_at in cursor
+        ]
         
         logger.info(f"✅ Exported {len(tenants)} tenants")
         return tenants
     
-    def _export_products_bulk(self) -> List[Dict[str, Any]]:
+    def _export_products_bulk(self, connection: Any = None) -> List[Dict[str, Any]]:
         """Export all products using bulk SQL operations."""
         logger.info("📦 Exporting products...")
         
-        result = self.session.execute(text("""
+        cursor = self._raw_query("""
             SELECT id, tenant_id, name, description, price_cpm, delivery_type,
                    formats_json, targeting_json, created_at
             FROM product
             ORDER BY tenant_id, id
-        """))
-        
-        products = []
-        for row in result:
-            product_dict = {
-                "id": row.id,
-                "tenant_id": row.tenant_id,
-                "name": row.name,
-                "description": row.description,
-                "price_cpm": float(row.price_cpm),
-                "delivery_type": row.delivery_type,
-                "formats_json": row.formats_json,
-                "targeting_json": row.targeting_json,
-                "created_at": row.created_at.isoformat() if hasattr(row.created_at, 'isoformat') and row.created_at else str(row.created_at) if row.created_at else None
+        """, connection)
+        
+        products = [
+            {
+                "id": id_,
+                "tenant_id": tenant_id,
+                "name": name,
+                "description": description,
+                "price_cpm": float(price_cpm),
+                "delivery_type": delivery_type,
+                "formats_json": formats_json,
+                "targeting_json": targeting_json,
+                "created_at": created_at or None
             }
-            products.append(product_dict)
+            for id_, tenant_id, name, description, price_cpm, delivery_type, formats_json, targeting_json, created_at in cursor
+        ]
         
         logger.info(f"✅ Exported {len(products)} products")
         return products
     
-    def _export_external_agents_bulk(self) -> List[Dict[str, Any]]:
+    def _export_external_agents_bulk(self, connection: Any = None) -> List[Dict[str, Any]]:
         """Export all external agents."""
         logger.info("🤖 Exporting external agents...")
         
-        result = self.session.execute(text("""
+        cursor = self._raw_query("""
             SELECT id, name, base_url, enabled, agent_type, protocol, created_at
             FROM externalagent
             ORDER BY id
-        """))
-        
-        agents = []
-        for row in result:
-            agent_dict = {
-                "id": row.id,
-                "name": row.name,
-                "base_url": row.base_url,
-                "enabled": bool(row.enabled),
-                "agent_type": row.agent_type,
-                "protocol": row.protocol,
-                "created_at": row.created_at.isoformat() if hasattr(row.created_at, 'isoformat') and row.created_at else str(row.created_at) if row.created_at else None
+        """, connection)
+        
+        agents = [
+            {
+                "id": id_,
+                "name": name,
+                "base_url": base_url,
+                "enabled": bool(enabled),
+                "agent_type": agent_type,
+                "protocol": protocol,
+                "created_at": created_at or None
             }
-            agents.append(agent_dict)
+            for id_, name, base_url, enabled, agent_type, protocol, created_at in cursor
+        ]
         
         logger.info(f"✅ Exported {len(agents)} external agents")
         return agents
     
-    def _export_embeddings_bulk(self) -> List[Dict[str, Any]]:
+    def _export_embeddings_bulk(self, connection: Any = None) -> List[Dict[str, Any]]:
         """Export all product embeddings."""
         logger.info("🧠 Exporting embeddings...")
         
         try:
-            result = self.session.execute(text("""
+            cursor = self._raw_query("""
                 SELECT id, product_id, embedding_text, embedding_hash, 
                        embedding, provider, model, dim, updated_at, 
                        is_stale, created_at
                 FROM product_embeddings
                 ORDER BY product_id
-            """))
+            """, connection)
             
-            embeddings = []
-            for row in result:
-                # Convert embedding bytes back to list
-                embedding_bytes = row.embedding
-                if embedding_bytes:
-                    embedding_list = list(struct.unpack(f'{len(embedding_bytes)//4}f', embedding_bytes))
-                else:
-                    embedding_list = []
-                
-                embedding_dict = {
-                    "id": row.id,
-                    "product_id": row.product_id,
-                    "embedding_text": row.embedding_text,
-                    "embedding_hash": row.embedding_hash,
-                    "embedding": embedding_list,
-                    "provider": row.provider,
-                    "model": row.model,
-                    "dim": row.dim,
-                    "updated_at": row.updated_at,
-                    "is_stale": bool(row.is_stale) if row.is_stale is not None else False,
-                    "created_at": row.created_at.isoformat() if hasattr(row.created_at, 'isoformat') and row.created_at else str(row.created_at) if row.created_at else None
+            # Keep each float32 BLOB as base64 rather than expanding it to a float list
+            embeddings = [
+                {
+                    "id": id_,
+                    "product_id": product_id,
+                    "embedding_text": embedding_text,
+                    "embedding_hash": embedding_hash,
+                    "embedding_b64": base64.b64encode(embedding or b'').decode('ascii'),
+                    "embedding_len": len(embedding or b'') // 4,
+                    "provider": provider,
+                    "model": model,
+                    "dim": dim,
+                    "updated_at": updated_at,
+                    "is_stale": bool(is_stale) if is_stale is not None else False,
+                    "created_at": created_at or None
                 }
-                embeddings.append(embedding_dict)
+                for (id_, product_id, embedding_text, embedding_hash, embedding, provider, model,
+                     dim, updated_at, is_stale, created_at) in cursor
+            ]
             
             logger.info(f"✅ Exported {len(embeddings)} embeddings")
             return embeddings
@@ -299,28 +444,16 @@ class OptimizedBackupManager:
         """Export comprehensive application settings."""
         logger.info("⚙️ Exporting app settings...")
         
-        # Environment variables to backup
-        env_vars = [
-            "GEMINI_API_KEY", "EMBEDDINGS_PROVIDER", "EMBEDDINGS_MODEL",
-            "EMB_CONCURRENCY", "EMB_BATCH_SIZE", "RAG_TOP_K",
-            "ORCH_TIMEOUT_MS_DEFAULT", "ORCH_CONCURRENCY",
-            "CB_FAILS", "CB_TTL_S", "MCP_SESSION_TTL_S",
-            "ENABLE_WEB_CONTEXT", "WEB_CONTEXT_TIMEOUT_MS",
-            "WEB_CONTEXT_MAX_SNIPPETS", "GEMINI_MODEL",
-            "DEBUG", "SERVICE_BASE_URL", "SKIP_REFERENCE_VALIDATION"
-        ]
-        
         settings = {
             "environment_variables": {
-                var: os.getenv(var) for var in env_vars if os.getenv(var) is not None
+                var: value for var in _BACKUP_ENV_VARS if (value := os.getenv(var)) is not None
             },
             "file_settings": self._load_json_file(SETTINGS_FILE),
             "export_timestamp": datetime.now().isoformat()
         }
         
-        # Save to settings file for persistence
-        with open(SETTINGS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(settings, f, indent=2, ensure_ascii=False)
+        # The settings travel in the backup itself; SETTINGS_FILE is only
+        # written on restore, so exporting costs no file rewrite or fsync
         
         logger.info("✅ Exported app settings")
         return settings
@@ -333,12 +466,9 @@ class OptimizedBackupManager:
         if not settings:
             settings = {}
         
+        # As with app settings, only the backup gets the timestamped copy
         settings["export_timestamp"] = datetime.now().isoformat()
         
-        # Save updated settings
-        with open(TENANT_SETTINGS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(settings, f, indent=2, ensure_ascii=False)
-        
         logger.info("✅ Exported tenant settings")
         return settings
     
@@ -346,66 +476,51 @@ class OptimizedBackupManager:
         """Export database schema and table structures."""
         logger.info("🗄️ Exporting database schema...")
         
+        # Get table information
+        tables = [name for (name,) in self._raw_query(f"""
+            SELECT m.name FROM sqlite_master m {_USER_TABLES}
+            ORDER BY m.name
+        """)]
         schema_info = {
-            "tables": {},
-            "indexes": {},
-            "foreign_keys": {}
+            "tables": {table_name: [] for table_name in tables},
+            "indexes": {table_name: [] for table_name in tables},
+            "foreign_keys": {table_name: [] for table_name in tables}
         }
         
-        # Get table information
-        result = self.session.execute(text("""
-            SELECT name FROM sqlite_master 
-            WHERE type='table' AND name NOT LIKE 'sqlite_%'
-            ORDER BY name
-        """))
+        # One query per PRAGMA for every table at once, through SQLite's
+        # table-valued pragma functions joined against sqlite_master
+        for table_name, cid, name, type_, notnull, default_value, pk in self._raw_query(f"""
+            SELECT m.name, p.cid, p.name, p.type, p."notnull", p.dflt_value, p.pk
+            FROM sqlite_master m JOIN pragma_table_info(m.name) p {_USER_TABLES}
+        """):
+            schema_info["tables"][table_name].append({
+                "cid": cid,
+                "name": name,
+                "type": type_,
+                "notnull": bool(notnull),
+                "default_value": default_value,
+                "primary_key": bool(pk)
+            })
+        
+        for table_name, name, unique, origin, partial in self._raw_query(f"""
+            SELECT m.name, p.name, p."unique", p.origin, p.partial
+            FROM sqlite_master m JOIN pragma_index_list(m.name) p {_USER_TABLES}
+        """):
+            schema_info["indexes"][table_name].append({
+                "name": name,
+                "unique": bool(unique),
+                "origin": origin,
+                "partial": bool(partial)
+            })
         
-        for row in result:
-            table_name = row.name
-            
-            # Get table schema
-            table_info = self.session.execute(text(f"PRAGMA table_info({table_name})"))
-            schema_info["tables"][table_name] = [
-                {
-                    "cid": col.cid,
-                    "name": col.name,
-                    "type": col.type,
-                    "notnull": bool(col.notnull),
-                    "default_value": col.dflt_value,
-                    "primary_key": bool(col.pk)
-                }
-                for col in table_info
-            ]
-            
-            # Get indexes
-            index_info = self.session.execute(text(f"PRAGMA index_list({table_name})"))
-            schema_info["indexes"][table_name] = [
-                {
-                    "name": idx.name,
-                    "unique": bool(idx.unique),
-                    "origin": idx.origin,
-                    "partial": bool(idx.partial)
-                }
-                for idx in index_info
-            ]
-            
-            # Get foreign keys
-            fk_info = self.session.execute(text(f"PRAGMA foreign_key_list({table_name})"))
-            schema_info["foreign_keys"][table_name] = []
-            try:
-                for fk in fk_info:
-                    fk_dict = {
-                        "id": fk[0],
-                        "seq": fk[1],
-                        "table": fk[2],
-                        "from": fk[3],
-                        "to": fk[4],
-                        "on_update": fk[5],
-                        "on_delete": fk[6],
-                        "match": fk[7]
-                    }
-                    schema_info["foreign_keys"][table_name].append(fk_dict)
-            except Exception as e:
-                logger.warning(f"Failed to export foreign keys for {table_name}: {e}")
+        try:
+            for table_name, *fk in self._raw_query(f"""
+                SELECT m.name, p.id, p.seq, p."table", p."from", p."to", p.on_update, p.on_delete, p."match"
+                FROM sqlite_master m JOIN pragma_foreign_key_list(m.name) p {_USER_TABLES}
+            """):
+                schema_info["foreign_keys"][table_name].append(dict(zip(_FOREIGN_KEY_FIELDS, fk)))
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to export foreign keys: {e}")
         
         logger.info("✅ Exported database schema")
         return schema_info
@@ -460,12 +575,7 @@ class OptimizedBackupManager:
     
     def _get_system_info(self) -> Dict[str, Any]:
         """Get system information for backup metadata."""
-        return {
-            "hostname": os.uname().nodename if hasattr(os, 'uname') else 'unknown',
-            "platform": os.name,
-            "python_version": os.sys.version.split()[0],
-            "backup_tool_version": "2.0"
-        }
+        return dict(_SYSTEM_INFO)
     
     # ========== RESTORE METHODS ==========
     
@@ -476,10 +586,9 @@ class OptimizedBackupManager:
             
         logger.info(f"🏢 Restoring {len(tenants_data)} tenants...")
         
-        # Prepare bulk insert
-        values = []
-        for tenant in tenants_data:
-            values.append((
+        # Rows are generated lazily and bound straight to the driver's executemany
+        self._raw_executemany(_TENANT_INSERT_SQL, (
+            (
                 tenant.get("id"),
                 tenant.get("name"),
                 tenant.get("slug"),
@@ -487,16 +596,9 @@ class OptimizedBackupManager:
                 tenant.get("web_grounding_prompt"),
                 tenant.get("enable_web_context", False),
                 tenant.get("created_at")
-            ))
-        
-        # Execute bulk insert
-        self.session.execute(text("""
-            INSERT OR REPLACE INTO tenant 
-            (id, name, slug, custom_prompt, web_grounding_prompt, enable_web_context, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """), values)
-        
-        self.session.commit()
+            )
+            for tenant in tenants_data
+        ))
         logger.info(f"✅ Restored {len(tenants_data)} tenants")
     
     def _restore_products_bulk(self, products_data: List[Dict[str, Any]]) -> None:
@@ -506,10 +608,9 @@ class OptimizedBackupManager:
             
         logger.info(f"📦 Restoring {len(products_data)} products...")
         
-        # Prepare bulk insert
-        values = []
-        for product in products_data:
-            values.append((
+        # Rows are generated lazily and bound straight to the driver's executemany
+        self._raw_executemany(_PRODUCT_INSERT_SQL, (
+            (
                 product.get("id"),
                 product.get("tenant_id"),
                 product.get("name"),
@@ -519,17 +620,9 @@ class OptimizedBackupManager:
                 product.get("formats_json"),
                 product.get("targeting_json"),
                 product.get("created_at")
-            ))
-        
-        # Execute bulk insert
-        self.session.execute(text("""
-            INSERT OR REPLACE INTO product 
-            (id, tenant_id, name, description, price_cpm, delivery_type, 
-             formats_json, targeting_json, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """), values)
-        
-        self.session.commit()
+            )
+            for product in products_data
+        ))
         logger.info(f"✅ Restored {len(products_data)} products")
     
     def _restore_external_agents_bulk(self, agents_data: List[Dict[str, Any]]) -> None:
@@ -539,10 +632,9 @@ class OptimizedBackupManager:
             
         logger.info(f"🤖 Restoring {len(agents_data)} external agents...")
         
-        # Prepare bulk insert
-        values = []
-        for agent in agents_data:
-            values.append((
+        # Rows are generated lazily and bound straight to the driver's executemany
+        self._raw_executemany(_AGENT_INSERT_SQL, (
+            (
                 agent.get("id"),
                 agent.get("name"),
                 agent.get("base_url"),
@@ -550,16 +642,9 @@ class OptimizedBackupManager:
                 agent.get("agent_type", "sales"),
                 agent.get("protocol", "rest"),
                 agent.get("created_at")
-            ))
-        
-        # Execute bulk insert
-        self.session.execute(text("""
-            INSERT OR REPLACE INTO externalagent 
-            (id, name, base_url, enabled, agent_type, protocol, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """), values)
-        
-        self.session.commit()
+            )
+            for agent in agents_data
+        ))
         logger.info(f"✅ Restored {len(agents_data)} external agents")
     
     def _restore_embeddings_bulk(self, embeddings_data: List[Dict[str, Any]]) -> None:
@@ -587,39 +672,31 @@ class OptimizedBackupManager:
             )
         """))
         
-        # Prepare bulk insert
-        values = []
-        for embedding in embeddings_data:
-            # Convert embedding list back to bytes
-            embedding_list = embedding.get("embedding", [])
-            if embedding_list:
-                embedding_bytes = struct.pack(f'{len(embedding_list)}f', *embedding_list)
-            else:
-                embedding_bytes = b''
-            
-            values.append((
-                embedding.get("id"),
-                embedding.get("product_id"),
-                embedding.get("embedding_text"),
-                embedding.get("embedding_hash"),
-                embedding_bytes,
-                embedding.get("provider"),
-                embedding.get("model"),
-                embedding.get("dim"),
-                embedding.get("updated_at"),
-                embedding.get("is_stale", False),
-                embedding.get("created_at")
-            ))
-        
-        # Execute bulk insert
-        self.session.execute(text("""
-            INSERT OR REPLACE INTO product_embeddings 
-            (id, product_id, embedding_text, embedding_hash, embedding, 
-             provider, model, dim, updated_at, is_stale, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """), values)
-        
-        self.session.commit()
+        def rows():
+            for embedding in embeddings_data:
+                if "embedding_b64" in embedding:
+                    embedding_bytes = base64.b64decode(embedding["embedding_b64"])
+                else:
+                    # Backups from before base64 storage hold the vector as a float list;
+                    # array packs it to float32 in one C loop, without *args unpacking
+                    embedding_bytes = array.array('f', embedding.get("embedding", [])).tobytes()
+                
+                yield (
+                    embedding.get("id"),
+                    embedding.get("product_id"),
+                    embedding.get("embedding_text"),
+                    embedding.get("embedding_hash"),
+                    embedding_bytes,
+                    embedding.get("provider"),
+                    embedding.get("model"),
+                    embedding.get("dim"),
+                    embedding.get("updated_at"),
+                    embedding.get("is_stale", False),
+                    embedding.get("created_at")
+                )
+        
+        # Rows are generated lazily and bound straight to the driver's executemany
+        self._raw_executemany(_EMBEDDING_INSERT_SQL, rows())
         logger.info(f"✅ Restored {len(embeddings_data)} embeddings")
     
     def _restore_app_settings(self, settings_data: Dict[str, Any]) -> None:
@@ -627,9 +704,8 @@ class OptimizedBackupManager:
         logger.info("⚙️ Restoring app settings...")
         
         if settings_data:
-            # Save to settings file
-            with open(SETTINGS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(settings_data, f, indent=2, ensure_ascii=False)
+            # Save to settings file (atomically, via a fsynced temp file)
+            _dump_json(SETTINGS_FILE, settings_data)
             
             # Note: Environment variables cannot be restored at runtime
             # They need to be set when the application starts
@@ -640,8 +716,7 @@ class OptimizedBackupManager:
         logger.info("🏢 Restoring tenant settings...")
         
         if settings_data:
-            with open(TENANT_SETTINGS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(settings_data, f, indent=2, ensure_ascii=False)
+            _dump_json(TENANT_SETTINGS_FILE, settings_data)
             logger.info("✅ Tenant settings restored")
     
     async def _restore_database_schema(self, schema_data: Dict[str, Any]) -> None:
@@ -663,7 +738,6 @@ class OptimizedBackupManager:
                 CREATE VIRTUAL TABLE IF NOT EXISTS products_fts 
                 USING fts5(name, description, content='product', content_rowid='id')
             """))
-            self.session.commit()
             logger.info("✅ FTS tables restored")
         except Exception as e:
             logger.warning(f"FTS restoration failed: {e}")
@@ -672,6 +746,10 @@ class OptimizedBackupManager:
     
     async def _clear_existing_data(self) -> None:
         """Clear existing data before restore."""
+        await self._offload(self._delete_existing_rows)
+    
+    def _delete_existing_rows(self) -> None:
+        """Delete every restorable table's rows within the session's transaction."""
         logger.info("🧹 Clearing existing data...")
         
         tables = ["product_embeddings", "product", "externalagent", "tenant"]
@@ -681,7 +759,6 @@ class OptimizedBackupManager:
             except Exception as e:
                 logger.warning(f"Failed to clear {table}: {e}")
         
-        self.session.commit()
         logger.info("✅ Existing data cleared")
     
     async def _validate_backup_integrity(self, backup_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -697,19 +774,24 @@ class OptimizedBackupManager:
             if section not in backup_data:
                 errors.append(f"Missing required section: {section}")
         
-        # Validate data relationships
+        # Validate data relationships; only the referenced side is built into a
+        # set, and the referencing rows are checked against it in one pass
         if "tenants" in backup_data and "products" in backup_data:
-            tenant_ids = {t["id"] for t in backup_data["tenants"]}
-            product_tenant_ids = {p["tenant_id"] for p in backup_data["products"]}
-            orphaned_products = product_tenant_ids - tenant_ids
+            tenant_ids = frozenset(map(itemgetter("id"), backup_data["tenants"]))
+            orphaned_products = {
+                tenant_id for tenant_id in map(itemgetter("tenant_id"), backup_data["products"])
+                if tenant_id not in tenant_ids
+            }
             if orphaned_products:
                 warnings.append(f"Found products with missing tenants: {orphaned_products}")
         
         # Check embeddings consistency
         if "products" in backup_data and "product_embeddings" in backup_data:
-            product_ids = {p["id"] for p in backup_data["products"]}
-            embedding_product_ids = {e["product_id"] for e in backup_data["product_embeddings"]}
-            orphaned_embeddings = embedding_product_ids - product_ids
+            product_ids = frozenset(map(itemgetter("id"), backup_data["products"]))
+            orphaned_embeddings = {
+                product_id for product_id in map(itemgetter("product_id"), backup_data["product_embeddings"])
+                if product_id not in product_ids
+            }
             if orphaned_embeddings:
                 warnings.append(f"Found embeddings with missing products: {orphaned_embeddings}")
         
@@ -757,47 +839,96 @@ class OptimizedBackupManager:
         """Load JSON file safely."""
         try:
             if file_path.exists():
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return _loads(file_path.read_bytes())
         except Exception as e:
             logger.warning(f"Failed to load {file_path}: {e}")
         return {}
     
     async def _load_backup_async(self, backup_file: Optional[str]) -> Dict[str, Any]:
         """Load backup file asynchronously."""
-        if backup_file is None:
-            # Find most recent backup
-            backup_files = list(BACKUP_DIR.glob("comprehensive_backup_*.json*"))
-            if not backup_files:
-                raise FileNotFoundError("No backup files found")
-            backup_file = str(max(backup_files, key=os.path.getctime))
-        
-        backup_path = Path(backup_file)
-        if not backup_path.is_absolute():
-            backup_path = BACKUP_DIR / backup_file
-        
-        if not backup_path.exists():
-            raise FileNotFoundError(f"Backup file not found: {backup_path}")
+        backup_path = _resolve_backup_path(backup_file)
         
         logger.info(f"📂 Loading backup from: {backup_path}")
         
-        # Load compressed or uncompressed file
-        if backup_path.suffix == '.gz':
-            with gzip.open(backup_path, 'rt', encoding='utf-8') as f:
-                return json.load(f)
-        else:
-            with open(backup_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+        # Load a gzip, zstd or uncompressed file; decompressing and parsing
+        # don't touch the session, so they always run off the event loop
+        return await asyncio.get_running_loop().run_in_executor(_BACKUP_POOL, self._read_backup_file, backup_path)
+    
+    def _read_backup_file(self, backup_path: Path) -> Dict[str, Any]:
+        """Decompress and parse a backup file."""
+        with _open_backup(str(backup_path)) as f:
+            return _loads(f.read())
     
     async def _write_backup_async(self, backup_data: Dict[str, Any], backup_file: Path) -> None:
         """Write backup file asynchronously."""
-        with open(backup_file, 'w', encoding='utf-8') as f:
-            json.dump(backup_data, f, indent=2, ensure_ascii=False)
+        await asyncio.get_running_loop().run_in_executor(_BACKUP_POOL, self._write_backup_file, backup_data, backup_file)
     
     async def _write_compressed_backup_async(self, backup_data: Dict[str, Any], backup_file: Path) -> None:
-        """Write compressed backup file asynchronously."""
-        with gzip.open(backup_file, 'wt', encoding='utf-8') as f:
-            json.dump(backup_data, f, indent=2, ensure_ascii=False)
+        """Write compressed backup file asynchronously, with zstd for a .zst suffix and gzip otherwise."""
+        await asyncio.get_running_loop().run_in_executor(_BACKUP_POOL, self._write_compressed_backup_file, backup_data, backup_file)
+    
+    def _write_backup_file(self, backup_data: Dict[str, Any], backup_file: Path) -> None:
+        """Write an uncompressed backup file."""
+        with open(backup_file, 'wb') as f:
+            self._write_backup_sections(f, backup_data)
+    
+    def _write_compressed_backup_file(self, backup_data: Dict[str, Any], backup_file: Path) -> None:
+        """Write a compressed backup file."""
+        if backup_file.suffix == '.zst':
+            # threads=-1 spreads compression over every core
+            compressor = zstandard.ZstdCompressor(level=BACKUP_ZSTD_LEVEL, threads=-1)
+            with open(backup_file, 'wb') as raw, compressor.stream_writer(raw) as f:
+                self._write_backup_sections(f, backup_data)
+            return
+        # Fastest deflate level: backups are CPU-bound in compression, for ~10% more size
+        with gzip.open(backup_file, 'wb', compresslevel=BACKUP_COMPRESSLEVEL) as f:
+            self._write_backup_sections(f, backup_data)
+    
+    def _write_backup_sections(self, f: BinaryIO, backup_data: Dict[str, Any]) -> None:
+        """
+        Write backup data as one indented JSON object, encoding a top-level section at a time.
+        
+        Only one section's bytes (or, for large row lists, one chunk of rows) are
+        held at once instead of the whole document, and the output is identical
+        to encoding the dict in one go. Encoded JSON has no raw newlines inside
+        strings, so re-indenting a chunk is a plain byte replace.
+        """
+        f.write(b"{")
+        for i, (key, value) in enumerate(backup_data.items()):
+            if isinstance(value, list) and len(value) > _SECTION_CHUNK_ROWS:
+                # Large row lists are encoded a chunk at a time, re-indented one level
+                f.write((b"," if i else b"") + _dumps({key: []}, pretty=True)[1:-4] + b"[")
+                for start in range(0, len(value), _SECTION_CHUNK_ROWS):
+                    chunk = _dumps(value[start:start + _SECTION_CHUNK_ROWS], pretty=True)[1:-2]
+                    f.write((b"," if start else b"") + chunk.replace(b"\n", b"\n  "))
+                f.write(b"\n  ]")
+                continue
+            # Drop the braces (and the closing newline) around the single-key object
+            f.write((b"," if i else b"") + _dumps({key: value}, pretty=True)[1:-2])
+        f.write(b"\n}" if backup_data else b"}")
+
+
+def _resolve_backup_path(backup_file: Optional[str]) -> Path:
+    """Resolve a backup name or path (or the newest backup for None) to an existing file."""
+    if backup_file is None:
+        # Find most recent backup (one stat per file from the directory scan)
+        with os.scandir(BACKUP_DIR) as entries:
+            backup_files = [
+                (entry.stat().st_mtime, entry.path)
+                for entry in entries
+                if entry.name.startswith("comprehensive_backup_") and entry.name.endswith((".json", ".json.gz", ".json.zst"))
+            ]
+        if not backup_files:
+            raise FileNotFoundError("No backup files found")
+        backup_file = max(backup_files)[1]
+    
+    backup_path = Path(backup_file)
+    if not backup_path.is_absolute():
+        backup_path = BACKUP_DIR / backup_file
+    
+    if not backup_path.exists():
+        raise FileNotFoundError(f"Backup file not found: {backup_path}")
+    return backup_path
 
 
 # ========== PUBLIC API FUNCTIONS ==========
@@ -818,12 +949,31 @@ async def restore_optimized_backup(session: Session, backup_file: Optional[str]
 
 
 async def validate_backup_file(backup_file: str) -> Dict[str, Any]:
-    """Validate a backup file without restoring it."""
-    from app.db import get_session
-    session = next(get_session())
-    try:
-        manager = OptimizedBackupManager(session)
-        backup_data = await manager._load_backup_async(backup_file)
-        return await manager._validate_backup_integrity(backup_data)
-    finally:
-        session.close()
+    """
+    Validate a backup file without restoring it.
+    
+    Repeat validations of an unchanged file return the cached result
+    instead of reading and parsing the whole backup again.
+    """
+    backup_path = _resolve_backup_path(backup_file)
+    stat = backup_path.stat()
+    key = (str(backup_path), stat.st_mtime_ns, stat.st_size)
+    
+    result = _validation_cache.get(key)
+    if result is None:
+        from app.db import get_session
+        session = next(get_session())
+        try:
+            manager = OptimizedBackupManager(session)
+            backup_data = await manager._load_backup_async(str(backup_path))
+            result = await manager._validate_backup_integrity(backup_data)
+        finally:
+            session.close()
+        _validation_cache[key] = result
+        while len(_validation_cache) > VALIDATION_CACHE_SIZE:
+            _validation_cache.popitem(last=False)
+    else:
+        _validation_cache.move_to_end(key)
+    
+    # Callers get their own copy of the error and warning lists
+    return {**result, "errors": list(result["errors"]), "warnings": list(result["warnings"])}
@@ -6,13 +6,14 @@ Repository: https://github.com/adcontextprotocol/signals-agent
 Provides vector embedding generation and similarity search for products.
 """
 
-from .generator import batch_embed_text, upsert_product_embeddings, generate_product_embedding
+from .generator import batch_embed_text, upsert_product_embeddings, upsert_product_embeddings_bulk, generate_product_embedding
 from .storage import _ensure_embeddings_table_schema, _embedding_to_bytes, _bytes_to_embedding
 from .query import search_similar_products, get_product_embeddings
 
 __all__ = [
     'batch_embed_text',
     'upsert_product_embeddings', 
+    'upsert_product_embeddings_bulk',
     'generate_product_embedding',
     '_ensure_embeddings_table_schema',
     '_embedding_to_bytes',
@@ -2,19 +2,29 @@
 Embedding generation functions.
 """
 
+import asyncio
 import hashlib
 import json
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from sqlalchemy.orm import Session
 
 from app.models import Product
 from app.utils.env import get_gemini_api_key
+from app.utils.embeddings_config import _clamp_concurrency
 from .storage import _embedding_to_bytes, _ensure_embeddings_table_schema
 
 # Constants copied from signals-agent
 EMBEDDING_DIMENSION = 768  # text-embedding-004 produces 768-dim vectors
 
+# Gemini's batchEmbedContents endpoint accepts at most 100 requests per call
+EMBED_BATCH_LIMIT = 100
+
+# Rate-limited (429) batch requests are retried up to this many times,
+# waiting EMBED_RETRY_BASE_DELAY_S * 2**attempt seconds before each retry
+EMBED_MAX_RETRIES = 3
+EMBED_RETRY_BASE_DELAY_S = 1.0
+
 
 async def batch_embed_text(texts: List[str]) -> List[List[float]]:
     """
@@ -32,6 +42,7 @@ async def batch_embed_text(texts: List[str]) -> List[List[float]]:
     """
     try:
         import google.generativeai as genai
+        from google.api_core.exceptions import TooManyRequests
         
         api_key = get_gemini_api_key()
         if not api_key:
@@ -39,25 +50,62 @@ async def batch_embed_text(texts: List[str]) -> List[List[float]]:
         
         genai.configure(api_key=api_key)
         
-        embeddings = []
-        for text in texts:
-            # Generate embedding using Gemini
-            result = genai.embed_content(
-                model="models/text-embedding-004",
-                content=text,
-                task_type="retrieval_query"
-            )
-            
-            # Extract embedding vector
-            embedding = result['embedding']
-            embeddings.append(embedding)
+        if not texts:
+            return []
+        
+        # One batch request per 100 texts, at most EMB_CONCURRENCY in flight,
+        # sent without blocking the event loop
+        semaphore = asyncio.Semaphore(_clamp_concurrency())
+        
+        async def embed_chunk(chunk: List[str]) -> Dict[str, Any]:
+            async with semaphore:
+                for attempt in range(EMBED_MAX_RETRIES + 1):
+                    try:
+                        return await genai.embed_content_async(
+                            model="models/text-embedding-004",
+                            content=chunk,
+                            task_type="retrieval_query"
+                        )
+                    except TooManyRequests:  # Includes ResourceExhausted
+                        if attempt == EMBED_MAX_RETRIES:
+                            raise
+                        await asyncio.sleep(EMBED_RETRY_BASE_DELAY_S * 2 ** attempt)
+        
+        results = await asyncio.gather(*(
+            embed_chunk(list(texts[i:i + EMBED_BATCH_LIMIT]))
+            for i in range(0, len(texts), EMBED_BATCH_LIMIT)
+        ))
         
-        return embeddings
+        # Extract embedding vectors in input order
+        return [embedding for result in results for embedding in result['embedding']]
         
     except Exception as e:
         raise ValueError(f"Failed to generate embeddings: {e}")
 
 
+def _ensure_embeddings_table(conn) -> None:
+    """Create the product_embeddings table if needed and migrate missing columns."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS product_embeddings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            embedding_text TEXT NOT NULL,
+            embedding_hash TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            provider TEXT,
+            model TEXT,
+            dim INTEGER,
+            updated_at TEXT,
+            is_stale INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_id) REFERENCES product(id)
+        )
+    ''')
+    
+    # Ensure all required columns exist (migrate existing tables)
+    _ensure_embeddings_table_schema(conn)
+
+
 async def upsert_product_embeddings(session: Session, product_id: int, embedding: List[float], 
                                    provider: str = None, model: str = None, dim: int = None,
                                    updated_at: str = None, embedding_hash: str = None) -> None:
@@ -81,25 +129,7 @@ async def upsert_product_embeddings(session: Session, product_id: int, embedding
     conn = session.connection().connection
     
     # Create embeddings table if it doesn't exist (with new columns)
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS product_embeddings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            product_id INTEGER NOT NULL,
-            embedding_text TEXT NOT NULL,
-            embedding_hash TEXT NOT NULL,
-            embedding BLOB NOT NULL,
-            provider TEXT,
-            model TEXT,
-            dim INTEGER,
-            updated_at TEXT,
-            is_stale INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (product_id) REFERENCES product(id)
-        )
-    ''')
-    
-    # Ensure all required columns exist (migrate existing tables)
-    _ensure_embeddings_table_schema(conn)
+    _ensure_embeddings_table(conn)
     
     # Get product text for embedding
     product = session.query(Product).filter(Product.id == product_id).first()
@@ -147,6 +177,74 @@ async def upsert_product_embeddings(session: Session, product_id: int, embedding
     conn.commit()
 
 
+async def upsert_product_embeddings_bulk(session: Session, items: List[Tuple[int, str, List[float]]],
+                                        provider: str = None, model: str = None,
+                                        updated_at: str = None) -> int:
+    """
+    Store or update many product embeddings in one transaction.
+    
+    Up-to-date embeddings are skipped and the rest replace any existing
+    row for the product/provider/model, using one lookup, one DELETE,
+    one executemany INSERT and a single commit.
+    
+    Args:
+        session: Database session
+        items: (product_id, embedding_text, embedding) tuples
+        provider: Embedding provider (e.g., 'gemini')
+        model: Embedding model (e.g., 'text-embedding-004')
+        updated_at: ISO timestamp
+        
+    Returns:
+        Number of embeddings written (up-to-date ones are skipped)
+    """
+    if not items:
+        return 0
+    
+    conn = session.connection().connection
+    _ensure_embeddings_table(conn)
+    
+    if not updated_at:
+        updated_at = datetime.utcnow().isoformat()
+    
+    params = []
+    for product_id, embedding_text, embedding in items:
+        dim = len(embedding)
+        hash_input = f"{embedding_text}:{provider}:{model}:{dim}"
+        embedding_hash = hashlib.sha256(hash_input.encode()).hexdigest()
+        params.append((product_id, embedding_text, embedding_hash, _embedding_to_bytes(embedding),
+                       provider, model, dim, updated_at))
+    
+    # Skip embeddings that are already current and not stale
+    placeholders = ','.join('?' * len(params))
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT product_id, embedding_hash FROM product_embeddings
+        WHERE provider = ? AND model = ? AND is_stale = 0 AND product_id IN ({placeholders})
+    ''', (provider, model, *(p[0] for p in params)))
+    current = set(cursor.fetchall())
+    params = [p for p in params if (p[0], p[2]) not in current]
+    if not params:
+        return 0
+    
+    # Replace the superseded rows; idx_product_embeddings_version allows only
+    # one row per product/provider/model, so they cannot be kept as stale
+    placeholders = ','.join('?' * len(params))
+    cursor.execute(f'''
+        DELETE FROM product_embeddings 
+        WHERE provider = ? AND model = ? AND product_id IN ({placeholders})
+    ''', (provider, model, *(p[0] for p in params)))
+    
+    # Insert new embeddings
+    cursor.executemany('''
+        INSERT INTO product_embeddings 
+        (product_id, embedding_text, embedding_hash, embedding, provider, model, dim, updated_at, is_stale)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)
+    ''', params)
+    
+    conn.commit()
+    return len(params)
+
+
 async def generate_product_embedding(product: Product) -> List[float]:
     """
     Generate embedding for a single product.
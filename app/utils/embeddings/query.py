@@ -2,11 +2,33 @@
 Query and search functions for embeddings.
 """
 
-from typing import List, Dict, Any
+import heapq
+import math
+from collections import OrderedDict
+from operator import mul
+from typing import List, Dict, Any, Sequence, Tuple
 from sqlalchemy.orm import Session
 
 from app.models import Product
-from .storage import _bytes_to_embedding
+
+try:
+    from math import sumprod as _dot  # Python 3.12+
+except ImportError:
+    def _dot(a: Sequence[float], b: Sequence[float]) -> float:
+        return sum(map(mul, a, b))
+
+# Decoded embeddings per (database, tenant, provider, model), least recently used first
+EMBEDDING_CACHE_SIZE = 32
+_embedding_cache: "OrderedDict[tuple, Tuple[tuple, List[Tuple[int, memoryview]]]]" = OrderedDict()
+
+_TENANT_EMBEDDINGS = '''
+    FROM product_embeddings pe
+    JOIN product p ON pe.product_id = p.id
+    WHERE p.tenant_id = ? 
+    AND pe.provider = ? 
+    AND pe.model = ? 
+    AND pe.is_stale = 0
+'''
 
 
 async def search_similar_products(session: Session, tenant_id: int, query_embedding: List[float], limit: int) -> List[Dict[str, Any]]:
@@ -31,30 +53,32 @@ async def search_similar_products(session: Session, tenant_id: int, query_embedd
         conn = session.connection().connection
         cursor = conn.cursor()
         
-        # Get all products with current embeddings for this tenant
-        cursor.execute('''
-            SELECT p.id, p.name, p.description, p.price_cpm, p.delivery_type,
-                   p.formats_json, p.targeting_json, pe.embedding
-            FROM product_embeddings pe
-            JOIN product p ON pe.product_id = p.id
-            WHERE p.tenant_id = ? 
-            AND pe.provider = ? 
-            AND pe.model = ? 
-            AND pe.is_stale = 0
-        ''', (tenant_id, config['provider'], config['model']))
+        # The query norm is the same for every row, so compute it once
+        query_norm = _vector_norm(query_embedding)
+        
+        rows = _load_tenant_embeddings(cursor, tenant_id, config['provider'], config['model'])
+        
+        # Score every row first, then only keep the top matches
+        scores = [
+            _cosine_similarity(query_embedding, embedding, query_norm)
+            for _, embedding in rows
+        ]
+        top = heapq.nlargest(limit, range(len(rows)), key=scores.__getitem__)
+        if not top:
+            return []
+        
+        top_ids = [rows[i][0] for i in top]
+        cursor.execute(f'''
+            SELECT id, name, description, price_cpm, delivery_type, formats_json, targeting_json
+            FROM product
+            WHERE id IN ({','.join('?' * len(top_ids))})
+        ''', top_ids)
+        products = {row[0]: row for row in cursor.fetchall()}
         
         results = []
-        for row in cursor.fetchall():
-            product_id, name, description, price_cpm, delivery_type, formats_json, targeting_json, embedding_bytes = row
-            
-            # Convert embedding bytes back to list
-            embedding_array = _bytes_to_embedding(embedding_bytes)
-            embedding_list = embedding_array
-            
-            # Calculate cosine similarity
-            similarity = _cosine_similarity(query_embedding, embedding_list)
-            
-            result = {
+        for i in top:
+            product_id, name, description, price_cpm, delivery_type, formats_json, targeting_json = products[rows[i][0]]
+            results.append({
                 'product_id': product_id,
                 'name': name,
                 'description': description,
@@ -62,43 +86,79 @@ async def search_similar_products(session: Session, tenant_id: int, query_embedd
                 'delivery_type': delivery_type,
                 'formats_json': formats_json,
                 'targeting_json': targeting_json,
-                'similarity_score': similarity
-            }
-            results.append(result)
+                'similarity_score': scores[i]
+            })
         
-        # Sort by similarity score (descending) and limit results
-        results.sort(key=lambda x: x['similarity_score'], reverse=True)
-        return results[:limit]
+        return results
         
     except Exception as e:
         # Fall back to simple text search if vector search fails
         return await _fallback_text_search(session, tenant_id, limit)
 
 
-def _cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
+def _load_tenant_embeddings(cursor, tenant_id: int, provider: str, model: str) -> List[Tuple[int, memoryview]]:
+    """
+    Return (product_id, float32 view) for a tenant's current embeddings.
+    
+    Results for file databases are cached and checked against a signature
+    query (row count, newest row id and update time) that never reads the
+    embedding BLOBs, so repeat searches skip the transfer and decode.
+    Writers always insert new rows (ids are AUTOINCREMENT) or mark rows
+    stale, both of which change the signature.
+    """
+    params = (tenant_id, provider, model)
+    
+    cursor.execute("PRAGMA database_list")
+    db_file = next((row[2] for row in cursor.fetchall() if row[1] == 'main'), '')
+    if db_file:
+        key = (db_file,) + params
+        cursor.execute(f"SELECT COUNT(*), MAX(pe.id), MAX(pe.updated_at) {_TENANT_EMBEDDINGS}", params)
+        signature = cursor.fetchone()
+        cached = _embedding_cache.get(key)
+        if cached is not None and cached[0] == signature:
+            _embedding_cache.move_to_end(key)
+            return cached[1]
+    
+    cursor.execute(f"SELECT pe.product_id, pe.embedding {_TENANT_EMBEDDINGS}", params)
+    rows = [(product_id, memoryview(embedding_bytes).cast('f')) for product_id, embedding_bytes in cursor.fetchall()]
+    
+    if db_file:
+        _embedding_cache[key] = (signature, rows)
+        while len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+    
+    return rows
+
+
+def _vector_norm(vec: Sequence[float]) -> float:
+    """Euclidean norm of a vector, computed in C by math.hypot."""
+    return math.hypot(*vec)
+
+
+def _cosine_similarity(vec1: Sequence[float], vec2: Sequence[float], norm_a: float = None) -> float:
     """
     Calculate cosine similarity between two vectors.
     
     Args:
         vec1: First vector
         vec2: Second vector
+        norm_a: Precomputed norm of vec1, when comparing it against many vectors
         
     Returns:
         Cosine similarity score (0-1)
     """
     try:
-        # Convert to numpy arrays
-        a = vec1
-        b = vec2
-        
-        # Calculate cosine similarity
-        dot_product = sum(x * y for x, y in zip(a, b))
-        norm_a = sum(x**2 for x in a)**0.5
-        norm_b = sum(x**2 for x in b)**0.5
+        if norm_a is None:
+            norm_a = _vector_norm(vec1)
+        norm_b = _vector_norm(vec2)
         
         if norm_a == 0 or norm_b == 0:
             return 0.0
         
+        # Like zip(), compare only the overlapping dimensions
+        n = min(len(vec1), len(vec2))
+        dot_product = _dot(vec1[:n], vec2[:n]) if len(vec1) != len(vec2) else _dot(vec1, vec2)
+        
         return float(dot_product / (norm_a * norm_b))
     except Exception:
         return 0.0
@@ -95,3 +95,44 @@ def run_migrations():
         logger.error(f"Migration failed: {str(e)}")
         raise
 
+
+
+# Tables whose inserts, updates and deletes bump the data_version counter
+DATA_VERSION_TABLES = ("tenant", "product", "externalagent")
+
+
+def create_data_version_triggers(conn) -> None:
+    """
+    Create the single-row data_version counter and the triggers that bump it.
+    
+    Every write to a tenant, product or external agent row increments the
+    counter, including in-place edits, so the backup fingerprint can tell
+    whether data changed without reading any table. The caller commits.
+    """
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS data_version "
+        "(id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)"
+    ))
+    conn.execute(text("INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)"))
+    for table in DATA_VERSION_TABLES:
+        for operation in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(text(f'''
+                CREATE TRIGGER IF NOT EXISTS data_version_{table}_{operation.lower()}
+                AFTER {operation} ON {table} BEGIN
+                    UPDATE data_version SET version = version + 1;
+                END
+            '''))
+
+
+def migrate_data_version():
+    """Install the data_version counter and its triggers if missing."""
+    engine = get_engine()
+    
+    try:
+        with engine.connect() as conn:
+            create_data_version_triggers(conn)
+            conn.commit()
+            logger.info("DB migrations complete: data_version triggers validated")
+    except Exception as e:
+        logger.error(f"Migration failed for data_version triggers: {str(e)}")
+        raise
@@ -9,7 +9,8 @@ from pathlib import Path
 from unittest.mock import Mock, patch
 from sqlalchemy.orm import Session
 
-from app.utils.auto_backup_simple import auto_backup, cleanup_old_backups, get_backup_stats, MAX_BACKUPS
+from app.utils.auto_backup_simple import auto_backup, cleanup_old_backups, get_backup_stats
+from app.utils.data_persistence.core import BACKUP_KEEP
 
 
 class TestAutoBackup:
@@ -23,7 +24,7 @@ class TestAutoBackup:
         backup_dir.mkdir()
         
         # Mock the BACKUP_DIR
-        with patch('app.utils.auto_backup_simple.BACKUP_DIR', backup_dir):
+        with patch('app.utils.data_persistence.core.BACKUP_DIR', backup_dir):
             yield backup_dir
         
         shutil.rmtree(temp_dir)
@@ -34,23 +35,24 @@ class TestAutoBackup:
         return Mock(spec=Session)
     
     @pytest.fixture
-    def mock_export_data(self):
+    def mock_export_data(self, temp_backup_dir):
         """Mock export_all_data function."""
         with patch('app.utils.data_persistence.export_all_data') as mock:
-            mock.return_value = {"test": "data"}
+            backup_file = temp_backup_dir / "full_backup_20241229_120000.jsonl.gz"
+            mock.return_value = {"backup_file": str(backup_file), "counts": {}}
             yield mock
     
     def test_auto_backup_creates_backup(self, temp_backup_dir, mock_session, mock_export_data):
-        """Test that auto_backup creates a backup file."""
+        """Test that auto_backup reports the backup file written by export_all_data."""
         result = auto_backup(mock_session, "test_reason")
         
         assert result is not None
         assert result.startswith("full_backup_")
-        assert result.endswith(".json")
+        assert result.endswith(".jsonl.gz")
         
-        # Check that backup file exists
+        # auto_backup does not write a second copy of the backup
         backup_files = list(temp_backup_dir.glob("full_backup_*.json"))
-        assert len(backup_files) == 1
+        assert len(backup_files) == 0
         
         # Check that export was called
         mock_export_data.assert_called_once_with(mock_session)
@@ -67,28 +69,28 @@ class TestAutoBackup:
             assert len(backup_files) == 0
     
     def test_cleanup_old_backups_keeps_max_backups(self, temp_backup_dir):
-        """Test that cleanup keeps only MAX_BACKUPS files."""
-        # Create more than MAX_BACKUPS files
-        for i in range(MAX_BACKUPS + 5):
+        """Test that cleanup keeps only BACKUP_KEEP files."""
+        # Create more than BACKUP_KEEP files
+        for i in range(BACKUP_KEEP + 5):
             backup_file = temp_backup_dir / f"full_backup_20241229_{i:06d}.json"
             backup_file.write_text('{"test": "data"}')
         
         # Run cleanup
         cleanup_old_backups()
         
-        # Check that only MAX_BACKUPS files remain
+        # Check that only BACKUP_KEEP files remain
         backup_files = list(temp_backup_dir.glob("full_backup_*.json"))
-        assert len(backup_files) == MAX_BACKUPS
+        assert len(backup_files) == BACKUP_KEEP
         
         # Check that the newest files are kept
         file_names = [f.name for f in backup_files]
         file_names.sort()
-        expected_names = [f"full_backup_20241229_{i:06d}.json" for i in range(5, MAX_BACKUPS + 5)]
+        expected_names = [f"full_backup_20241229_{i:06d}.json" for i in range(5, BACKUP_KEEP + 5)]
         assert file_names == expected_names
     
     def test_cleanup_old_backups_no_cleanup_needed(self, temp_backup_dir):
         """Test that cleanup does nothing when under limit."""
-        # Create fewer than MAX_BACKUPS files
+        # Create fewer than BACKUP_KEEP files
         for i in range(5):
             backup_file = temp_backup_dir / f"full_backup_20241229_{i:06d}.json"
             backup_file.write_text('{"test": "data"}')
@@ -103,7 +105,7 @@ class TestAutoBackup:
     def test_cleanup_old_backups_handles_deletion_error(self, temp_backup_dir):
         """Test that cleanup handles file deletion errors gracefully."""
         # Create files
-        for i in range(MAX_BACKUPS + 2):
+        for i in range(BACKUP_KEEP + 2):
             backup_file = temp_backup_dir / f"full_backup_20241229_{i:06d}.json"
             backup_file.write_text('{"test": "data"}')
         
@@ -114,7 +116,7 @@ class TestAutoBackup:
             # If we get here, cleanup didn't crash
             backup_files = list(temp_backup_dir.glob("full_backup_*.json"))
             # Should have cleaned up some files
-            assert len(backup_files) <= MAX_BACKUPS + 2
+            assert len(backup_files) <= BACKUP_KEEP + 2
         except Exception as e:
             # Should not crash
             assert False, f"Cleanup crashed: {e}"
@@ -124,7 +126,7 @@ class TestAutoBackup:
         stats = get_backup_stats()
         
         assert stats["total_backups"] == 0
-        assert stats["max_backups"] == MAX_BACKUPS
+        assert stats["max_backups"] == BACKUP_KEEP
         assert stats["latest_backup"] is None
         assert stats["cleanup_needed"] is False
     
@@ -138,37 +140,36 @@ class TestAutoBackup:
         stats = get_backup_stats()
         
         assert stats["total_backups"] == 3
-        assert stats["max_backups"] == MAX_BACKUPS
+        assert stats["max_backups"] == BACKUP_KEEP
         assert stats["latest_backup"] is not None
         assert stats["cleanup_needed"] is False
     
     def test_get_backup_stats_cleanup_needed(self, temp_backup_dir):
         """Test backup stats when cleanup is needed."""
-        # Create more than MAX_BACKUPS files
-        for i in range(MAX_BACKUPS + 5):
+        # Create more than BACKUP_KEEP files
+        for i in range(BACKUP_KEEP + 5):
             backup_file = temp_backup_dir / f"full_backup_20241229_{i:06d}.json"
             backup_file.write_text('{"test": "data"}')
         
         stats = get_backup_stats()
         
-        assert stats["total_backups"] == MAX_BACKUPS + 5
-        assert stats["max_backups"] == MAX_BACKUPS
+        assert stats["total_backups"] == BACKUP_KEEP + 5
+        assert stats["max_backups"] == BACKUP_KEEP
         assert stats["latest_backup"] is not None
         assert stats["cleanup_needed"] is True
     
-    def test_auto_backup_includes_cleanup(self, temp_backup_dir, mock_session, mock_export_data):
-        """Test that auto_backup includes cleanup."""
-        # Create more than MAX_BACKUPS files
-        for i in range(MAX_BACKUPS + 3):
+    def test_auto_backup_leaves_cleanup_to_export(self, temp_backup_dir, mock_session, mock_export_data):
+        """Test that auto_backup doesn't prune again after export_all_data has."""
+        # Create more than BACKUP_KEEP files
+        for i in range(BACKUP_KEEP + 3):
             backup_file = temp_backup_dir / f"full_backup_20241229_{i:06d}.json"
             backup_file.write_text('{"test": "data"}')
         
-        # Run auto_backup
+        # Run auto_backup (export_all_data is mocked, so nothing prunes)
         auto_backup(mock_session, "test_reason")
         
-        # Check that cleanup happened
         backup_files = list(temp_backup_dir.glob("full_backup_*.json"))
-        assert len(backup_files) == MAX_BACKUPS
+        assert len(backup_files) == BACKUP_KEEP + 3
     
     def test_auto_backup_logs_reason(self, temp_backup_dir, mock_session, mock_export_data):
         """Test that auto_backup logs the reason."""
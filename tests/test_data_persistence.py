@@ -0,0 +1,958 @@
+"""
+Tests for the JSON Lines backup export/import in app.utils.data_persistence.
+"""
+
+import gzip
+import json
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.models import Tenant, Product, ExternalAgent
+from app.utils.data_persistence import export_all_data, import_all_data, load_backup_data
+from app.utils.migrations import create_data_version_triggers
+
+
+@pytest.fixture
+def test_session():
+    """Create an in-memory database session."""
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        create_data_version_triggers(conn)
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def backup_dirs(tmp_path):
+    """Point backup and settings files at a temporary directory."""
+    backup_dir = tmp_path / "backups"
+    backup_dir.mkdir()
+    with patch('app.utils.data_persistence.export.BACKUP_DIR', backup_dir), \
+         patch('app.utils.data_persistence.import_utils.BACKUP_DIR', backup_dir), \
+         patch('app.utils.data_persistence.core.BACKUP_DIR', backup_dir), \
+         patch('app.utils.data_persistence.export.SETTINGS_FILE', tmp_path / "app_settings.json"), \
+         patch('app.utils.data_persistence.export.TENANT_SETTINGS_FILE', tmp_path / "tenant_settings.json"), \
+         patch('app.repos.tenants.auto_backup'), \
+         patch('app.repos.products.auto_backup'), \
+         patch('app.repos.external_agents.auto_backup'):
+        yield backup_dir
+
+
+@pytest.fixture
+def sample_data(test_session: Session):
+    """Create two tenants with products and one external agent."""
+    test_session.add(Tenant(id=1, name="Tenant One", slug="tenant-one", custom_prompt="Prompt 1"))
+    test_session.add(Tenant(id=2, name="Tenant Two", slug="tenant-two", enable_web_context=True))
+    test_session.add(Product(id=1, tenant_id=1, name="Product A", description="A", price_cpm=1.5,
+                             delivery_type="guaranteed", formats_json="[]", targeting_json="{}"))
+    test_session.add(Product(id=2, tenant_id=2, name="Product B", description="B", price_cpm=2.5,
+                             delivery_type="non_guaranteed", formats_json="[]", targeting_json="{}"))
+    test_session.add(ExternalAgent(id=1, name="Agent", base_url="http://agent.example.com"))
+    test_session.commit()
+
+
+def _read_lines(backup_file: Path):
+    with gzip.open(backup_file, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_export_writes_one_record_per_line(test_session, backup_dirs, sample_data):
+    """Export streams a header followed by typed records."""
+    summary = export_all_data(test_session)
+
+    backup_file = Path(summary["backup_file"])
+    assert backup_file.parent == backup_dirs
+    assert backup_file.name.endswith(".jsonl.gz")
+    assert summary["counts"]["tenants"] == 2
+    assert summary["counts"]["products"] == 2
+    assert summary["counts"]["external_agents"] == 1
+
+    records = _read_lines(backup_file)
+    assert records[0]["type"] == "header"
+    assert records[0]["version"] == summary["version"]
+    tenant_settings = next(r for r in records if r["type"] == "tenant_settings")
+    assert tenant_settings["data"]["exported_at"] == records[0]["exported_at"] == summary["exported_at"]
+    assert [r["type"] for r in records[1:6]] == ["tenant", "tenant", "product", "product", "agent"]
+
+
+def test_load_backup_data_folds_records(test_session, backup_dirs, sample_data):
+    """A JSON Lines backup can still be loaded as one dict."""
+    summary = export_all_data(test_session)
+
+    data = load_backup_data(summary["backup_file"])
+
+    assert [t["slug"] for t in data["tenants"]] == ["tenant-one", "tenant-two"]
+    assert [p["name"] for p in data["products"]] == ["Product A", "Product B"]
+    assert data["external_agents"][0]["name"] == "Agent"
+    assert "gemini_api_key" in data["app_settings"]
+
+
+def test_import_restores_jsonl_backup(test_session, backup_dirs, sample_data):
+    """Importing a JSON Lines backup rebuilds tenants, products and agents."""
+    summary = export_all_data(test_session)
+
+    result = import_all_data(test_session, backup_file=Path(summary["backup_file"]).name)
+
+    assert result["counts"]["tenants"] == 2
+    assert result["counts"]["products"] == 2
+    tenants = {t.slug: t for t in test_session.exec(select(Tenant)).all()}
+    assert set(tenants) == {"tenant-one", "tenant-two"}
+    assert tenants["tenant-one"].custom_prompt == "Prompt 1"
+    products = test_session.exec(select(Product)).all()
+    assert {(p.tenant_id, p.name) for p in products} == {
+        (tenants["tenant-one"].id, "Product A"),
+        (tenants["tenant-two"].id, "Product B"),
+    }
+    assert len(test_session.exec(select(ExternalAgent)).all()) == 1
+
+
+def test_import_jsonl_backup_replaces_data_and_clears_stale_embeddings(test_session, backup_dirs, sample_data):
+    """A JSON Lines restore replaces existing rows, embeddings included, even when the backup has none."""
+    from sqlmodel import text
+
+    summary = export_all_data(test_session)
+    test_session.add(Tenant(name="Added Later", slug="added-later"))
+    test_session.execute(text("CREATE TABLE product_embeddings (id INTEGER PRIMARY KEY, product_id INTEGER, embedding BLOB)"))
+    test_session.execute(text("INSERT INTO product_embeddings (product_id, embedding) VALUES (1, x'00')"))
+    test_session.commit()
+
+    import_all_data(test_session, backup_file=Path(summary["backup_file"]).name)
+
+    assert {t.slug for t in test_session.exec(select(Tenant)).all()} == {"tenant-one", "tenant-two"}
+    assert test_session.execute(text("SELECT COUNT(*) FROM product_embeddings")).scalar() == 0
+
+
+def test_import_jsonl_backup_keeps_product_ids_for_embeddings(test_session, backup_dirs):
+    """Restored products keep their backed-up ids, so embeddings still reference the right product."""
+    from sqlmodel import text
+
+    test_session.add(Tenant(id=1, name="Tenant One", slug="tenant-one"))
+    for product_id, name in ((7, "Seven"), (12, "Twelve")):
+        test_session.add(Product(id=product_id, tenant_id=1, name=name, description="", price_cpm=1.0,
+                                 delivery_type="guaranteed", formats_json="[]", targeting_json="{}"))
+    test_session.execute(text(
+        "CREATE TABLE product_embeddings (id INTEGER PRIMARY KEY, product_id INTEGER, embedding_text TEXT, "
+        "embedding_hash TEXT, embedding BLOB, created_at TEXT, provider TEXT, model TEXT, dim INTEGER, "
+        "updated_at TEXT, is_stale INTEGER)"
+    ))
+    test_session.execute(text(
+        "INSERT INTO product_embeddings (id, product_id, embedding_text, embedding_hash, embedding, is_stale) "
+        "VALUES (3, 12, 'Twelve', 'h', x'0000803f', 0)"
+    ))
+    test_session.commit()
+    summary = export_all_data(test_session)
+
+    import_all_data(test_session, backup_file=Path(summary["backup_file"]).name)
+
+    assert {p.id: p.name for p in test_session.exec(select(Product)).all()} == {7: "Seven", 12: "Twelve"}
+    embedded = test_session.execute(text(
+        "SELECT p.name FROM product_embeddings pe JOIN product p ON p.id = pe.product_id"
+    )).scalars().all()
+    assert embedded == ["Twelve"]
+
+
+def test_import_reads_legacy_json_backup(test_session, backup_dirs):
+    """Older single-object JSON backups remain importable."""
+    legacy_file = backup_dirs / "full_backup_20240101_000000.json"
+    legacy_file.write_text(json.dumps({
+        "version": "1.0",
+        "tenants": [{"id": 7, "name": "Legacy", "slug": "legacy", "products": [
+            {"name": "Old Product", "description": "", "price_cpm": 3.0,
+             "delivery_type": "guaranteed", "formats_json": "[]", "targeting_json": "{}"}
+        ]}],
+    }))
+
+    import_all_data(test_session, backup_file=legacy_file.name)
+
+    tenant = test_session.exec(select(Tenant).where(Tenant.slug == "legacy")).one()
+    products = test_session.exec(select(Product)).all()
+    assert [(p.tenant_id, p.name) for p in products] == [(tenant.id, "Old Product")]
+
+
+def test_load_backup_data_reads_uncompressed_jsonl(backup_dirs):
+    """Plain .jsonl backups are read alongside gzip-compressed ones."""
+    backup_file = backup_dirs / "full_backup_20240101_000000.jsonl"
+    backup_file.write_text(
+        '{"type":"header","version":"2.0","exported_at":"2024-01-01T00:00:00"}\n'
+        '{"type":"tenant","id":1,"name":"Plain","slug":"plain"}\n'
+    )
+
+    data = load_backup_data(str(backup_file))
+
+    assert data["version"] == "2.0"
+    assert [t["slug"] for t in data["tenants"]] == ["plain"]
+
+
+def test_import_skips_existing_products_and_keeps_created_at(test_session, backup_dirs):
+    """Bulk product import skips duplicates and preserves backup timestamps."""
+    backup_data = {
+        "tenants": [{"id": 1, "name": "Dup", "slug": "dup", "products": [
+            {"name": "Same", "description": "", "price_cpm": 1.0, "delivery_type": "guaranteed",
+             "formats_json": "[]", "targeting_json": "{}", "created_at": "2024-05-01T12:00:00"},
+            {"name": "Same", "description": "", "price_cpm": 1.0, "delivery_type": "guaranteed",
+             "formats_json": "[]", "targeting_json": "{}", "created_at": "2024-05-01T12:00:00"}
+        ]}],
+    }
+
+    import_all_data(test_session, backup_data)
+    import_all_data(test_session, backup_data)
+
+    products = test_session.exec(select(Product)).all()
+    assert len(products) == 1
+    assert products[0].created_at.isoformat() == "2024-05-01T12:00:00"
+
+
+def test_scan_backups_newest_first_and_refreshes(backup_dirs):
+    """The cached directory scan orders by mtime and notices new backups."""
+    from app.utils.data_persistence.core import scan_backups
+
+    older = backup_dirs / "full_backup_20240101_000000.jsonl.gz"
+    older.write_bytes(b"")
+    os.utime(older, (1_000_000, 1_000_000))
+    (backup_dirs / "unrelated.txt").write_text("ignored")
+
+    assert [path.name for path, _ in scan_backups()] == [older.name]
+
+    newer = backup_dirs / "full_backup_20240102_000000.json"
+    newer.write_text("{}")
+    os.utime(backup_dirs, ns=(0, os.stat(backup_dirs).st_mtime_ns + 1))
+
+    assert [path.name for path, _ in scan_backups()] == [newer.name, older.name]
+
+
+def test_auto_backup_on_startup_skips_empty_database(test_session, backup_dirs):
+    """Startup backup only runs when the database holds data."""
+    from app.utils.data_persistence import auto_backup_on_startup
+
+    with patch('app.utils.data_persistence.backup.export_all_data') as mock_export:
+        auto_backup_on_startup(test_session)
+        mock_export.assert_not_called()
+
+        test_session.add(Tenant(name="Only", slug="only"))
+        test_session.commit()
+        auto_backup_on_startup(test_session)
+        mock_export.assert_called_once_with(test_session)
+
+
+def test_export_does_not_rewrite_standalone_settings_files(test_session, backup_dirs, sample_data):
+    """Settings live only in the backup unless explicitly exported on their own."""
+    from app.utils.data_persistence import export_app_settings
+
+    export_all_data(test_session)
+    assert not (backup_dirs.parent / "app_settings.json").exists()
+    assert not (backup_dirs.parent / "tenant_settings.json").exists()
+
+    settings = export_app_settings()
+    assert json.loads((backup_dirs.parent / "app_settings.json").read_text()) == settings
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_import_streams_gzipped_legacy_backup_with_separate_arrays(test_session, backup_dirs, stream):
+    """Legacy backups with top-level products arrays import section by section, or whole without a fast ijson."""
+    legacy_file = backup_dirs / "full_backup_20240101_000000.json.gz"
+    with gzip.open(legacy_file, "wt", encoding="utf-8") as f:
+        json.dump({
+            "version": "1.0",
+            "tenants": [{"id": 3, "name": "Split", "slug": "split"}],
+            "products": [{"tenant_id": 3, "name": "Flat", "description": "", "price_cpm": 4.25,
+                          "delivery_type": "guaranteed", "formats_json": "[]", "targeting_json": "{}"}],
+            "external_agents": [{"name": "Legacy Agent", "base_url": "http://legacy.example.com"}],
+            "app_settings": {"rag_top_k": "5"},
+        }, f)
+
+    with patch('app.utils.data_persistence.import_utils.STREAM_LEGACY_BACKUPS', stream), \
+         patch('app.utils.data_persistence.import_utils.LEGACY_STREAM_MIN_BYTES', 0):
+        result = import_all_data(test_session, backup_file=legacy_file.name)
+
+    assert result == {"counts": {"tenants": 1, "products": 1, "external_agents": 1}}
+    tenant = test_session.exec(select(Tenant).where(Tenant.slug == "split")).one()
+    product = test_session.exec(select(Product)).one()
+    assert (product.tenant_id, product.name, product.price_cpm) == (tenant.id, "Flat", 4.25)
+    assert test_session.exec(select(ExternalAgent.name)).all() == ["Legacy Agent"]
+
+
+def test_auto_backup_on_startup_skips_when_fingerprint_matches(test_session, backup_dirs, sample_data):
+    """Startup backup is skipped until the data differs from the newest backup."""
+    from app.utils.data_persistence import auto_backup_on_startup
+
+    summary = export_all_data(test_session)
+    assert _read_lines(Path(summary["backup_file"]))[0]["fingerprint"]["counts"]["tenants"] == 2
+
+    with patch('app.utils.data_persistence.backup.export_all_data') as mock_export:
+        auto_backup_on_startup(test_session)
+        mock_export.assert_not_called()
+
+        test_session.add(Tenant(name="Three", slug="three"))
+        test_session.commit()
+        auto_backup_on_startup(test_session)
+        mock_export.assert_called_once_with(test_session)
+
+
+def test_auto_backup_on_startup_runs_after_in_place_prompt_edit(test_session, backup_dirs, sample_data):
+    """Editing a tenant prompt in place (no new rows) still makes the startup backup run."""
+    from app.utils.data_persistence import auto_backup_on_startup
+
+    export_all_data(test_session)
+
+    tenant = test_session.get(Tenant, 1)
+    tenant.custom_prompt = "Edited prompt"
+    test_session.add(tenant)
+    test_session.commit()
+
+    with patch('app.utils.data_persistence.backup.export_all_data') as mock_export:
+        auto_backup_on_startup(test_session)
+        mock_export.assert_called_once_with(test_session)
+
+
+def test_auto_backup_on_startup_always_runs_without_data_version_triggers(backup_dirs):
+    """Databases missing the data_version triggers can't rule out in-place edits, so they always back up."""
+    from app.utils.data_persistence import auto_backup_on_startup
+
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Tenant(name="One", slug="one"))
+        session.commit()
+        export_all_data(session)
+
+        with patch('app.utils.data_persistence.backup.export_all_data') as mock_export:
+            auto_backup_on_startup(session)
+            mock_export.assert_called_once_with(session)
+
+
+def test_auto_backup_on_startup_writes_backup_when_header_unreadable(test_session, backup_dirs, sample_data):
+    """A newest backup that can't be decoded (zstd without zstandard) doesn't stop the startup backup."""
+    from app.utils.data_persistence import auto_backup_on_startup
+
+    (backup_dirs / "full_backup_20990101_000000.jsonl.zst").write_bytes(b"not zstd")
+
+    with patch('app.utils.data_persistence.import_utils.zstandard', None), \
+         patch('app.utils.data_persistence.backup.export_all_data') as mock_export:
+        auto_backup_on_startup(test_session)
+        mock_export.assert_called_once_with(test_session)
+
+
+def test_export_prunes_backups_beyond_keep(test_session, backup_dirs, sample_data):
+    """Only the most recent BACKUP_KEEP backups survive an export."""
+    for i in range(4):
+        old = backup_dirs / f"full_backup_2024010{i}_000000.jsonl.gz"
+        old.write_bytes(b"")
+        os.utime(old, (1_000_000 + i, 1_000_000 + i))
+
+    with patch('app.utils.data_persistence.export.BACKUP_KEEP', 2):
+        summary = export_all_data(test_session)
+
+    remaining = sorted(path.name for path in backup_dirs.iterdir())
+    assert remaining == sorted([Path(summary["backup_file"]).name, "full_backup_20240103_000000.jsonl.gz"])
+
+
+def test_backup_keep_never_drops_below_one(monkeypatch):
+    """BACKUP_KEEP of 0 or less would prune every backup, so at least one is always kept."""
+    from app.utils.data_persistence.core import _clamp_backup_keep
+
+    for value, expected in (("0", 1), ("-5", 1), ("3", 3)):
+        monkeypatch.setenv("BACKUP_KEEP", value)
+        assert _clamp_backup_keep() == expected
+
+
+def test_backup_routes_run_jobs_in_background():
+    """Create/restore return a job id immediately; the job's outcome is polled separately."""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.routes.admin.backup import router
+
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+
+    with patch('app.routes.admin.backup.create_backup', return_value="Backup created successfully: b.jsonl.gz"):
+        job_id = client.post("/admin/backup/create").json()["job_id"]
+    job = client.get(f"/admin/backup/status/{job_id}").json()
+    assert (job["kind"], job["status"], job["result"]) == ("create", "done", "Backup created successfully: b.jsonl.gz")
+
+    with patch('app.routes.admin.backup.restore_backup', side_effect=FileNotFoundError("missing")):
+        job_id = client.post("/admin/backup/restore?backup_file=nope.json").json()["job_id"]
+    job = client.get(f"/admin/backup/status/{job_id}").json()
+    assert (job["kind"], job["status"], job["error"]) == ("restore", "error", "missing")
+
+    assert client.get("/admin/backup/status/unknown").status_code == 404
+
+
+def test_export_route_downloads_backup_that_imports_back(backup_dirs):
+    """/export serves the written backup file, which the upload import restores as-is."""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from sqlalchemy.pool import StaticPool
+    from app.routes.admin.backup import router
+
+    # One shared connection, since the test client calls the routes from another thread
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Tenant(id=1, name="Tenant One", slug="tenant-one"))
+        session.add(Product(id=4, tenant_id=1, name="Product A", description="A", price_cpm=1.5,
+                            delivery_type="guaranteed", formats_json="[]", targeting_json="{}"))
+        session.commit()
+
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+
+    with patch('app.routes.admin.backup.get_session', side_effect=lambda: iter([Session(engine)])), \
+         patch('app.routes.admin.backup.BACKUP_DIR', backup_dirs):
+        response = client.get("/admin/backup/export")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/gzip"
+        filename = response.headers["content-disposition"].split('filename="')[1].rstrip('"')
+        assert filename.startswith("full_backup_") and filename.endswith(".jsonl.gz")
+        assert gzip.decompress(response.content).startswith(b'{"type":"header"')
+
+        with Session(engine) as session:
+            session.delete(session.get(Product, 4))
+            session.commit()
+
+        response = client.post("/admin/backup/import", files={"file": (filename, response.content)})
+        assert response.status_code == 200
+        assert response.json()["details"]["counts"]["products"] == 1
+
+    with Session(engine) as session:
+        assert session.exec(select(Product.id, Product.name)).all() == [(4, "Product A")]
+    assert [path.name for path in backup_dirs.iterdir()] == [filename]
+
+
+def test_backup_job_registry_keeps_only_recent_finished_jobs():
+    """Old finished jobs are forgotten as new ones arrive; unfinished jobs are never dropped."""
+    from app.utils.data_persistence import backup
+
+    with patch.object(backup, '_jobs', backup.OrderedDict()), patch.object(backup, 'MAX_FINISHED_JOBS', 2):
+        running = backup.submit_backup_job("restore")
+        backup._jobs[running]["status"] = "running"
+        finished = []
+        for _ in range(4):
+            job_id = backup.submit_backup_job("create")
+            backup.run_backup_job(job_id, lambda: "ok")
+            finished.append(job_id)
+        backup.submit_backup_job("create")
+
+        assert backup.get_backup_job(running)["status"] == "running"
+        assert [job_id for job_id in finished if backup.get_backup_job(job_id)] == finished[-2:]
+
+
+def test_import_rolls_back_everything_on_failure(test_session, backup_dirs, sample_data):
+    """A failing step leaves the database exactly as it was before the import."""
+    backup_data = {
+        "tenants": [{"id": 9, "name": "New", "slug": "new"}],
+        "products": [{"tenant_id": 9, "name": "New Product", "description": "", "price_cpm": 1.0,
+                      "delivery_type": "guaranteed", "formats_json": "[]", "targeting_json": "{}"}],
+        "external_agents": [{"name": "Broken", "base_url": "not-a-url"}],
+    }
+
+    with pytest.raises(ValueError):
+        import_all_data(test_session, backup_data)
+
+    assert {t.slug for t in test_session.exec(select(Tenant))} == {"tenant-one", "tenant-two"}
+    assert {p.name for p in test_session.exec(select(Product))} == {"Product A", "Product B"}
+
+
+def test_backup_entry_points_have_one_canonical_module():
+    """Backup, export and import entry points each live in exactly one module."""
+    import ast
+
+    app_dir = Path(__file__).resolve().parent.parent / "app"
+    assert not (app_dir / "utils" / "data_persistence.py").exists()
+    assert list((app_dir / "utils" / "data_persistence").glob("*.py.*")) == []
+
+    canonical = {
+        "create_backup": "utils/data_persistence/backup.py",
+        "restore_backup": "utils/data_persistence/backup.py",
+        "list_backups": "utils/data_persistence/backup.py",
+        "auto_backup_on_startup": "utils/data_persistence/backup.py",
+        "auto_restore_on_startup": "utils/data_persistence/backup.py",
+        "export_all_data": "utils/data_persistence/export.py",
+        "export_tenants": "utils/data_persistence/export.py",
+        "export_external_agents": "utils/data_persistence/export.py",
+        "import_all_data": "utils/data_persistence/import_utils.py",
+        "load_backup_data": "utils/data_persistence/import_utils.py",
+        "import_tenants_and_products": "utils/data_persistence/import_utils.py",
+        "import_tenants": "utils/data_persistence/import_utils.py",
+        "import_external_agents": "utils/data_persistence/import_utils.py",
+        "import_product_embeddings": "utils/data_persistence/import_utils.py",
+    }
+    defined_in = {}
+    for module in app_dir.rglob("*.py"):
+        for node in ast.parse(module.read_text(encoding="utf-8")).body:
+            if isinstance(node, ast.FunctionDef) and node.name in canonical:
+                defined_in.setdefault(node.name, []).append(module.relative_to(app_dir).as_posix())
+
+    assert defined_in == {name: [module] for name, module in canonical.items()}
+
+
+def test_export_encoders_agree_on_datetimes():
+    """orjson and the stdlib fallback write identical compact records."""
+    from datetime import datetime
+    from app.utils.data_persistence import export
+
+    record = {"type": "tenant", "name": "Café", "created_at": datetime(2024, 5, 1, 12, 0, 0, 5)}
+    with patch.object(export, "orjson", None):
+        fallback = export._dumps(record)
+
+    assert fallback == b'{"type":"tenant","name":"Caf\xc3\xa9","created_at":"2024-05-01T12:00:00.000005"}'
+    if export.orjson is not None:
+        assert export._dumps(record) == fallback
+
+
+def test_export_tenants_nests_products_in_one_grouped_query(test_session, sample_data):
+    """Legacy nested export groups products by tenant and drops orphans."""
+    from app.utils.data_persistence import export_tenants
+
+    test_session.add(Product(tenant_id=1, name="Product C", description="C", price_cpm=3.0,
+                             delivery_type="guaranteed", formats_json="[]", targeting_json="{}"))
+    test_session.add(Product(tenant_id=99, name="Orphan", description="", price_cpm=1.0,
+                             delivery_type="guaranteed", formats_json="[]", targeting_json="{}"))
+    test_session.commit()
+
+    tenants = {t["slug"]: [p["name"] for p in t["products"]] for t in export_tenants(test_session)}
+
+    assert tenants == {"tenant-one": ["Product A", "Product C"], "tenant-two": ["Product B"]}
+
+
+def test_export_writes_plain_jsonl_when_compression_disabled(test_session, backup_dirs, sample_data):
+    """BACKUP_COMPRESS=0 produces an uncompressed backup that still restores."""
+    with patch('app.utils.data_persistence.export.BACKUP_COMPRESS', False):
+        summary = export_all_data(test_session)
+
+    backup_file = Path(summary["backup_file"])
+    assert backup_file.name.endswith(".jsonl")
+    assert json.loads(backup_file.read_text().splitlines()[0])["type"] == "header"
+    assert [t["slug"] for t in load_backup_data(str(backup_file))["tenants"]] == ["tenant-one", "tenant-two"]
+
+
+def test_failed_export_leaves_no_partial_backup(test_session, backup_dirs, sample_data):
+    """A crash mid-export leaves neither a truncated backup nor its temp file."""
+    with patch('app.utils.data_persistence.export.iter_product_embeddings', side_effect=RuntimeError("boom")):
+        with pytest.raises(RuntimeError):
+            export_all_data(test_session)
+
+    assert list(backup_dirs.iterdir()) == []
+
+
+def test_settings_files_are_compact_unless_pretty_requested(backup_dirs):
+    """Standalone settings files skip indentation unless BACKUP_PRETTY is set."""
+    from app.utils.data_persistence import export_app_settings
+
+    settings_file = backup_dirs.parent / "app_settings.json"
+    export_app_settings()
+    assert "\n" not in settings_file.read_text()
+
+    with patch('app.utils.data_persistence.export.BACKUP_PRETTY', True):
+        settings = export_app_settings()
+    assert settings_file.read_text().startswith('{\n  "gemini_api_key"')
+    assert json.loads(settings_file.read_text()) == settings
+
+
+def test_empty_tenant_settings_are_not_written(backup_dirs):
+    """The placeholder tenant settings file is only written once it has content."""
+    from app.utils.data_persistence import export_tenant_settings
+
+    settings = export_tenant_settings("2024-01-01T00:00:00")
+
+    assert settings == {"tenant_prompts": {}, "tenant_configurations": {}, "exported_at": "2024-01-01T00:00:00"}
+    assert not (backup_dirs.parent / "tenant_settings.json").exists()
+
+
+def test_iter_tenants_merges_products_and_skips_orphans_at_both_ends(test_session, sample_data):
+    """Orphaned products sorting before or after every tenant are skipped."""
+    from app.utils.data_persistence.export import iter_tenants
+
+    for tenant_id, name in ((0, "Before"), (1, "Product C"), (5, "After")):
+        test_session.add(Product(tenant_id=tenant_id, name=name, description="", price_cpm=1.0,
+                                 delivery_type="guaranteed", formats_json="[]", targeting_json="{}"))
+    test_session.commit()
+
+    tenants = iter_tenants(test_session)
+    first = next(tenants)
+    assert (first["slug"], [p["name"] for p in first["products"]]) == ("tenant-one", ["Product A", "Product C"])
+    assert [(t["slug"], [p["name"] for p in t["products"]]) for t in tenants] == [("tenant-two", ["Product B"])]
+
+
+def test_export_keeps_record_order_across_writer_chunks(test_session, backup_dirs, sample_data):
+    """Records written in many small background chunks still come out in order."""
+    with patch('app.utils.data_persistence.export.EXPORT_WRITE_CHUNK_BYTES', 1):
+        summary = export_all_data(test_session)
+
+    records = _read_lines(Path(summary["backup_file"]))
+    assert [r["type"] for r in records] == [
+        "header", "tenant", "tenant", "product", "product", "agent", "app_settings", "tenant_settings"
+    ]
+
+
+def test_exported_records_cover_every_table_column(test_session, backup_dirs, sample_data):
+    """Backup records are derived from the table schema, so new columns are exported too."""
+    summary = export_all_data(test_session)
+    records = {r["type"]: r for r in _read_lines(Path(summary["backup_file"]))}
+
+    for record_type, model in (("tenant", Tenant), ("product", Product), ("agent", ExternalAgent)):
+        assert set(records[record_type]) - {"type"} == {column.name for column in model.__table__.columns}
+
+
+def test_import_restores_embeddings_and_timestamps_in_bulk(test_session, backup_dirs, sample_data):
+    """Bulk inserts keep backed-up creation times and restore embedding blobs."""
+    from sqlmodel import text
+    from app.utils.embeddings_migrations import _create_embeddings_table_if_missing
+
+    _create_embeddings_table_if_missing(test_session)
+    test_session.execute(text(
+        "INSERT INTO product_embeddings (product_id, embedding_text, embedding_hash, embedding, provider, dim) "
+        "VALUES (1, 'Product A', 'h1', :blob, 'test', 2)"
+    ), {"blob": b"\x00\x01\xfe\xff"})
+    tenant_created = test_session.get(Tenant, 1).created_at
+    summary = export_all_data(test_session)
+
+    import_all_data(test_session, backup_file=Path(summary["backup_file"]).name)
+
+    tenant = test_session.exec(select(Tenant).where(Tenant.slug == "tenant-one")).one()
+    assert tenant.created_at.replace(tzinfo=None) == tenant_created.replace(tzinfo=None)
+    rows = test_session.execute(text("SELECT product_id, embedding, provider FROM product_embeddings")).all()
+    assert [tuple(row) for row in rows] == [(1, b"\x00\x01\xfe\xff", "test")]
+
+
+def test_legacy_import_looks_up_existing_rows_in_bulk(test_session, backup_dirs, sample_data):
+    """Tenants are loaded once per import and products checked with one query per batch."""
+    from sqlalchemy import event
+    from app.utils.data_persistence.import_utils import import_tenants
+
+    backup_data = {"tenants": [
+        {"id": 1, "name": "Tenant One", "slug": "tenant-one", "custom_prompt": "Updated", "products": [
+            {"name": "Product A", "description": "A", "price_cpm": 1.5, "delivery_type": "guaranteed",
+             "formats_json": "[]", "targeting_json": "{}"}]},
+        {"id": 3, "name": "Tenant Three", "slug": "tenant-three", "products": [
+            {"name": "Product C", "description": "C", "price_cpm": 3.0, "delivery_type": "guaranteed",
+             "formats_json": "[]", "targeting_json": "{}"}]},
+        {"id": 3, "name": "Tenant Three", "slug": "tenant-three", "enable_web_context": True},
+    ]}
+    selects = []
+    engine = test_session.get_bind()
+
+    def record(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        with patch('app.utils.data_persistence.import_utils.IMPORT_BATCH_SIZE', 1):
+            import_tenants(test_session, backup_data["tenants"])
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    test_session.commit()
+
+    # One tenant load, then one product lookup for each batch that carries products
+    assert len(selects) == 3
+    tenants = {t.slug: t for t in test_session.exec(select(Tenant))}
+    assert tenants["tenant-one"].custom_prompt == "Updated"
+    assert tenants["tenant-three"].enable_web_context is True
+    assert sorted(p.name for p in test_session.exec(select(Product))) == ["Product A", "Product B", "Product C"]
+
+
+def test_backup_decoders_agree(test_session, backup_dirs, sample_data):
+    """The orjson and stdlib decoders load a backup identically."""
+    summary = export_all_data(test_session)
+
+    with patch('app.utils.data_persistence.import_utils._loads', json.loads):
+        stdlib_data = load_backup_data(summary["backup_file"])
+
+    assert load_backup_data(summary["backup_file"]) == stdlib_data
+
+
+def test_import_commits_once(test_session, backup_dirs, sample_data):
+    """A full restore is written in a single transaction with one commit at the end."""
+    from sqlalchemy import event
+
+    summary = export_all_data(test_session)
+    commits = []
+    event.listen(test_session, "after_commit", commits.append)
+
+    import_all_data(test_session, backup_file=Path(summary["backup_file"]).name)
+
+    assert len(commits) == 1
+
+
+def test_embedding_batches_decode_one_payload_and_skip_bad_rows():
+    """Hex blobs are sliced from one decoded payload; a malformed row only drops itself."""
+    from app.utils.data_persistence.import_utils import _embedding_rows
+
+    def embedding(product_id, blob):
+        return {"id": product_id, "product_id": product_id, "embedding_text": "t", "embedding_hash": "h",
+                "embedding": blob, "created_at": None, "provider": None, "model": None, "dim": None,
+                "updated_at": None, "is_stale": 0}
+
+    rows = _embedding_rows([embedding(1, "0001"), embedding(2, ""), embedding(3, "fffe10")])
+    assert [bytes(r["embedding"]) if r["embedding"] is not None else None for r in rows] == [
+        b"\x00\x01", None, b"\xff\xfe\x10"]
+
+    rows = _embedding_rows([embedding(1, "000"), embedding(2, "1ff"), embedding(3, "abcd")])
+    assert [(r["product_id"], r["embedding"]) for r in rows] == [(3, b"\xab\xcd")]
+
+
+def test_embeddings_import_with_one_executemany_per_batch(test_session, backup_dirs, sample_data):
+    """Embedding rows are bound to one prepared INSERT and sent as a driver executemany."""
+    from sqlalchemy import event
+    from sqlmodel import text
+    from app.utils.embeddings_migrations import _create_embeddings_table_if_missing
+    from app.utils.data_persistence.import_utils import import_product_embeddings
+
+    _create_embeddings_table_if_missing(test_session)
+    embeddings = [
+        {"id": i, "product_id": 1, "embedding_text": f"t{i}", "embedding_hash": f"h{i}", "embedding": "00ff",
+         "created_at": None, "provider": None, "model": None, "dim": 2, "updated_at": None, "is_stale": 0}
+        for i in range(1, 6)
+    ]
+    inserts = []
+    engine = test_session.get_bind()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO product_embeddings"):
+            inserts.append(executemany)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        with patch('app.utils.data_persistence.import_utils.IMPORT_BATCH_SIZE', 2):
+            import_product_embeddings(test_session, embeddings)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    # Five rows in batches of two: two executemany calls plus a single-row execute
+    assert inserts == [True, True, False]
+    assert test_session.execute(text("SELECT COUNT(*) FROM product_embeddings")).scalar() == 5
+
+
+def test_import_does_not_autoflush_or_expire_on_commit(test_session, backup_dirs, sample_data):
+    """Pending tenant updates are flushed once at commit, and the session's settings are restored."""
+    from sqlalchemy import event
+
+    backup_data = {"tenants": [{"id": 1, "name": "Tenant One", "slug": "tenant-one", "custom_prompt": "New", "products": [
+        {"name": "Product Z", "description": "Z", "price_cpm": 1.0, "delivery_type": "guaranteed",
+         "formats_json": "[]", "targeting_json": "{}"}]}]}
+    flushes = []
+    event.listen(test_session, "after_flush", lambda session, context: flushes.append(session.expire_on_commit))
+
+    import_all_data(test_session, backup_data)
+
+    assert flushes == [False]
+    assert test_session.expire_on_commit is True
+    assert test_session.autoflush is True
+    assert test_session.exec(select(Tenant).where(Tenant.slug == "tenant-one")).one().custom_prompt == "New"
+
+
+def test_app_settings_import_logs_truncated_values_only_when_enabled(caplog):
+    """Settings are summarised with long values truncated, and skipped entirely when INFO is off."""
+    import logging
+    from app.utils.data_persistence.import_utils import import_app_settings
+
+    settings = {"gemini_api_key": "abcdefghijklmnop", "rag_top_k": 5, "empty": ""}
+    with caplog.at_level(logging.INFO, logger="app.utils.data_persistence.import_utils"):
+        import_app_settings(settings)
+    assert [r.getMessage() for r in caplog.records][1:] == ["  gemini_api_key: abcdefghij...", "  rag_top_k: 5"]
+
+    caplog.clear()
+    with caplog.at_level(logging.WARNING, logger="app.utils.data_persistence.import_utils"):
+        import_app_settings(settings)
+    assert caplog.records == []
+
+
+@pytest.mark.parametrize("returning", [True, False])
+def test_tenant_map_built_with_or_without_insert_returning(test_session, backup_dirs, sample_data, returning):
+    """New tenant ids come from INSERT ... RETURNING, or one slug lookup where it is unsupported."""
+    summary = export_all_data(test_session)
+    dialect = test_session.get_bind().dialect
+
+    with patch.object(dialect, "insert_executemany_returning", returning):
+        import_all_data(test_session, backup_file=Path(summary["backup_file"]).name)
+
+    products = test_session.exec(select(Product.name, Tenant.slug).join(Tenant)).all()
+    assert sorted(products) == [("Product A", "tenant-one"), ("Product B", "tenant-two")]
+
+
+def test_read_ahead_keeps_order_and_surfaces_reader_errors():
+    """Background chunk reads yield records in order and re-raise parse errors in the caller."""
+    from app.utils.data_persistence.import_utils import _read_ahead
+
+    with _read_ahead(iter({"n": n} for n in range(7)), chunk_size=3) as records:
+        assert [r["n"] for r in records] == list(range(7))
+
+    def broken():
+        yield {"n": 0}
+        raise ValueError("bad line")
+
+    with pytest.raises(ValueError, match="bad line"):
+        with _read_ahead(broken(), chunk_size=1) as records:
+            list(records)
+
+
+def test_zstd_backups_round_trip(test_session, backup_dirs, sample_data):
+    """BACKUP_COMPRESS=zstd writes a .jsonl.zst backup that restores like a gzipped one."""
+    pytest.importorskip("zstandard")
+
+    with patch('app.utils.data_persistence.export.BACKUP_ZSTD', True):
+        summary = export_all_data(test_session)
+
+    assert summary["backup_file"].endswith(".jsonl.zst")
+    result = import_all_data(test_session)
+    assert result["counts"]["tenants"] == 2
+
+
+def test_zstd_backup_without_zstandard_fails_clearly(test_session, backup_dirs):
+    """A .zst backup can't be silently misread when zstandard is missing."""
+    (backup_dirs / "full_backup_20240101_000000.jsonl.zst").write_bytes(b"\x28\xb5\x2f\xfd")
+
+    with patch('app.utils.data_persistence.import_utils.zstandard', None):
+        with pytest.raises(RuntimeError, match="zstandard is required"):
+            import_all_data(test_session)
+
+
+def test_import_relaxes_sqlite_sync_only_while_loading(tmp_path, backup_dirs):
+    """synchronous=OFF applies to the restore's connection and is put back once it is released."""
+    from sqlalchemy import event, text
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'import.sqlite3'}")
+    SQLModel.metadata.create_all(engine)
+    seen = []
+
+    def record(conn, cursor, statement, *args):
+        if statement.startswith("INSERT INTO tenant"):
+            seen.append(conn.connection.dbapi_connection.execute("PRAGMA synchronous").fetchone()[0])
+
+    event.listen(engine, "before_cursor_execute", record)
+    with Session(engine) as session:
+        import_all_data(session, {"tenants": [{"id": 1, "name": "Fast", "slug": "fast"}]})
+
+    assert seen == [0]
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 2
+        assert connection.execute(text("SELECT slug FROM tenant")).scalars().all() == ["fast"]
+
+
+def test_small_legacy_backups_are_decoded_in_one_call(test_session, backup_dirs):
+    """Legacy backups below the streaming threshold skip ijson and decode the whole file at once."""
+    legacy_file = backup_dirs / "full_backup_20240101_000000.json"
+    legacy_file.write_text(json.dumps({"tenants": [{"id": 1, "name": "Small", "slug": "small"}]}))
+
+    with patch('app.utils.data_persistence.import_utils._iter_legacy_items') as iter_items:
+        result = import_all_data(test_session, backup_file=legacy_file.name)
+
+    iter_items.assert_not_called()
+    assert result == {"counts": {"tenants": 1}}
+
+
+def test_uncompressed_legacy_backups_are_parsed_from_a_mapping(backup_dirs):
+    """orjson reads plain .json backups through mmap rather than a heap copy of the file."""
+    pytest.importorskip("orjson")
+    from app.utils.data_persistence.import_utils import _load_legacy_backup
+
+    legacy_file = backup_dirs / "full_backup_20240101_000000.json"
+    legacy_file.write_text(json.dumps({"tenants": [{"id": 1, "name": "Mapped", "slug": "mapped"}]}))
+
+    with patch('app.utils.data_persistence.import_utils._open_backup') as open_backup:
+        assert _load_legacy_backup(str(legacy_file))["tenants"][0]["slug"] == "mapped"
+    open_backup.assert_not_called()
+
+
+def test_reimporting_unchanged_tenants_writes_nothing(test_session, backup_dirs, sample_data, caplog):
+    """Existing tenants whose backed-up fields already match are left untouched."""
+    import logging
+    from sqlalchemy import event
+
+    backup_data = {"tenants": [
+        {"id": 1, "name": "Tenant One", "slug": "tenant-one", "custom_prompt": "Prompt 1", "enable_web_context": False},
+        {"id": 2, "name": "Tenant Two", "slug": "tenant-two", "enable_web_context": False},
+    ]}
+    writes = []
+    engine = test_session.get_bind()
+
+    def record(conn, cursor, statement, *args):
+        if statement.startswith(("UPDATE", "INSERT")):
+            writes.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        with caplog.at_level(logging.INFO, logger="app.utils.data_persistence.import_utils"):
+            import_all_data(test_session, backup_data)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert len(writes) == 1 and writes[0].startswith("UPDATE tenant")
+    assert "Imported tenants: 0 created, 1 updated" in caplog.text
+    assert test_session.get(Tenant, 2).enable_web_context is False
+
+
+def test_products_and_agents_insert_without_returning(test_session, backup_dirs, sample_data):
+    """Restored products and agents go out as plain executemany INSERTs, one per batch."""
+    from sqlalchemy import event
+
+    backup_data = {
+        "tenants": [{"id": 1, "name": "Tenant One", "slug": "tenant-one"}],
+        "products": [
+            {"tenant_id": 1, "name": f"Restored {i}", "description": None, "price_cpm": 1.0,
+             "delivery_type": "guaranteed", "formats_json": None, "targeting_json": None}
+            for i in range(3)
+        ],
+        "external_agents": [
+            {"name": f"Agent {i}", "base_url": f"https://agent{i}.example.com"} for i in range(2)
+        ]
+    }
+    inserts = []
+    engine = test_session.get_bind()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith(("INSERT INTO product ", "INSERT INTO externalagent ")):
+            inserts.append((statement, executemany))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        result = import_all_data(test_session, backup_data)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert result["counts"]["products"] == 3
+    assert [executemany for _, executemany in inserts] == [True, True]
+    assert not any("RETURNING" in statement for statement, _ in inserts)
+
+
+def test_existing_agents_reported_in_one_summary_line(test_session, backup_dirs, caplog):
+    """Agents that already exist are counted in the summary instead of logged one by one."""
+    import logging
+    from app.utils.data_persistence.import_utils import import_external_agents
+
+    test_session.add(ExternalAgent(name="Existing", base_url="https://existing.example.com"))
+    test_session.commit()
+    agents = [
+        {"name": "Existing", "base_url": "https://existing.example.com"},
+        {"name": "New", "base_url": "https://new.example.com"},
+    ]
+    with caplog.at_level(logging.INFO, logger="app.utils.data_persistence.import_utils"):
+        import_external_agents(test_session, agents)
+
+    assert [r.getMessage() for r in caplog.records] == ["Imported 1 external agents (1 already existed)"]
+
+
+def test_legacy_tenant_import_logs_one_summary(test_session, backup_dirs, caplog):
+    """Nested tenant/product imports report a single summary however many batches they take."""
+    import logging
+    from app.utils.data_persistence.import_utils import import_tenants
+
+    tenants = [
+        {"id": i, "name": f"Tenant {i}", "slug": f"tenant-{i}", "products": [
+            {"name": "Product", "description": None, "price_cpm": 1.0, "delivery_type": "guaranteed",
+             "formats_json": None, "targeting_json": None}
+        ]}
+        for i in range(3)
+    ]
+    with patch('app.utils.data_persistence.import_utils.IMPORT_BATCH_SIZE', 1), \
+            caplog.at_level(logging.INFO, logger="app.utils.data_persistence.import_utils"):
+        import_tenants(test_session, tenants)
+
+    assert [r.getMessage() for r in caplog.records] == ["Imported tenants: 3 created, 0 updated; 3 products"]
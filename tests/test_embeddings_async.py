@@ -387,7 +387,25 @@ class TestDatabaseSchema:
         indexes = {row[1] for row in result.fetchall()}
         
         assert 'idx_product_embeddings_version' in indexes
-
+    
+    @pytest.mark.asyncio
+    async def test_bulk_upsert_replaces_changed_embeddings(self, temp_db, test_products):
+        """Test bulk upsert skips current embeddings and replaces changed ones."""
+        from sqlalchemy import text
+        from app.utils.embeddings import upsert_product_embeddings_bulk
+        
+        items = [(p.id, f"{p.name}\n{p.description}", [1.0, 0.0]) for p in test_products[:4]]
+        assert await upsert_product_embeddings_bulk(temp_db, items, provider='gemini', model='m') == 4
+        assert await upsert_product_embeddings_bulk(temp_db, items, provider='gemini', model='m') == 0
+        
+        items[0] = (items[0][0], 'changed text', [0.0, 1.0])
+        assert await upsert_product_embeddings_bulk(temp_db, items, provider='gemini', model='m') == 1
+        
+        rows = temp_db.execute(text(
+            "SELECT product_id, embedding_text FROM product_embeddings WHERE is_stale = 0 ORDER BY product_id"
+        )).fetchall()
+        assert len(rows) == 4
+        assert rows[0][1] == 'changed text'
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
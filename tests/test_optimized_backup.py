@@ -416,6 +416,198 @@ class TestOptimizedBackup:
         tenant_settings = manager._export_tenant_settings_comprehensive()
         assert "export_timestamp" in tenant_settings
     
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("suffix", [".json", ".json.gz", ".json.zst"])
+    async def test_backup_file_round_trip(self, test_session: Session, tmp_path, suffix, monkeypatch):
+        """Backup files written by the manager load back to the same data."""
+        if suffix == ".json.zst":
+            pytest.importorskip("zstandard")
+        from app.utils.data_persistence import optimized_backup
+        # Encode the embeddings section in chunks of two rows
+        monkeypatch.setattr(optimized_backup, "_SECTION_CHUNK_ROWS", 2)
+        manager = OptimizedBackupManager(test_session)
+        backup_data = {
+            "tenants": [{"id": 1, "name": "Café Tenant", "slug": "cafe"}],
+            "product_embeddings": [{"id": i, "embedding": [0.5, -1.25, 3.0]} for i in range(1, 6)],
+            "metadata": {"note": "line one\nline two"}
+        }
+        backup_file = tmp_path / f"comprehensive_backup_test{suffix}"
+        
+        if suffix == ".json":
+            await manager._write_backup_async(backup_data, backup_file)
+            # Written a section at a time, but byte-for-byte the same as one encode
+            from app.utils.data_persistence.export import _dumps
+            assert backup_file.read_bytes() == _dumps(backup_data, pretty=True)
+        else:
+            await manager._write_compressed_backup_async(backup_data, backup_file)
+        
+        assert await manager._load_backup_async(str(backup_file)) == backup_data
+    
+    def test_embeddings_exported_as_base64_blobs(self, test_session: Session, sample_data):
+        """Embedding vectors are exported as base64 of the stored float32 BLOB."""
+        import base64
+        import struct
+        from sqlmodel import text
+        
+        blob = struct.pack("3f", 0.5, -1.25, 3.0)
+        test_session.execute(text("""
+            CREATE TABLE product_embeddings (
+                id INTEGER PRIMARY KEY, product_id INTEGER, embedding_text TEXT, embedding_hash TEXT,
+                embedding BLOB, provider TEXT, model TEXT, dim INTEGER, updated_at TEXT,
+                is_stale INTEGER, created_at TIMESTAMP
+            )
+        """))
+        test_session.execute(
+            text("INSERT INTO product_embeddings (id, product_id, embedding_text, embedding_hash, embedding, dim) "
+                 "VALUES (1, 1, 'text', 'hash', :blob, 3)"),
+            {"blob": blob}
+        )
+        
+        [embedding] = OptimizedBackupManager(test_session)._export_embeddings_bulk()
+        
+        assert "embedding" not in embedding
+        assert base64.b64decode(embedding["embedding_b64"]) == blob
+        assert embedding["embedding_len"] == 3
+    
+    @pytest.mark.asyncio
+    async def test_restore_runs_in_one_transaction(self, test_session: Session, sample_data):
+        """A restore loads every table through executemany and commits once, embeddings included."""
+        import base64
+        import struct
+        from unittest.mock import patch
+        from sqlmodel import text
+        
+        manager = OptimizedBackupManager(test_session)
+        backup_data = {
+            "tenants": manager._export_tenants_bulk(),
+            "products": manager._export_products_bulk(),
+            "external_agents": manager._export_external_agents_bulk(),
+            "product_embeddings": [
+                {"id": 1, "product_id": 1, "embedding_text": "text", "embedding_hash": "hash",
+                 "embedding_b64": base64.b64encode(struct.pack("2f", 0.5, 1.5)).decode("ascii")},
+                {"id": 2, "product_id": 2, "embedding_text": "text", "embedding_hash": "hash",
+                 "embedding": [0.25, -2.0]}
+            ]
+        }
+        
+        with patch.object(test_session, "commit", wraps=test_session.commit) as commit:
+            result = await manager.restore_comprehensive_backup(backup_data=backup_data)
+        
+        assert commit.call_count == 1
+        assert result["counts_match"] is True
+        blobs = test_session.execute(text("SELECT embedding FROM product_embeddings ORDER BY id")).scalars().all()
+        assert blobs == [struct.pack("2f", 0.5, 1.5), struct.pack("2f", 0.25, -2.0)]
+    
+    @pytest.mark.asyncio
+    async def test_file_database_tables_export_concurrently(self, tmp_path):
+        """On a file-backed database each table is exported on its own pooled connection."""
+        from unittest.mock import patch
+        
+        engine = create_engine(f"sqlite:///{tmp_path / 'backup_test.sqlite3'}")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(Tenant(id=1, name="File Tenant", slug="file-tenant"))
+            session.add(Product(id=1, tenant_id=1, name="File Product", price_cpm=2.0, delivery_type="guaranteed"))
+            session.add(ExternalAgent(id=1, name="File Agent", base_url="https://agent.example.com"))
+            session.commit()
+            
+            manager = OptimizedBackupManager(session)
+            sequential = (
+                manager._export_tenants_bulk(),
+                manager._export_products_bulk(),
+                manager._export_external_agents_bulk(),
+                manager._export_embeddings_bulk()
+            )
+            with patch.object(engine, "raw_connection", wraps=engine.raw_connection) as raw_connection:
+                concurrent = await manager._export_tables()
+        engine.dispose()
+        
+        assert raw_connection.call_count == 4
+        assert concurrent == sequential
+        assert [len(rows) for rows in concurrent] == [1, 1, 1, 0]
+        # Timestamps are passed through as the text SQLite stores
+        assert isinstance(concurrent[0][0]["created_at"], str)
+    
+    @pytest.mark.asyncio
+    async def test_file_database_restore_runs_off_the_event_loop(self, tmp_path):
+        """Restores against a file database do their blocking inserts in a worker thread."""
+        import threading
+        
+        engine = create_engine(f"sqlite:///{tmp_path / 'restore_test.sqlite3'}")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            manager = OptimizedBackupManager(session)
+            original = manager._raw_executemany
+            threads = []
+            
+            def record_thread(sql, rows):
+                threads.append(threading.current_thread())
+                original(sql, rows)
+            
+            manager._raw_executemany = record_thread
+            result = await manager.restore_comprehensive_backup(backup_data={
+                "tenants": [{"id": 1, "name": "File Tenant", "slug": "file-tenant",
+                             "created_at": "2024-01-01 00:00:00"}],
+                "products": [],
+                "external_agents": [{"id": 1, "name": "File Agent", "base_url": "https://agent.example.com",
+                                     "created_at": "2024-01-01 00:00:00"}]
+            })
+        engine.dispose()
+        
+        assert result["counts_match"] is True
+        assert len(threads) == 2
+        assert threading.main_thread() not in threads
+    
+    def test_settings_export_leaves_settings_files_alone(self, test_session: Session, tmp_path, monkeypatch):
+        """Exporting settings only reads the settings files; restoring writes them."""
+        from app.utils.data_persistence import optimized_backup
+        
+        settings_file = tmp_path / "app_settings.json"
+        tenant_settings_file = tmp_path / "tenant_settings.json"
+        settings_file.write_text('{"gemini_api_key": "key"}')
+        tenant_settings_file.write_text('{"tenant_prompts": {}}')
+        monkeypatch.setattr(optimized_backup, "SETTINGS_FILE", settings_file)
+        monkeypatch.setattr(optimized_backup, "TENANT_SETTINGS_FILE", tenant_settings_file)
+        manager = OptimizedBackupManager(test_session)
+        
+        app_settings = manager._export_app_settings_comprehensive()
+        tenant_settings = manager._export_tenant_settings_comprehensive()
+        
+        assert app_settings["file_settings"] == {"gemini_api_key": "key"}
+        assert "export_timestamp" in tenant_settings
+        assert settings_file.read_text() == '{"gemini_api_key": "key"}'
+        assert tenant_settings_file.read_text() == '{"tenant_prompts": {}}'
+        
+        manager._restore_tenant_settings(tenant_settings)
+        assert json.loads(tenant_settings_file.read_text()) == tenant_settings
+    
+    @pytest.mark.asyncio
+    async def test_validate_backup_file_reuses_result_until_file_changes(self, tmp_path, monkeypatch):
+        """Validating an unchanged backup again skips reading and parsing it."""
+        from app.utils.data_persistence import optimized_backup
+        
+        backup_file = tmp_path / "comprehensive_backup_test.json"
+        backup_file.write_text(json.dumps({"tenants": [], "products": [], "external_agents": []}))
+        loads = []
+        load_backup = OptimizedBackupManager._load_backup_async
+        
+        async def counting_load(manager, path):
+            loads.append(path)
+            return await load_backup(manager, path)
+        
+        monkeypatch.setattr(OptimizedBackupManager, "_load_backup_async", counting_load)
+        
+        first = await optimized_backup.validate_backup_file(str(backup_file))
+        second = await optimized_backup.validate_backup_file(str(backup_file))
+        assert first["valid"] and second == first
+        assert len(loads) == 1
+        
+        backup_file.write_text(json.dumps({"tenants": []}))
+        os.utime(backup_file, ns=(0, 0))
+        third = await optimized_backup.validate_backup_file(str(backup_file))
+        assert not third["valid"]
+        assert len(loads) == 2
+    
     def test_restore_methods_individual(self, test_session: Session, sample_data):
         """Test individual restore methods."""
         manager = OptimizedBackupManager(test_session)
@@ -74,6 +74,56 @@ test-publisher,Test Product,Test Description,10.50,guaranteed,"{{""sizes"": [""3
         assert len(import_errors) == 0
 
 
+def test_csv_import_commits_and_backs_up_once(temp_db):
+    """A multi-row CSV import is written in one transaction with a single auto-backup."""
+    from unittest.mock import patch
+    from sqlalchemy import event
+
+    engine = get_engine()
+    with Session(engine) as session:
+        create_tenant(session, "Test Publisher", "test-publisher")
+        rows = [
+            {"tenant_slug": "test-publisher", "product_name": f"Product {i}", "description": "",
+             "price_cpm": "1.5", "delivery_type": "guaranteed", "formats_json": "[]", "targeting_json": "{}"}
+            for i in range(3)
+        ] + [{"tenant_slug": "missing", "product_name": "Orphan", "price_cpm": "1", "delivery_type": "guaranteed",
+              "formats_json": "[]", "targeting_json": "{}"}]
+        # Count database COMMITs; per-row savepoints also fire the session's after_commit
+        commits = []
+        event.listen(engine, "commit", commits.append)
+
+        with patch('app.utils.csv_utils.auto_backup') as auto_backup:
+            imported_count, import_errors = import_products_from_csv(session, rows)
+
+        assert imported_count == 3
+        assert import_errors == ["Row 5: Tenant with slug 'missing' not found"]
+        assert len(commits) == 1
+        auto_backup.assert_called_once_with(session, "products_imported")
+
+
+def test_csv_import_skips_row_that_fails_to_flush(temp_db):
+    """A row rejected by the database is reported and the other rows are still imported."""
+    from unittest.mock import patch
+    from sqlmodel import select
+    from app.models import Product
+
+    engine = get_engine()
+    with Session(engine) as session:
+        tenant = create_tenant(session, "Test Publisher", "test-publisher")
+        rows = [
+            {"product_name": name, "description": "", "price_cpm": "1.5", "delivery_type": delivery_type,
+             "formats_json": "[]", "targeting_json": "{}"}
+            for name, delivery_type in (("First", "guaranteed"), ("Broken", None), ("Last", "guaranteed"))
+        ]
+
+        with patch('app.utils.csv_utils.auto_backup'):
+            imported_count, import_errors = import_products_from_csv(session, rows, tenant_id=tenant.id)
+
+        assert imported_count == 2
+        assert len(import_errors) == 1 and import_errors[0].startswith("Row 3: ")
+        assert sorted(session.exec(select(Product.name)).all()) == ["First", "Last"]
+
+
 def test_tenant_product_relationship(temp_db):
     """Test that tenant-product relationships work correctly."""
     engine = get_engine()
@@ -377,3 +377,158 @@ class TestFilterProductsForBrief:
         assert len(results) == 1
         mock_expand.assert_called_once_with("luxury")
         mock_semantic_search.assert_called_once_with(mock_session, 1, "luxury premium high-end", 10)
+
+
+class TestCosineSimilarity:
+    """Test cosine similarity over stored embedding bytes."""
+    
+    def test_stored_bytes_match_unpacked_list(self):
+        """Scoring a float32 view of the stored bytes matches the unpacked list."""
+        from app.utils.embeddings import _embedding_to_bytes, _bytes_to_embedding
+        from app.utils.embeddings.query import _cosine_similarity, _vector_norm
+        
+        query = [0.1 * i for i in range(1, 9)]
+        stored = _embedding_to_bytes([0.5, -0.25, 1.0, 0.0, 2.0, 0.75, -1.5, 0.3])
+        
+        expected = _cosine_similarity(query, _bytes_to_embedding(stored))
+        score = _cosine_similarity(query, memoryview(stored).cast('f'), _vector_norm(query))
+        
+        assert score == pytest.approx(expected)
+        assert _cosine_similarity(query, query) == pytest.approx(1.0)
+        assert _cosine_similarity(query, [0.0] * 8) == 0.0
+    
+    @staticmethod
+    def _embeddings_db(path, vectors):
+        """Create product and product_embeddings tables holding the given vectors."""
+        import sqlite3
+        from app.utils.embeddings import _embedding_to_bytes
+        
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE product (id INTEGER, tenant_id INTEGER, name TEXT, description TEXT, price_cpm REAL, '
+                     'delivery_type TEXT, formats_json TEXT, targeting_json TEXT)')
+        conn.execute('CREATE TABLE product_embeddings (id INTEGER PRIMARY KEY AUTOINCREMENT, product_id INTEGER, '
+                     'provider TEXT, model TEXT, updated_at TEXT, is_stale INTEGER, embedding BLOB)')
+        for product_id, vector in vectors.items():
+            conn.execute('INSERT INTO product VALUES (?, 1, ?, NULL, 1.0, NULL, NULL, NULL)', (product_id, f'P{product_id}'))
+            conn.execute("INSERT INTO product_embeddings (product_id, provider, model, updated_at, is_stale, embedding) "
+                         "VALUES (?, 'gemini', 'text-embedding-004', '2024-01-01', 0, ?)",
+                         (product_id, _embedding_to_bytes(vector)))
+        conn.commit()
+        session = MagicMock()
+        session.connection.return_value.connection = conn
+        return conn, session
+    
+    @pytest.mark.asyncio
+    @patch('app.utils.embeddings_config.get_embeddings_config')
+    async def test_search_returns_top_matches_in_order(self, mock_config):
+        """Test that only the best-scoring products are returned, highest first."""
+        mock_config.return_value = {'provider': 'gemini', 'model': 'text-embedding-004'}
+        _, session = self._embeddings_db(':memory:', {1: [1.0, 0.0], 2: [0.0, 1.0], 3: [1.0, 1.0], 4: [1.0, 0.1]})
+        
+        results = await search_similar_products(session, 1, [1.0, 0.0], 2)
+        
+        assert [r['product_id'] for r in results] == [1, 4]
+        assert results[0]['similarity_score'] == pytest.approx(1.0)
+    
+    @pytest.mark.asyncio
+    @patch('app.utils.embeddings_config.get_embeddings_config')
+    async def test_search_caches_decoded_embeddings_until_they_change(self, mock_config, tmp_path):
+        """Test that repeat searches reuse decoded vectors and pick up new embeddings."""
+        from app.utils.embeddings import _embedding_to_bytes
+        from app.utils.embeddings import query
+        
+        mock_config.return_value = {'provider': 'gemini', 'model': 'text-embedding-004'}
+        conn, session = self._embeddings_db(str(tmp_path / 'rag.sqlite3'), {1: [1.0, 0.0], 2: [0.0, 1.0]})
+        
+        first = await search_similar_products(session, 1, [1.0, 0.0], 1)
+        cached = query._load_tenant_embeddings(conn.cursor(), 1, 'gemini', 'text-embedding-004')
+        assert query._load_tenant_embeddings(conn.cursor(), 1, 'gemini', 'text-embedding-004') is cached
+        
+        # Re-embedding inserts a new row, which invalidates the cached vectors
+        conn.execute("UPDATE product_embeddings SET is_stale = 1 WHERE product_id = 2")
+        conn.execute("INSERT INTO product_embeddings (product_id, provider, model, updated_at, is_stale, embedding) "
+                     "VALUES (2, 'gemini', 'text-embedding-004', '2024-01-02', 0, ?)", (_embedding_to_bytes([1.0, 0.0]),))
+        conn.commit()
+        second = await search_similar_products(session, 1, [1.0, 0.0], 2)
+        
+        assert [r['product_id'] for r in first] == [1]
+        assert [r['similarity_score'] for r in second] == [pytest.approx(1.0), pytest.approx(1.0)]
+
+
+class TestBatchEmbedText:
+    """Test Gemini embedding requests."""
+    
+    @pytest.mark.asyncio
+    @patch('app.utils.embeddings.generator.get_gemini_api_key', return_value='test-key')
+    async def test_batches_texts_into_concurrent_requests(self, mock_get_key):
+        """Test that texts are sent as batch requests of at most 100, preserving order."""
+        import google.generativeai as genai
+        
+        async def fake_embed(model, content, task_type):
+            return {'embedding': [[float(len(text))] for text in content]}
+        
+        texts = ['x' * n for n in range(1, 251)]
+        with patch.object(genai, 'configure'), \
+             patch.object(genai, 'embed_content_async', side_effect=fake_embed) as mock_embed:
+            embeddings = await batch_embed_text(texts)
+        
+        assert [len(call.kwargs['content']) for call in mock_embed.call_args_list] == [100, 100, 50]
+        assert embeddings == [[float(n)] for n in range(1, 251)]
+    
+    @pytest.mark.asyncio
+    @patch('app.utils.embeddings.generator.get_gemini_api_key', return_value='test-key')
+    async def test_limits_requests_in_flight_to_emb_concurrency(self, mock_get_key, monkeypatch):
+        """Test that at most EMB_CONCURRENCY batch requests run at once."""
+        import asyncio
+        import google.generativeai as genai
+        
+        in_flight = 0
+        peak = 0
+        
+        async def fake_embed(model, content, task_type):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            return {'embedding': [[0.0] for _ in content]}
+        
+        monkeypatch.setenv('EMB_CONCURRENCY', '2')
+        with patch.object(genai, 'configure'), \
+             patch.object(genai, 'embed_content_async', side_effect=fake_embed) as mock_embed:
+            embeddings = await batch_embed_text(['x'] * 500)
+        
+        assert mock_embed.call_count == 5
+        assert peak == 2
+        assert len(embeddings) == 500
+    
+    @pytest.mark.asyncio
+    @patch('app.utils.embeddings.generator.get_gemini_api_key', return_value='test-key')
+    async def test_retries_rate_limited_requests_with_backoff(self, mock_get_key):
+        """Test that 429 ResourceExhausted responses are retried with exponential backoff."""
+        import google.generativeai as genai
+        from google.api_core.exceptions import ResourceExhausted
+        
+        responses = [ResourceExhausted("quota"), ResourceExhausted("quota"), {'embedding': [[1.0]]}]
+        with patch.object(genai, 'configure'), \
+             patch.object(genai, 'embed_content_async', side_effect=responses), \
+             patch('app.utils.embeddings.generator.asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+            embeddings = await batch_embed_text(['text'])
+        
+        assert embeddings == [[1.0]]
+        assert [call.args[0] for call in mock_sleep.call_args_list] == [1.0, 2.0]
+    
+    @pytest.mark.asyncio
+    @patch('app.utils.embeddings.generator.get_gemini_api_key', return_value='test-key')
+    async def test_gives_up_after_max_rate_limit_retries(self, mock_get_key):
+        """Test that a request still rate-limited after every retry fails."""
+        import google.generativeai as genai
+        from google.api_core.exceptions import ResourceExhausted
+        
+        with patch.object(genai, 'configure'), \
+             patch.object(genai, 'embed_content_async', side_effect=ResourceExhausted("quota")) as mock_embed, \
+             patch('app.utils.embeddings.generator.asyncio.sleep', new_callable=AsyncMock):
+            with pytest.raises(ValueError, match="Failed to generate embeddings"):
+                await batch_embed_text(['text'])
+        
+        assert mock_embed.call_count == 4